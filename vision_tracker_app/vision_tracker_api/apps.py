@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class VisionTrackerApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "vision_tracker_api"
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from . import signals  # Registers the MemoryChunk indexing hooks
+        post_migrate.connect(signals.install_keyword_index, sender=self)
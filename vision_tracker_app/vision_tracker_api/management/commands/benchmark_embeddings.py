@@ -0,0 +1,90 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_embeddings.py
+
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import MemoryChunk
+from ...services.embedding_providers import EMBEDDING_PROVIDERS, get_embedding_provider
+
+SAMPLE_TEXTS = [
+    "Led the quarterly planning session and got the team aligned on three priorities.",
+    "Took the kids to the park after church and talked about what they want to learn this year.",
+    "Finished the online course on distributed systems and wrote notes on consensus protocols.",
+    "Met a founder at the accessibility meetup who is building screen-reader friendly forms.",
+    "Felt impatient during the budget meeting; next time pause before responding.",
+    "Ran 5 km before work and meditated for ten minutes.",
+    "Mentored a junior engineer through their first production incident.",
+    "Date night: cooked dinner together and planned the summer holiday.",
+    "Prototyped a voice interface for the vision dashboard over the weekend.",
+    "Read two chapters on emotional intelligence and journaled about conflict.",
+]
+
+
+def _query_for(text: str, rng: random.Random) -> str:
+    """A paraphrase stand-in: a contiguous ~60% slice of the document's words."""
+    words = text.split()
+    span = max(3, int(len(words) * 0.6))
+    start = rng.randint(0, max(0, len(words) - span))
+    return " ".join(words[start:start + span])
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares embedding providers on throughput (texts/s, uncached) and retrieval quality "
+        "(self-retrieval recall@k: a slice of each memory must retrieve that memory). Uses up to "
+        "--limit MemoryChunk rows, or built-in sample texts when there are none."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--providers', nargs='+', default=list(EMBEDDING_PROVIDERS), choices=list(EMBEDDING_PROVIDERS))
+        parser.add_argument('--limit', type=int, default=500, help="Maximum number of memories to embed.")
+        parser.add_argument('--k', nargs='+', type=int, default=[1, 5])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        texts = [
+            text for text in MemoryChunk.objects.order_by('pk').values_list('text_content', flat=True)[:options['limit']]
+            if text and text.strip()
+        ] or SAMPLE_TEXTS
+        rng = random.Random(options['seed'])
+        queries = [_query_for(text, rng) for text in texts]
+        self.stdout.write(f"{len(texts)} memories, {len(queries)} queries")
+
+        header = f"{'provider':<10} {'dims':>5} {'texts/s':>9} {'ms/batch':>9}" + "".join(f" {f'recall@{k}':>10}" for k in options['k'])
+        self.stdout.write(header)
+        for name in options['providers']:
+            try:
+                provider = get_embedding_provider(name)
+                # Bypass the embedding cache so the provider itself is measured
+                provider.embed(texts[:1])  # Warm-up (model load / connection setup)
+                started = time.perf_counter()
+                documents, batches = [], 0
+                for start in range(0, len(texts), provider.batch_size):
+                    documents.extend(provider.embed(texts[start:start + provider.batch_size], task_type="retrieval_document"))
+                    batches += 1
+                elapsed = time.perf_counter() - started
+                query_vectors = []
+                for start in range(0, len(queries), provider.batch_size):
+                    query_vectors.extend(provider.embed(queries[start:start + provider.batch_size], task_type="retrieval_query"))
+            except Exception as e:
+                raise CommandError(f"Provider '{name}' failed: {e}")
+
+            recalls = self._recall_at_k(np.asarray(documents, dtype=np.float32), np.asarray(query_vectors, dtype=np.float32), options['k'])
+            self.stdout.write(
+                f"{name:<10} {len(documents[0]):>5} {len(texts) / elapsed:>9.1f} {elapsed * 1000 / batches:>9.1f}"
+                + "".join(f" {recalls[k]:>10.3f}" for k in options['k'])
+            )
+
+    @staticmethod
+    def _recall_at_k(documents: np.ndarray, queries: np.ndarray, ks) -> dict:
+        """Fraction of queries whose source document is among the k most cosine-similar documents."""
+        documents = documents / np.clip(np.linalg.norm(documents, axis=1, keepdims=True), 1e-12, None)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        similarity = queries @ documents.T
+        # Rank of the source document: how many documents score strictly higher
+        source_scores = similarity[np.arange(len(queries)), np.arange(len(queries))]
+        ranks = (similarity > source_scores[:, None]).sum(axis=1)
+        return {k: float((ranks < k).mean()) for k in ks}
@@ -0,0 +1,92 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_history_store.py
+
+import statistics
+import time
+import uuid
+
+import google.generativeai as genai
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import ConversationMessage
+from ...services.history_store import HISTORY_STORES, get_history_store
+
+
+def _make_turn(index: int):
+    """Returns a synthetic user/model message pair of realistic size."""
+    return [
+        genai.protos.Content(role='user', parts=[genai.protos.Part(text=f"Message {index}: " + "How do I stay on track with my vision? " * 8)]),
+        genai.protos.Content(role='model', parts=[genai.protos.Part(text=f"Reply {index}: " + "Focus on one small, concrete step today. " * 20)]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares load and save latency of the conversation-history backends across conversation lengths. "
+        "Synthetic conversations are created and removed again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', default=list(HISTORY_STORES), choices=list(HISTORY_STORES))
+        parser.add_argument('--lengths', nargs='+', type=int, default=[10, 50, 200, 1000], help="Conversation lengths in messages.")
+        parser.add_argument('--repeats', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'backend':<10} {'messages':>8} {'save p50 ms':>12} {'cold load p50 ms':>17} {'warm load p50 ms':>17}")
+        for backend in options['backends']:
+            try:
+                store = get_history_store(backend)
+            except Exception as e:
+                raise CommandError(f"Could not initialize the '{backend}' backend: {e}")
+            for length in options['lengths']:
+                save_ms, cold_ms, warm_ms = self._measure(store, length, options['repeats'])
+                self.stdout.write(f"{backend:<10} {length:>8} {save_ms:>12.2f} {cold_ms:>17.2f} {warm_ms:>17.2f}")
+
+    def _measure(self, store, length: int, repeats: int):
+        conversation_id = f"bench-{uuid.uuid4()}"
+        history = []
+        for index in range(length // 2):
+            history.extend(_make_turn(index))
+        async_to_sync(store.save_conversation_history)(conversation_id, history)
+
+        save_times, cold_times, warm_times = [], [], []
+        try:
+            for repeat in range(repeats):
+                turn = _make_turn(length + repeat)
+                started = time.perf_counter()
+                async_to_sync(store.append_conversation_messages)(conversation_id, turn, expected_count=len(history))
+                save_times.append((time.perf_counter() - started) * 1000)
+                history.extend(turn)
+
+                self._drop_cache(store, conversation_id)
+                started = time.perf_counter()
+                async_to_sync(store.get_conversation_history)(conversation_id)
+                cold_times.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                async_to_sync(store.get_conversation_history)(conversation_id)
+                warm_times.append((time.perf_counter() - started) * 1000)
+        finally:
+            self._cleanup(store, conversation_id)
+
+        return statistics.median(save_times), statistics.median(cold_times), statistics.median(warm_times)
+
+    def _drop_cache(self, store, conversation_id: str) -> None:
+        service = getattr(store, '_service', None)
+        if service is not None:
+            service.history_cache.invalidate(conversation_id)
+
+    def _cleanup(self, store, conversation_id: str) -> None:
+        if store.name == 'local':
+            ConversationMessage.objects.filter(conversation_id=conversation_id).delete()
+            return
+        service = store._service
+        service.history_cache.invalidate(conversation_id)
+        conversation_ref = service._conversation_ref(conversation_id)
+        message_refs = [doc.reference for doc in conversation_ref.collection(service.MESSAGES_SUBCOLLECTION).stream()]
+        for start in range(0, len(message_refs), service.MAX_BATCH_WRITES):
+            batch = service.get_db().batch()
+            for ref in message_refs[start:start + service.MAX_BATCH_WRITES]:
+                batch.delete(ref)
+            batch.commit()
+        conversation_ref.delete()
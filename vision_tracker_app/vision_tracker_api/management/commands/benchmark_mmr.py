@@ -0,0 +1,69 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_mmr.py
+
+import statistics
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...services.chroma_service import chroma_service
+
+BUDGET_MS = 1.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the MMR re-ranking stage (ChromaService.diversify, including building the candidate "
+        "matrix from per-hit embeddings) on synthetic hits for several result sizes, using "
+        "MEMORY_MMR_FETCH_FACTOR candidates per result, and checks its p99 stays under 1 ms. "
+        "No API or Chroma calls are made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ks', default='5,10,20,50', help="Comma-separated result sizes to measure.")
+        parser.add_argument('--dimensions', type=int, default=768, help="Embedding size (embedding-001 is 768).")
+        parser.add_argument('--fetch-factor', type=int, default=None)
+        parser.add_argument('--iterations', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fetch_factor = options['fetch_factor'] or getattr(settings, 'MEMORY_MMR_FETCH_FACTOR', 4)
+        rng = np.random.default_rng(0)
+
+        over_budget = False
+        for k in [int(value) for value in options['ks'].split(',')]:
+            candidates = k * fetch_factor
+            # Clusters of near-duplicates, like a user logging the same kind of memory repeatedly.
+            # Chroma returns embeddings as NumPy arrays, so the candidates are not converted to lists.
+            centers = rng.standard_normal((max(1, candidates // 8), options['dimensions']))
+            embeddings = (
+                centers[rng.integers(0, len(centers), candidates)]
+                + 0.05 * rng.standard_normal((candidates, options['dimensions']))
+            ).astype(np.float32)
+            scores = np.sort(rng.random(candidates))[::-1]
+            # Shaped like fused vector hits: one embedding row (a view into Chroma's result array) per hit
+            hits = [
+                {'id': f"memchunk-{index}", 'score': float(score), 'embedding': embedding}
+                for index, (score, embedding) in enumerate(zip(scores, embeddings))
+            ]
+
+            chroma_service.diversify(hits, k)  # Warm-up
+            timings = []
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                chroma_service.diversify(hits, k)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p50 = statistics.median(timings)
+            p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+            within_budget = p99 < BUDGET_MS
+            over_budget = over_budget or not within_budget
+            self.stdout.write(
+                f"k={k:<3} candidates={candidates:<4} p50={p50:.3f} ms  p99={p99:.3f} ms  "
+                f"mean={statistics.fmean(timings):.3f} ms  {'ok' if within_budget else 'OVER BUDGET'}"
+            )
+
+        if over_budget:
+            self.stderr.write(self.style.ERROR(f"MMR re-ranking p99 exceeded the {BUDGET_MS} ms budget."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"MMR re-ranking p99 stayed under {BUDGET_MS} ms."))
@@ -0,0 +1,53 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_model_setup.py
+
+import statistics
+import time
+
+import google.generativeai as genai
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ... import tools
+from ...prompts import build_system_instruction
+from ...services.model_registry import model_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request chat setup: configuring Gemini and building a GenerativeModel with the "
+        "recall_memories tool on every request (the old path) versus reusing the registry's shared model. "
+        "No API calls are made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        system_instruction = build_system_instruction()
+
+        def per_request():
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            model = genai.GenerativeModel(
+                model_name=settings.CHAT_MODEL_NAME,
+                tools=[tools.recall_memories],
+                system_instruction=system_instruction,
+            )
+            return model.start_chat(history=[], enable_automatic_function_calling=True)
+
+        def registry():
+            model = model_registry.get_model(settings.CHAT_MODEL_NAME, tools=(tools.recall_memories,), system_instruction=system_instruction)
+            return model.start_chat(history=[], enable_automatic_function_calling=True)
+
+        for label, setup in (('per-request model', per_request), ('model registry', registry)):
+            setup() # Warm-up (the registry builds its model here)
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                setup()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{label:<18} p50={statistics.median(timings):.3f} ms  "
+                f"p99={timings[int(len(timings) * 0.99) - 1]:.3f} ms  mean={statistics.fmean(timings):.3f} ms"
+            )
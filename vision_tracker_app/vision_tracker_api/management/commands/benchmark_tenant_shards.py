@@ -0,0 +1,98 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_tenant_shards.py
+
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...services.chroma_service import CollectionCache
+from ...services.tenancy import shard_collection_name
+
+COLLECTION_NAME = 'benchmark_memories'
+
+
+def _open_store(backend: str, path: str):
+    if backend == 'chroma':
+        import chromadb
+        return chromadb.PersistentClient(path=path)
+    from ...services.flat_vector_store import FlatVectorStore
+    return FlatVectorStore(path)
+
+
+def _percentiles(timings: list) -> tuple:
+    timings = sorted(timings)
+    return statistics.median(timings), timings[max(0, int(len(timings) * 0.99) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares one shared collection filtered by tenant_id with one collection per tenant, as the "
+        "number of tenants grows. Shards are resolved through the same LRU handle cache as ChromaService; "
+        "'warm' queries hit a cached handle, 'cold' ones open the collection first. Synthetic vectors are "
+        "written to a temporary directory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', nargs='+', type=int, default=[1, 10, 100])
+        parser.add_argument('--vectors-per-tenant', type=int, default=500)
+        parser.add_argument('--dimensions', type=int, default=768)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--n-results', type=int, default=10)
+        parser.add_argument('--cache-size', type=int, default=None, help="Defaults to MEMORY_SHARD_CACHE_SIZE.")
+        parser.add_argument('--backend', choices=['chroma', 'flat'], default='chroma')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        per_tenant, n_results = options['vectors_per_tenant'], options['n_results']
+        cache_size = options['cache_size'] or getattr(settings, 'MEMORY_SHARD_CACHE_SIZE', 128)
+        work_dir = tempfile.mkdtemp(prefix='tenant-shard-bench-')
+        try:
+            self.stdout.write(
+                f"{'tenants':>8} {'vectors':>8} {'layout':<10} {'p50 ms':>8} {'p99 ms':>8}"
+            )
+            for tenant_count in options['tenants']:
+                client = _open_store(options['backend'], f"{work_dir}/{tenant_count}")
+                tenants = [f"user-{index}" for index in range(tenant_count)]
+                shared = client.get_or_create_collection(COLLECTION_NAME)
+                for tenant in tenants:
+                    vectors = rng.standard_normal((per_tenant, options['dimensions'])).astype(np.float32).tolist()
+                    ids = [f"{tenant}-memchunk-{index}" for index in range(per_tenant)]
+                    documents = [f"Synthetic memory {index} of {tenant}" for index in range(per_tenant)]
+                    metadatas = [{'tenant_id': tenant, 'memory_chunk_id': index} for index in range(per_tenant)]
+                    shared.add(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+                    client.get_or_create_collection(shard_collection_name(COLLECTION_NAME, tenant)).add(
+                        ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas
+                    )
+
+                queries = rng.standard_normal((options['queries'], options['dimensions'])).astype(np.float32)
+                query_tenants = [tenants[index] for index in rng.integers(0, tenant_count, len(queries))]
+                cache = CollectionCache(client, cache_size)
+
+                results = {'shared': [], 'shard-warm': [], 'shard-cold': []}
+                for query, tenant in zip(queries, query_tenants):
+                    started = time.perf_counter()
+                    shared.query(query_embeddings=[query.tolist()], n_results=n_results, where={'tenant_id': tenant})
+                    results['shared'].append((time.perf_counter() - started) * 1000)
+
+                    name = shard_collection_name(COLLECTION_NAME, tenant)
+                    cache.invalidate(name)
+                    started = time.perf_counter()
+                    cache.get(name, create=False).query(query_embeddings=[query.tolist()], n_results=n_results)
+                    results['shard-cold'].append((time.perf_counter() - started) * 1000)
+
+                    started = time.perf_counter()
+                    cache.get(name, create=False).query(query_embeddings=[query.tolist()], n_results=n_results)
+                    results['shard-warm'].append((time.perf_counter() - started) * 1000)
+
+                for layout, timings in results.items():
+                    p50, p99 = _percentiles(timings)
+                    self.stdout.write(
+                        f"{tenant_count:>8} {tenant_count * per_tenant:>8} {layout:<10} {p50:>8.2f} {p99:>8.2f}"
+                    )
+                self.stdout.write(f"         handle cache: {cache.stats()}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,107 @@
+# vision_tracker_app/vision_tracker_api/management/commands/benchmark_vector_store.py
+
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ...services.flat_vector_store import DTYPES
+
+COLLECTION_NAME = 'benchmark_memories'
+
+
+def _open_store(backend: str, path: str):
+    if backend == 'chroma':
+        import chromadb
+        return chromadb.PersistentClient(path=path)
+    from ...services.flat_vector_store import FlatVectorStore
+    return FlatVectorStore(path, dtype=backend.split('-', 1)[1])
+
+
+def _probe(backend: str, path: str, queries_path: str, n_results: int, results) -> None:
+    """
+    Runs in a fresh process so cold start (imports, opening the store, first query) and peak RSS
+    are measured the way a newly started server would see them.
+    """
+    started = time.perf_counter()
+    queries = np.load(queries_path)
+    collection = _open_store(backend, path).get_collection(COLLECTION_NAME)
+    collection.query(query_embeddings=queries[:1].tolist(), n_results=n_results)
+    cold_start_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    for query in queries[1:]:
+        query_started = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=n_results)
+        timings.append((time.perf_counter() - query_started) * 1000)
+    timings.sort()
+    results.put({
+        'cold_start_ms': cold_start_ms,
+        'p50_ms': statistics.median(timings),
+        'p99_ms': timings[max(0, int(len(timings) * 0.99) - 1)],
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the Chroma PersistentClient with the flat memory-mapped store (float16 and int8) on "
+        "query latency, peak RSS and cold start, at several collection sizes. Synthetic vectors are "
+        "written to a temporary directory, and each measurement runs in a fresh process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+        parser.add_argument('--backends', nargs='+', default=['chroma'] + [f'flat-{dtype}' for dtype in DTYPES],
+                            choices=['chroma'] + [f'flat-{dtype}' for dtype in DTYPES])
+        parser.add_argument('--dimensions', type=int, default=768)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--n-results', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        context = multiprocessing.get_context('spawn')
+        work_dir = tempfile.mkdtemp(prefix='vector-store-bench-')
+        try:
+            queries_path = os.path.join(work_dir, 'queries.npy')
+            np.save(queries_path, rng.standard_normal((options['queries'] + 1, options['dimensions'])).astype(np.float32))
+
+            self.stdout.write(
+                f"{'backend':<13} {'vectors':>8} {'build s':>8} {'cold start ms':>14} {'p50 ms':>8} {'p99 ms':>8} {'peak RSS MB':>12}"
+            )
+            for size in options['sizes']:
+                vectors = rng.standard_normal((size, options['dimensions'])).astype(np.float32)
+                ids = [f"memchunk-{index}" for index in range(size)]
+                metadatas = [{'memory_chunk_id': index, 'created_at': 1700000000 + index} for index in range(size)]
+                documents = [f"Synthetic memory {index}" for index in range(size)]
+
+                for backend in options['backends']:
+                    path = os.path.join(work_dir, f"{backend}-{size}")
+                    started = time.perf_counter()
+                    collection = _open_store(backend, path).get_or_create_collection(COLLECTION_NAME)
+                    for start in range(0, size, 5000):
+                        stop = start + 5000
+                        collection.add(
+                            ids=ids[start:stop], embeddings=vectors[start:stop].tolist(),
+                            metadatas=metadatas[start:stop], documents=documents[start:stop],
+                        )
+                    build_seconds = time.perf_counter() - started
+                    del collection
+
+                    results = context.Queue()
+                    process = context.Process(target=_probe, args=(backend, path, queries_path, options['n_results'], results))
+                    process.start()
+                    stats = results.get()
+                    process.join()
+                    self.stdout.write(
+                        f"{backend:<13} {size:>8} {build_seconds:>8.1f} {stats['cold_start_ms']:>14.1f} "
+                        f"{stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['peak_rss_mb']:>12.1f}"
+                    )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
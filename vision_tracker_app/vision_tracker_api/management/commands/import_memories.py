@@ -0,0 +1,79 @@
+# vision_tracker_app/vision_tracker_api/management/commands/import_memories.py
+
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...services.memory_import import (
+    FORMAT_NDJSON, FORMAT_TEXT, IMPORT_FORMATS, INDEX_INLINE, INDEX_MODES, MemoryImporter,
+)
+from ...services.tenancy import ANONYMOUS_TENANT
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-imports memories from an NDJSON or plain-text file (one memory per line). "
+        "The input is streamed, rows are bulk-created per batch and indexed into ChromaDB in batches. "
+        "Use --checkpoint (or --offset) to resume an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' to read from stdin.")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Input format. Defaults to ndjson unless the file ends in .txt.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows per bulk_create/index batch.")
+        parser.add_argument('--offset', type=int, default=None, help="Number of input lines to skip before importing.")
+        parser.add_argument('--checkpoint', help="File that stores the last committed offset; read on start, updated as soon as each batch is committed.")
+        parser.add_argument('--index', choices=INDEX_MODES, default=INDEX_INLINE, help="How imported rows are indexed into ChromaDB.")
+        parser.add_argument('--tenant', default=ANONYMOUS_TENANT, help="Tenant that owns the imported memories, e.g. 'user-7'.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (FORMAT_TEXT if path.endswith('.txt') else FORMAT_NDJSON)
+        checkpoint = options['checkpoint']
+
+        offset = options['offset']
+        if offset is None and checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                offset = int(f.read().strip() or 0)
+            self.stdout.write(f"Resuming from checkpoint offset {offset}.")
+        offset = offset or 0
+
+        committed = {'offset': offset}
+
+        def save_checkpoint(committed_offset):
+            committed['offset'] = committed_offset
+            if not checkpoint:
+                return
+            # Written to a temporary file and renamed, so a crash never leaves a half-written checkpoint
+            with open(f"{checkpoint}.tmp", 'w') as f:
+                f.write(str(committed_offset))
+            os.replace(f"{checkpoint}.tmp", checkpoint)
+
+        def on_progress(stats):
+            self.stdout.write(
+                f"offset={stats['offset']} rows={stats['rows']} indexed={stats['indexed']} "
+                f"errors={stats['errors']} rate={stats['rows_per_second']} rows/s"
+            )
+
+        importer = MemoryImporter(batch_size=options['batch_size'], index_mode=options['index'], progress_callback=on_progress,
+                                  tenant_id=options['tenant'], checkpoint_callback=save_checkpoint)
+        try:
+            if path == '-':
+                stats = importer.run(sys.stdin, fmt, start_offset=offset)
+            else:
+                with open(path, encoding='utf-8') as f:
+                    stats = importer.run(f, fmt, start_offset=offset)
+        except OSError as e:
+            raise CommandError(f"Could not read '{path}': {e}")
+        except UnicodeDecodeError as e:
+            raise CommandError(
+                f"'{path}' is not valid UTF-8: {e}. Lines up to offset {committed['offset']} were imported; "
+                f"fix the file and resume with --offset {committed['offset']}."
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} memories ({stats['indexed']} indexed, {stats['index_failed']} failed to index, "
+            f"{stats['errors']} invalid lines) in {stats['elapsed_seconds']}s at {stats['rows_per_second']} rows/s. "
+            f"Final offset: {stats['offset']}."
+        ))
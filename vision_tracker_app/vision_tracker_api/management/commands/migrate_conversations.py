@@ -0,0 +1,38 @@
+# vision_tracker_app/vision_tracker_api/management/commands/migrate_conversations.py
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from ...services.firestore_service import firestore_service
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves conversations stored as a single Firestore document with a 'messages' array "
+        "into the append-only layout (one document per message). Already migrated "
+        "conversations are left untouched, so the command can be re-run safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('conversation_ids', nargs='*', help="Only migrate these conversations.")
+
+    def handle(self, *args, **options):
+        db = firestore_service.get_db()
+        if not db:
+            raise CommandError("Firestore service not available.")
+
+        conversation_ids = options['conversation_ids'] or [
+            doc.id for doc in db.collection(firestore_service.CONVERSATIONS_COLLECTION).stream()
+        ]
+
+        migrated_conversations = migrated_messages = 0
+        for conversation_id in conversation_ids:
+            migrated = async_to_sync(firestore_service.migrate_legacy_conversation)(conversation_id)
+            if migrated:
+                migrated_conversations += 1
+                migrated_messages += migrated
+                self.stdout.write(f"Migrated {conversation_id}: {migrated} messages.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {migrated_conversations} of {len(conversation_ids)} conversations ({migrated_messages} messages)."
+        ))
@@ -0,0 +1,272 @@
+# vision_tracker_app/vision_tracker_api/management/commands/reembed_memories.py
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...models import MemoryChunk
+from ...services.chroma_service import CHROMADB_PERSIST_PATH, CollectionCache, chroma_service, hnsw_metadata, write_alias
+from ...services.embedding_providers import EMBEDDING_PROVIDERS, get_embedding_provider
+from ...services.gemini_service import generate_embeddings
+from ...services.ingestion_service import build_chunk_items
+from ...services.tenancy import ANONYMOUS_TENANT, shard_collection_name, sharding_enabled
+
+ROW_ITERATOR_CHUNK_SIZE = 500
+
+
+class RateLimiter:
+    """Spaces calls out so that at most `per_minute` of them start in any minute (0 = no limit)."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-embeds every memory into a new versioned collection, e.g. after changing the embedding model. "
+        "Rows are streamed from the database and embedded concurrently in batches under a request rate "
+        "limit; progress is checkpointed, so an interrupted run resumes where it stopped. When the rebuild "
+        "is complete, the memories alias is switched to the new collection in one atomic write, and running "
+        "servers follow it within MEMORY_ALIAS_REFRESH_SECONDS. The previous collection is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', choices=list(EMBEDDING_PROVIDERS), default=None,
+                            help="Embedding provider for the new collection. Defaults to EMBEDDING_PROVIDER.")
+        parser.add_argument('--model', default=None, help="Embedding model, e.g. 'models/text-embedding-004' for gemini.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Texts per embedding request. Defaults to the provider's batch size.")
+        parser.add_argument('--workers', type=int, default=4, help="Embedding requests in flight at once.")
+        parser.add_argument('--requests-per-minute', type=int,
+                            default=getattr(settings, 'REEMBED_REQUESTS_PER_MINUTE', 300),
+                            help="Upper bound on embedding requests per minute (0 = unlimited).")
+        parser.add_argument('--retries', type=int, default=3, help="Attempts per batch before giving up.")
+        parser.add_argument('--checkpoint', default=os.path.join(CHROMADB_PERSIST_PATH, 'reembed_checkpoint.json'))
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint and start over.")
+        parser.add_argument('--no-switch', action='store_true',
+                            help="Build the new collection but leave the alias pointing at the current one.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        state = None if options['restart'] else self._load_checkpoint()
+        if state is not None:
+            if (options['provider'] or options['model']) and (
+                (options['provider'] or state['embedding_provider']) != state['embedding_provider']
+                or (options['model'] or state['embedding_model']) != state['embedding_model']
+            ):
+                raise CommandError(
+                    f"The checkpoint is for {state['embedding_provider']} / {state['embedding_model']}. "
+                    "Pass --restart to start a rebuild with another model."
+                )
+            self.stdout.write(f"Resuming the rebuild of '{state['target']}' after MemoryChunk {state['last_pk']}.")
+        else:
+            provider = get_embedding_provider(options['provider'], options['model'])
+            started_at = timezone.now()
+            state = {
+                'target': f"{chroma_service.alias}__v{started_at.strftime('%Y%m%d%H%M%S')}",
+                'embedding_provider': provider.name,
+                'embedding_model': provider.model_name,
+                'started_at': started_at.isoformat(),
+                'last_pk': 0,
+                'rows': 0,
+                'vectors': 0,
+                'collections': [],
+                'complete': False,
+            }
+            self._save_checkpoint(state)
+            self.stdout.write(f"Rebuilding into '{state['target']}' with {provider.name} / {provider.model_name}.")
+
+        self.state = state
+        self.provider = get_embedding_provider(state['embedding_provider'], state['embedding_model'])
+        self.limiter = RateLimiter(options['requests_per_minute'])
+        self.targets = CollectionCache(
+            chroma_service.client, metadata={**hnsw_metadata(), 'embedding_model': state['embedding_model']}
+        )
+        batch_size = self.batch_size = options['batch_size'] or self.provider.batch_size
+
+        if not state['complete']:
+            rows = MemoryChunk.objects.filter(duplicate_of__isnull=True, pk__gt=state['last_pk']).order_by('pk')
+            self._run(rows, batch_size, checkpoint=True)
+            state['complete'] = True
+            self._save_checkpoint(state)
+        self.stdout.write(f"Embedded {state['rows']} memories into {state['vectors']} vectors.")
+
+        # Memories written while the rebuild ran went to the live collection; copy their new versions too
+        catch_up_since = timezone.now()
+        self._catch_up(datetime.fromisoformat(state['started_at']), batch_size)
+        if options['no_switch']:
+            self.stdout.write(self.style.SUCCESS(
+                f"'{state['target']}' is ready. Re-run without --no-switch to catch up and switch to it."
+            ))
+            return
+
+        previous = chroma_service.collection_name
+        write_alias(chroma_service.alias, {
+            'collection': state['target'],
+            'embedding_provider': state['embedding_provider'],
+            'embedding_model': state['embedding_model'],
+            'switched_at': timezone.now().isoformat(),
+        })
+        refresh_seconds = getattr(settings, 'MEMORY_ALIAS_REFRESH_SECONDS', 30)
+        self.stdout.write(f"'{chroma_service.alias}' now points at '{state['target']}'. Waiting {refresh_seconds}s "
+                          "for running servers to follow it before the final catch-up...")
+        time.sleep(refresh_seconds)
+        self._catch_up(catch_up_since, batch_size)
+        os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Switched to '{state['target']}'. The previous collection '{previous}' was kept; delete it once "
+            "the new one has proven itself."
+        ))
+
+    def _target_name(self, tenant: str) -> str:
+        if sharding_enabled():
+            return shard_collection_name(self.state['target'], tenant or ANONYMOUS_TENANT)
+        return self.state['target']
+
+    def _batches(self, rows, batch_size: int):
+        """Yields (last_pk, row count, items) with about `batch_size` texts each; a row's chunks stay together."""
+        items, row_count, last_pk = [], 0, None
+        for chunk in rows.iterator(chunk_size=ROW_ITERATOR_CHUNK_SIZE):
+            for item in build_chunk_items(chunk, self.state['embedding_model']):
+                items.append((self._target_name(chunk.tenant_id), item))
+            row_count, last_pk = row_count + 1, chunk.pk
+            if len(items) >= batch_size:
+                yield last_pk, row_count, items
+                items, row_count = [], 0
+        if items:
+            yield last_pk, row_count, items
+
+    def _embed_request(self, documents: list) -> list:
+        """Embeds at most batch_size texts in one rate-limited request, retrying failures."""
+        for attempt in range(self.options['retries']):
+            self.limiter.acquire()
+            # Embeddings that succeeded are served from the embedding cache on a retry
+            embeddings = generate_embeddings(documents, batch_size=self.batch_size, provider=self.provider)
+            if all(embeddings):
+                return embeddings
+            time.sleep(2 ** attempt)
+        raise RuntimeError(f"Could not embed {sum(1 for embedding in embeddings if not embedding)} texts.")
+
+    def _embed_and_write(self, items: list, replace: bool) -> int:
+        """Embeds one batch and upserts it into the target collections."""
+        documents = [item['document'] for _, item in items]
+        # A batch runs past batch_size when a row's chunks are kept together, so it may take several requests
+        embeddings = []
+        for start in range(0, len(documents), self.batch_size):
+            embeddings.extend(self._embed_request(documents[start:start + self.batch_size]))
+
+        by_target = {}
+        for (target, item), embedding in zip(items, embeddings):
+            batch = by_target.setdefault(target, {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': []})
+            batch['ids'].append(item['id'])
+            batch['embeddings'].append(embedding)
+            batch['documents'].append(item['document'])
+            batch['metadatas'].append(item['metadata'])
+        for target, batch in by_target.items():
+            collection = self.targets.get(target)
+            if replace:
+                # Drop chunks left over from an earlier, longer version of these memories
+                parent_ids = list({metadata['parent_id'] for metadata in batch['metadatas']})
+                collection.delete(where={'parent_id': {'$in': parent_ids}})
+            collection.upsert(**batch)
+        return len(items)
+
+    def _run(self, rows, batch_size: int, checkpoint: bool, replace: bool = False) -> None:
+        """
+        Embeds the rows with --workers concurrent batches. With `checkpoint`, progress is saved
+        up to the last row of the longest run of completed batches, so a resume never skips rows.
+        """
+        state = self.state
+        pending, completed = {}, {}
+        next_sequence = 0
+        with ThreadPoolExecutor(max_workers=self.options['workers'], thread_name_prefix='reembed') as pool:
+            def drain(block_until: int) -> None:
+                nonlocal next_sequence
+                while len(pending) > block_until:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        sequence, last_pk, row_count = pending.pop(future)
+                        try:
+                            vectors = future.result()
+                        except Exception as e:
+                            for other in pending:
+                                other.cancel()
+                            raise CommandError(
+                                f"Re-embedding stopped: {e}. Progress is saved up to MemoryChunk {state['last_pk']}; "
+                                "run the command again to resume."
+                            ) from e
+                        completed[sequence] = (last_pk, row_count, vectors)
+                    while next_sequence in completed:
+                        last_pk, row_count, vectors = completed.pop(next_sequence)
+                        next_sequence += 1
+                        if checkpoint:
+                            state['last_pk'] = last_pk
+                            state['rows'] += row_count
+                            state['vectors'] += vectors
+                            self._save_checkpoint(state)
+                    if checkpoint:
+                        self.stdout.write(f"  {state['rows']} memories, {state['vectors']} vectors (MemoryChunk {state['last_pk']})")
+
+            for sequence, (last_pk, row_count, items) in enumerate(self._batches(rows, batch_size)):
+                for target, _ in items:
+                    if target not in state['collections']:
+                        state['collections'].append(target)
+                future = pool.submit(self._embed_and_write, items, replace)
+                pending[future] = (sequence, last_pk, row_count)
+                drain(self.options['workers'] * 2)
+            drain(0)
+
+    def _catch_up(self, since: datetime, batch_size: int) -> None:
+        """Re-embeds rows changed since `since` and drops vectors of rows deleted or marked duplicate."""
+        changed = MemoryChunk.objects.filter(duplicate_of__isnull=True, updated_at__gte=since).order_by('pk')
+        count = changed.count()
+        if count:
+            self._run(changed, batch_size, checkpoint=False, replace=True)
+            self.stdout.write(f"Caught up {count} memories changed since {since.isoformat()}.")
+
+        live_pks = set(MemoryChunk.objects.filter(duplicate_of__isnull=True).values_list('pk', flat=True))
+        for target in self.state['collections']:
+            collection = self.targets.get(target)
+            stored = collection.get(include=['metadatas'])
+            stale = [
+                doc_id for doc_id, metadata in zip(stored['ids'], stored['metadatas'])
+                if (metadata or {}).get('memory_chunk_id') not in live_pks
+            ]
+            if stale:
+                collection.delete(ids=stale)
+                self.stdout.write(f"Removed {len(stale)} vectors of deleted or duplicate memories from '{target}'.")
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.options['checkpoint']) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            raise CommandError(f"Unreadable checkpoint {self.options['checkpoint']}: {e}. Pass --restart.") from e
+
+    def _save_checkpoint(self, state: dict) -> None:
+        # Written to a temporary file and renamed, so a crash never leaves a half-written checkpoint
+        path = self.options['checkpoint']
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,92 @@
+# vision_tracker_app/vision_tracker_api/management/commands/shard_memories.py
+
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from ...models import MemoryChunk
+from ...services.chroma_service import chroma_service
+from ...services.tenancy import ANONYMOUS_TENANT, shard_collection_name
+
+READ_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves the single memories collection into per-tenant shards. MemoryChunk rows without a tenant "
+        "are assigned --default-tenant, then every stored vector is copied (without re-embedding) into "
+        "its tenant's collection. Safe to re-run: shards are written with upsert."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--default-tenant', default=ANONYMOUS_TENANT,
+                            help="Tenant for memories that have none, e.g. 'user-1' for a single-user install.")
+        parser.add_argument('--batch-size', type=int, default=READ_BATCH_SIZE, help="Vectors read per page.")
+        parser.add_argument('--delete-legacy', action='store_true',
+                            help="Remove the copied vectors from the single collection afterwards.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many vectors each shard would get.")
+
+    def handle(self, *args, **options):
+        default_tenant = options['default_tenant']
+        dry_run = options['dry_run']
+        if dry_run:
+            backfilled = MemoryChunk.objects.filter(tenant_id='').count()
+        else:
+            backfilled = MemoryChunk.objects.filter(tenant_id='').update(tenant_id=default_tenant)
+        self.stdout.write(f"{'Would assign' if dry_run else 'Assigned'} tenant '{default_tenant}' to {backfilled} memory chunks.")
+
+        legacy = chroma_service.client.get_collection(chroma_service.collection_name)
+        per_tenant = defaultdict(int)
+        copied_ids = []
+        offset = 0
+        while True:
+            page = legacy.get(include=['embeddings', 'documents', 'metadatas'], limit=options['batch_size'], offset=offset)
+            if not page['ids']:
+                break
+            offset += len(page['ids'])
+            metadatas = [metadata or {} for metadata in page['metadatas']]
+            tenants = self._tenants_for(metadatas, default_tenant)
+
+            batches = defaultdict(lambda: {'ids': [], 'embeddings': [], 'documents': [], 'metadatas': []})
+            for doc_id, embedding, document, metadata, tenant in zip(
+                page['ids'], page['embeddings'], page['documents'], metadatas, tenants
+            ):
+                batch = batches[tenant]
+                batch['ids'].append(doc_id)
+                batch['embeddings'].append(list(embedding))
+                batch['documents'].append(document)
+                batch['metadatas'].append({**metadata, 'tenant_id': tenant})
+            for tenant, batch in batches.items():
+                per_tenant[tenant] += len(batch['ids'])
+                if not dry_run:
+                    chroma_service.shards.get(shard_collection_name(chroma_service.collection_name, tenant)).upsert(**batch)
+            copied_ids.extend(page['ids'])
+            self.stdout.write(f"{'Scanned' if dry_run else 'Copied'} {offset} vectors...")
+
+        for tenant, count in sorted(per_tenant.items()):
+            self.stdout.write(f"  {shard_collection_name(chroma_service.collection_name, tenant)}: {count} vectors")
+        if dry_run:
+            return
+
+        chroma_service.bump_generation()
+        if options['delete_legacy'] and copied_ids:
+            for start in range(0, len(copied_ids), options['batch_size']):
+                legacy.delete(ids=copied_ids[start:start + options['batch_size']])
+            self.stdout.write(f"Removed {len(copied_ids)} vectors from '{chroma_service.collection_name}'.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {len(copied_ids)} vectors into {len(per_tenant)} shards. Set MEMORY_SHARDING_ENABLED=true "
+            "and restart the server processes to serve queries from the shards."
+        ))
+
+    @staticmethod
+    def _tenants_for(metadatas: list, default_tenant: str) -> list:
+        """Tenant of each vector: from its metadata, else from its MemoryChunk row, else the default."""
+        chunk_ids = {
+            metadata['memory_chunk_id'] for metadata in metadatas
+            if not metadata.get('tenant_id') and metadata.get('memory_chunk_id') is not None
+        }
+        owners = dict(MemoryChunk.objects.filter(pk__in=chunk_ids).values_list('pk', 'tenant_id')) if chunk_ids else {}
+        return [
+            metadata.get('tenant_id') or owners.get(metadata.get('memory_chunk_id')) or default_tenant
+            for metadata in metadatas
+        ]
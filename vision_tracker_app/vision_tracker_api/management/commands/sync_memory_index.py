@@ -0,0 +1,36 @@
+# vision_tracker_app/vision_tracker_api/management/commands/sync_memory_index.py
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...services.memory_sync import sync_memory_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Incrementally syncs MemoryChunk into the vector store: rows changed since the last run are "
+        "re-embedded and upserted, and vectors of deleted rows are removed. The first run indexes "
+        "everything. Runs once, or every --interval seconds until interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="Seconds between runs; 0 runs once.")
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows per embedding/upsert batch.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            stats = sync_memory_index(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"indexed={stats.get('indexed', 0)} failed={stats.get('failed', 0)} "
+                f"duplicates={stats.get('duplicates', 0)} deleted={stats.get('deleted', 0)} "
+                f"seconds={stats.get('seconds', 0)}" + (" (another sync was running)" if stats.get('skipped') else "")
+            )
+            if not options['interval']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
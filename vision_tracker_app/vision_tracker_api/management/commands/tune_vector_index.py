@@ -0,0 +1,231 @@
+# vision_tracker_app/vision_tracker_api/management/commands/tune_vector_index.py
+
+import itertools
+import json
+import statistics
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...models import MemoryChunk
+from ...services.chroma_service import chroma_service, hnsw_metadata, write_alias
+from ...services.flat_vector_store import FlatVectorStore
+from ...services.tenancy import ANONYMOUS_TENANT, shard_collection_name, sharding_enabled
+
+READ_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = 5000
+
+
+def read_collection(collection, batch_size: int = READ_BATCH_SIZE):
+    """Returns (ids, embeddings, documents, metadatas) for every vector stored in a collection."""
+    ids, embeddings, documents, metadatas = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=['embeddings', 'documents', 'metadatas'], limit=batch_size, offset=offset)
+        if not page['ids']:
+            break
+        ids.extend(page['ids'])
+        embeddings.extend(page['embeddings'])
+        documents.extend(page['documents'])
+        metadatas.extend(page['metadatas'])
+        offset += len(page['ids'])
+    return ids, np.asarray(embeddings, dtype=np.float32), documents, metadatas
+
+
+def write_collection(collection, ids, embeddings, documents, metadatas, batch_size: int = WRITE_BATCH_SIZE,
+                     upsert: bool = False) -> None:
+    """Adds (or upserts) stored vectors to a collection in batches, without re-embedding."""
+    write = collection.upsert if upsert else collection.add
+    for start in range(0, len(ids), batch_size):
+        stop = start + batch_size
+        write(
+            ids=ids[start:stop],
+            embeddings=embeddings[start:stop].tolist(),
+            documents=documents[start:stop],
+            metadatas=[metadata or None for metadata in metadatas[start:stop]],
+        )
+
+
+def collection_fingerprints(collection, batch_size: int = READ_BATCH_SIZE) -> dict:
+    """Vector ID -> (document, metadata) for every vector in a collection, for telling which ones changed."""
+    fingerprints = {}
+    offset = 0
+    while True:
+        page = collection.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+        if not page['ids']:
+            break
+        for doc_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            fingerprints[doc_id] = (document, json.dumps(metadata or {}, sort_keys=True))
+        offset += len(page['ids'])
+    return fingerprints
+
+
+def exact_neighbours(embeddings: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Row indexes of the exact k nearest stored vectors for each query, in Chroma's distance for `space`."""
+    if space == 'cosine':
+        embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    dots = queries @ embeddings.T
+    if space == 'l2':
+        distances = (queries ** 2).sum(axis=1)[:, None] + (embeddings ** 2).sum(axis=1)[None, :] - 2.0 * dots
+    else:
+        distances = 1.0 - dots
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return top
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the memories collection and every per-tenant shard from their stored embeddings (no "
+        "embedding API calls) with each combination of HNSW parameters given, and reports build time, "
+        "recall@k against exact search and p50/p99 query latency over all their vectors. With --apply "
+        "(one combination only), every collection is rebuilt under a new versioned name and the memories "
+        "alias is switched to it atomically, as reembed_memories does; running servers follow within "
+        "MEMORY_ALIAS_REFRESH_SECONDS, after which writes they made to the old collections are copied "
+        "over. The old collections are kept."
+    )
+
+    def add_arguments(self, parser):
+        defaults = hnsw_metadata()
+        parser.add_argument('--space', nargs='+', default=[defaults['hnsw:space']], choices=['l2', 'cosine', 'ip'])
+        parser.add_argument('--m', nargs='+', type=int, default=[defaults['hnsw:M']])
+        parser.add_argument('--construction-ef', nargs='+', type=int, default=[defaults['hnsw:construction_ef']])
+        parser.add_argument('--search-ef', nargs='+', type=int, default=[defaults['hnsw:search_ef']])
+        parser.add_argument('--k', type=int, default=10, help="Neighbours per query for recall@k.")
+        parser.add_argument('--queries', type=int, default=200, help="Stored vectors sampled as queries.")
+        parser.add_argument('--apply', action='store_true', help="Switch the memories alias to rebuilt collections.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        client = chroma_service.client
+        if isinstance(client, FlatVectorStore):
+            raise CommandError("The flat vector store does exact search and has no HNSW index to tune.")
+        combinations = list(itertools.product(options['space'], options['m'], options['construction_ef'], options['search_ef']))
+        if options['apply'] and len(combinations) != 1:
+            raise CommandError("--apply needs exactly one parameter combination.")
+
+        live_name = chroma_service.collection_name
+        sources = self._live_collections(client, live_name)
+        ids, embeddings, documents, metadatas = [], [], [], []
+        for collection in sources.values():
+            collection_ids, collection_embeddings, collection_documents, collection_metadatas = read_collection(collection)
+            ids.extend(collection_ids)
+            embeddings.extend(collection_embeddings)
+            documents.extend(collection_documents)
+            metadatas.extend(collection_metadatas)
+        if not ids:
+            raise CommandError(f"Collection '{live_name}' and its shards are empty; nothing to tune.")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        k = min(options['k'], len(ids))
+        rng = np.random.default_rng(options['seed'])
+        sample = rng.choice(len(ids), size=min(options['queries'], len(ids)), replace=False)
+        # Perturb the sampled vectors slightly so each query is not trivially its own nearest neighbour
+        queries = embeddings[sample] + 0.01 * np.abs(embeddings[sample]).mean() * rng.standard_normal(embeddings[sample].shape).astype(np.float32)
+        self.stdout.write(
+            f"{len(ids)} vectors of {embeddings.shape[1]} dimensions from '{live_name}' and {len(sources) - 1} shards, "
+            f"{len(queries)} queries, k={k}"
+        )
+        self.stdout.write(f"{'space':<7} {'M':>4} {'constr_ef':>10} {'search_ef':>10} {'build s':>8} {f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8}")
+
+        exact_by_space = {}
+        for space, m, construction_ef, search_ef in combinations:
+            if space not in exact_by_space:
+                exact_by_space[space] = exact_neighbours(embeddings, queries, k, space)
+            exact = exact_by_space[space]
+            params = {'hnsw:space': space, 'hnsw:M': m, 'hnsw:construction_ef': construction_ef, 'hnsw:search_ef': search_ef}
+
+            build_name = f"{live_name}__rebuild"
+            self._drop(client, build_name)
+            started = time.perf_counter()
+            collection = client.create_collection(name=build_name, metadata=params)
+            write_collection(collection, ids, embeddings, documents, metadatas)
+            build_seconds = time.perf_counter() - started
+
+            timings, hits = [], 0
+            for query, expected in zip(queries, exact):
+                query_started = time.perf_counter()
+                result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+                timings.append((time.perf_counter() - query_started) * 1000)
+                hits += len(set(result['ids'][0]) & {ids[row] for row in expected})
+            timings.sort()
+            self.stdout.write(
+                f"{space:<7} {m:>4} {construction_ef:>10} {search_ef:>10} {build_seconds:>8.1f} "
+                f"{hits / (len(queries) * k):>10.3f} {statistics.median(timings):>8.2f} "
+                f"{timings[max(0, int(len(timings) * 0.99) - 1)]:>8.2f}"
+            )
+            self._drop(client, build_name)
+
+            if options['apply']:
+                self._apply(client, live_name, params)
+
+    @staticmethod
+    def _drop(client, name: str) -> None:
+        try:
+            client.delete_collection(name)
+        except Exception:
+            pass  # Did not exist
+
+    @staticmethod
+    def _live_collections(client, base_name: str) -> dict:
+        """The collection `base_name` plus, with sharding enabled, the existing shard of every tenant with memories."""
+        collections = {None: client.get_or_create_collection(base_name, metadata=hnsw_metadata())}
+        if sharding_enabled():
+            tenants = {tenant or ANONYMOUS_TENANT for tenant in MemoryChunk.objects.values_list('tenant_id', flat=True).distinct()}
+            for tenant in sorted(tenants):
+                try:
+                    collections[tenant] = client.get_collection(shard_collection_name(base_name, tenant))
+                except Exception:
+                    pass  # The tenant has no shard yet
+        return collections
+
+    def _apply(self, client, live_name: str, params: dict) -> None:
+        """Rebuilds every live collection under a new versioned name and switches the memories alias to it."""
+        target_name = f"{chroma_service.alias}__v{timezone.now().strftime('%Y%m%d%H%M%S')}"
+
+        def target_for(tenant):
+            name = target_name if tenant is None else shard_collection_name(target_name, tenant)
+            return client.get_or_create_collection(name, metadata=params)
+
+        sources = self._live_collections(client, live_name)
+        for tenant, source in sources.items():
+            target = target_for(tenant)
+            write_collection(target, *read_collection(source), upsert=True)
+            self._catch_up(source, target)
+            self.stdout.write(f"Rebuilt '{source.name}' as '{target.name}'.")
+
+        write_alias(chroma_service.alias, {
+            'collection': target_name,
+            'embedding_provider': chroma_service.embedder.name,
+            'embedding_model': chroma_service.embedder.model_name,
+            'switched_at': timezone.now().isoformat(),
+        })
+        refresh_seconds = getattr(settings, 'MEMORY_ALIAS_REFRESH_SECONDS', 30)
+        self.stdout.write(f"'{chroma_service.alias}' now points at '{target_name}'. Waiting {refresh_seconds}s "
+                          "for running servers to follow it before copying their last writes...")
+        time.sleep(refresh_seconds)
+        # Shards opened for new tenants in the meantime are picked up too
+        for tenant, source in self._live_collections(client, live_name).items():
+            self._catch_up(source, target_for(tenant))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"'{chroma_service.alias}' now uses the rebuilt indexes; '{live_name}' and its shards were kept. Set the "
+            "CHROMA_HNSW_* settings to these values so shards of new tenants are created with them too, and "
+            "delete the old collections once the new ones have proven themselves."
+        ))
+
+    def _catch_up(self, live, rebuilt) -> None:
+        """Makes `rebuilt` match `live` again: copies vectors added or changed in `live` since it was read, drops deleted ones."""
+        live_state, rebuilt_state = collection_fingerprints(live), collection_fingerprints(rebuilt)
+        changed = [doc_id for doc_id, fingerprint in live_state.items() if rebuilt_state.get(doc_id) != fingerprint]
+        removed = [doc_id for doc_id in rebuilt_state if doc_id not in live_state]
+        for start in range(0, len(changed), READ_BATCH_SIZE):
+            page = live.get(ids=changed[start:start + READ_BATCH_SIZE], include=['embeddings', 'documents', 'metadatas'])
+            write_collection(rebuilt, page['ids'], np.asarray(page['embeddings'], dtype=np.float32), page['documents'],
+                             page['metadatas'], upsert=True)
+        if removed:
+            rebuilt.delete(ids=removed)
+        if changed or removed:
+            self.stdout.write(f"Copied {len(changed)} and removed {len(removed)} vectors written to '{live.name}' meanwhile.")
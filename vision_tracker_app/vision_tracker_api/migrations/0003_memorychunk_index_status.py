@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision_tracker_api', '0002_alter_memorychunk_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorychunk',
+            name='index_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('indexed', 'Indexed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='memorychunk',
+            name='indexed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
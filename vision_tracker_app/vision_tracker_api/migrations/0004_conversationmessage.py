@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision_tracker_api', '0003_memorychunk_index_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_id', models.CharField(max_length=255)),
+                ('seq', models.PositiveIntegerField()),
+                ('role', models.CharField(blank=True, max_length=32)),
+                ('message', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['conversation_id', 'seq'],
+                'constraints': [models.UniqueConstraint(fields=('conversation_id', 'seq'), name='unique_conversation_message_seq')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision_tracker_api', '0005_conversationsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorychunk',
+            name='tenant_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
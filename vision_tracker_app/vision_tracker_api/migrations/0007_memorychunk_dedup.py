@@ -0,0 +1,27 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision_tracker_api', '0006_memorychunk_tenant_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorychunk',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='memorychunk',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='vision_tracker_api.memorychunk'),
+        ),
+        migrations.AlterField(
+            model_name='memorychunk',
+            name='index_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('indexed', 'Indexed'), ('failed', 'Failed'), ('duplicate', 'Duplicate')], db_index=True, default='pending', max_length=16),
+        ),
+    ]
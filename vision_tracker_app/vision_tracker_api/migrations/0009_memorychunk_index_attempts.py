@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vision_tracker_api', '0008_memory_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorychunk',
+            name='index_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='memorychunk',
+            name='next_index_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
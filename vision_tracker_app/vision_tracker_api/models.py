@@ -13,14 +13,84 @@ class VisionCategory(models.Model):
         return self.name
 
 class MemoryChunk(models.Model):
+    INDEX_PENDING = 'pending'
+    INDEX_INDEXED = 'indexed'
+    INDEX_FAILED = 'failed'
+    INDEX_DUPLICATE = 'duplicate'
+    INDEX_STATUS_CHOICES = [
+        (INDEX_PENDING, 'Pending'),
+        (INDEX_INDEXED, 'Indexed'),
+        (INDEX_FAILED, 'Failed'),
+        (INDEX_DUPLICATE, 'Duplicate'),
+    ]
+
     text_content = models.TextField()
     chroma_id = models.CharField(max_length=255, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Indexed for the incremental sync's watermark query (see services/memory_sync.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     metadata = models.JSONField(default=dict, blank=True, null=True)
+    index_status = models.CharField(max_length=16, choices=INDEX_STATUS_CHOICES, default=INDEX_PENDING, db_index=True)
+    indexed_at = models.DateTimeField(blank=True, null=True)
+    # Failed indexing attempts since the last success or edit, and when the sync may retry (see memory_sync.py)
+    index_attempts = models.PositiveSmallIntegerField(default=0)
+    next_index_attempt_at = models.DateTimeField(blank=True, null=True)
+    # Whose memory this is (see services/tenancy.py); selects the vector-store shard
+    tenant_id = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # Normalised-text hash for exact duplicate detection, and the memory this one duplicates (see services/dedup.py)
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    duplicate_of = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='duplicates')
 
     def __str__(self):
         return f"MemoryChunk {self.id}: {self.text_content[:50]}..."
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+
+class ConversationMessage(models.Model):
+    """One message of a chat conversation, used by the local conversation-history backend."""
+    conversation_id = models.CharField(max_length=255)
+    seq = models.PositiveIntegerField()
+    role = models.CharField(max_length=32, blank=True)
+    message = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"ConversationMessage {self.conversation_id}#{self.seq} ({self.role})"
+
+    class Meta:
+        ordering = ['conversation_id', 'seq']
+        constraints = [
+            # Also serves as the (conversation_id, seq) index used to load a conversation in order
+            models.UniqueConstraint(fields=['conversation_id', 'seq'], name='unique_conversation_message_seq'),
+        ]
+
+class ConversationSummary(models.Model):
+    """Rolling summary of a conversation's older turns, used by the local conversation-history backend."""
+    conversation_id = models.CharField(max_length=255, unique=True)
+    summary = models.TextField(blank=True)
+    summarized_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ConversationSummary {self.conversation_id} (first {self.summarized_count} messages)"
+
+class MemoryChunkTombstone(models.Model):
+    """A deleted MemoryChunk whose vectors the incremental sync (services/memory_sync.py) still has to remove."""
+    chunk_id = models.BigIntegerField()
+    vector_id = models.CharField(max_length=255)
+    tenant_id = models.CharField(max_length=64, blank=True, default='')
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"MemoryChunkTombstone {self.chunk_id} ({self.vector_id})"
+
+class SyncState(models.Model):
+    """Progress of an incremental sync job: rows last updated before `watermark` have been synced."""
+    name = models.CharField(max_length=64, unique=True)
+    watermark = models.DateTimeField(blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_run_stats = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"SyncState {self.name} (watermark {self.watermark})"
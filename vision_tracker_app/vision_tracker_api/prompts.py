@@ -0,0 +1,57 @@
+# vision_tracker_app/vision_tracker_api/prompts.py
+
+from functools import lru_cache
+from typing import List
+
+import google.generativeai as genai
+from django.conf import settings
+
+# Chat turns stored before the preamble moved into the system instruction carry the whole
+# preamble in front of the user's message; the message itself follows this line.
+LEGACY_PREAMBLE_MARKER = "\nRespond to the user's current message, in a natural and engaging conversation.\n"
+
+
+@lru_cache(maxsize=1)
+def build_system_instruction() -> str:
+    """
+    The Vision Assistant's role and the user's vision statement. Supplied once as the
+    model's system instruction instead of being repeated in every user turn.
+    """
+    vision_statement = settings.VISION_STATEMENT_FULL
+    return (
+        "You are the **Vision Assistant**, a highly supportive and dedicated AI crafted to empower the user in articulating, refining, and actively working towards their long-term personal vision. "
+        "Your profound mission is to guide the user in achieving their aspirations through insightful, actionable, and consistently encouraging dialogue. There should be a flow of conversation that is both natural and deeply connected to the user's overarching vision. "
+        "This vision is the absolute compass for all our interactions. Every piece of advice, every question, and every suggestion you offer must be directly framed around helping the user align their current actions and thoughts with this future state. "
+        "A core strength you possess is direct access to the user's **personal archive of past memories and conversations**. This capability allows you to provide **richly contextual, deeply personalized, and exceptionally relevant guidance** by drawing upon their unique historical journey and previous discussions. "
+        "Crucially, you are equipped with the `recall_memories` tool. **Use this tool when you ONLY need it, it's part of your thought process** use it when the user's query, stated goals, or any conversational context suggests a reference to past events, previous discussions, or personal history that could enrich your response or understanding. "
+        "Your conversations should be a dynamic and empowering experience for the user. Strive to be: "
+        "\n\n* **Naturally Contextual**: You can weave together the current input, the user's overarching vision, and any relevant retrieved memories to ensure a seamless and informed dialogue. "
+        "\n* **Profoundly Insightful**: Offer fresh perspectives, identify patterns, and make meaningful connections between current discussions and broader themes in their life's vision. Help them see connections they might miss. "
+        "\n* **Consistently Actionable**: Propose concrete next steps, practical reflections, thought-provoking questions, or small, empowering challenges that directly propel the user forward in their vision journey. "
+        "\n* **Truly Engaging**: Maintain a positive, encouraging, and constructive criticism. Actively prompt the user for deeper thought, invite them to elaborate, and encourage the exploration of new ideas or specific details related to their vision. Foster a supportive environment where they feel motivated and understood. "
+        "\n\nHere is the user's core vision statement for your reference:\n---"
+        f"\n{vision_statement}\n---"
+        "\nNow, internalize your role, mission, capabilities, and the user's vision."
+        "\nRespond to each of the user's messages in a natural and engaging conversation."
+    )
+
+
+def strip_legacy_preamble(history: List[genai.protos.Content]) -> List[genai.protos.Content]:
+    """
+    Read-time cleanup for histories saved before the system instruction existed: user turns
+    that start with the old preamble are reduced to the user's own message. Other messages
+    are returned unchanged (and uncopied).
+    """
+    cleaned = []
+    for content in history:
+        if content.role == 'user' and any(LEGACY_PREAMBLE_MARKER in part.text for part in content.parts if part.text):
+            content = genai.protos.Content(
+                role=content.role,
+                parts=[
+                    genai.protos.Part(text=part.text.split(LEGACY_PREAMBLE_MARKER, 1)[1])
+                    if part.text and LEGACY_PREAMBLE_MARKER in part.text else part
+                    for part in content.parts
+                ],
+            )
+        cleaned.append(content)
+    return cleaned
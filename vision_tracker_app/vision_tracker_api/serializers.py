@@ -12,4 +12,5 @@ class MemoryChunkSerializer(serializers.ModelSerializer):
     class Meta:
         model = MemoryChunk
         fields = '__all__'
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'chroma_id', 'index_status', 'indexed_at', 'tenant_id', 'content_hash', 'duplicate_of',
+                            'index_attempts', 'next_index_attempt_at']
\ No newline at end of file
@@ -1,14 +1,184 @@
 # vision_tracker_app/vision_tracker_api/services/chroma_service.py
 
 import chromadb
+import numpy as np
+import json
 import os
-from .gemini_service import generate_embedding # Import our embedding function
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional, Union
+from django.conf import settings
+from . import keyword_index
+from .chunker import expand_hits
+from .mmr import mmr_rerank
+from .embedding_providers import get_embedding_provider
+from .executors import CHROMA, run_on
+from .flat_vector_store import FlatVectorStore
+from .tenancy import get_current_tenant, shard_collection_name, sharding_enabled
+from .gemini_service import agenerate_embeddings, generate_embedding, generate_embeddings # Import our embedding functions
 
 # Define a consistent path for ChromaDB storage
 # BASE_DIR should be imported carefully, or passed in
 # For now, let's assume a 'chroma_db' directory in the project root
 # We can refine this path later if needed.
-CHROMADB_PERSIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'chroma_db')
+CHROMADB_PERSIST_PATH = getattr(
+    settings, 'CHROMADB_PERSIST_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'chroma_db')
+)
+
+def open_vector_store(backend: str = None):
+    """
+    Returns the client for the configured vector store (settings.VECTOR_STORE_BACKEND):
+    'chroma' for a Chroma PersistentClient, or 'flat' for the memory-mapped exact-search store
+    in flat_vector_store.py, which offers the same collection API.
+    """
+    backend = backend or getattr(settings, 'VECTOR_STORE_BACKEND', 'chroma')
+    if backend == 'flat':
+        path = getattr(settings, 'FLAT_VECTOR_STORE_PATH', os.path.join(CHROMADB_PERSIST_PATH, '..', 'flat_vector_store'))
+        print(f"DEBUG: Initializing flat vector store at: {path}")
+        return FlatVectorStore(
+            path,
+            dtype=getattr(settings, 'FLAT_VECTOR_STORE_DTYPE', 'float16'),
+            compact_ratio=getattr(settings, 'FLAT_VECTOR_STORE_COMPACT_RATIO', 0.25),
+        )
+    if backend != 'chroma':
+        raise ValueError(f"Unknown vector store backend '{backend}'. Expected 'chroma' or 'flat'.")
+    print(f"DEBUG: Initializing ChromaDB client at: {CHROMADB_PERSIST_PATH}")
+    # Ensure the directory exists
+    os.makedirs(CHROMADB_PERSIST_PATH, exist_ok=True)
+    return chromadb.PersistentClient(path=CHROMADB_PERSIST_PATH)
+
+# The name the memories collection is known by; `manage.py reembed_memories` can point it at a rebuilt collection
+MEMORIES_ALIAS = "vision_tracker_memories"
+
+def aliases_path() -> str:
+    return getattr(settings, 'COLLECTION_ALIASES_PATH', os.path.join(CHROMADB_PERSIST_PATH, 'collection_aliases.json'))
+
+def _read_aliases() -> dict:
+    try:
+        with open(aliases_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def read_alias(alias: str) -> dict:
+    """
+    Returns what `alias` points to: a dict with 'collection', 'embedding_provider', 'embedding_model'
+    and 'switched_at', or {} when the alias is still the collection's own name.
+    """
+    return _read_aliases().get(alias, {})
+
+def write_alias(alias: str, record: dict) -> None:
+    """
+    Points `alias` at another collection. The aliases file is replaced with a single rename, so
+    every process sees either the old or the new target, never a mix.
+    """
+    path = aliases_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    aliases = _read_aliases()
+    aliases[alias] = record
+    temporary_path = f"{path}.tmp-{os.getpid()}"
+    with open(temporary_path, 'w') as f:
+        json.dump(aliases, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+def generation_stamp_path() -> str:
+    return getattr(settings, 'MEMORY_GENERATION_STAMP_PATH', os.path.join(CHROMADB_PERSIST_PATH, 'memory_generation'))
+
+def read_generation_stamp() -> str:
+    """The token last written by write_generation_stamp, in any process ('' before the first write)."""
+    try:
+        with open(generation_stamp_path()) as f:
+            return f.read()
+    except OSError:
+        return ''
+
+def write_generation_stamp() -> None:
+    """
+    Replaces the generation stamp with a fresh token, so every process's caches of query results
+    see that the memories changed, whichever process (server, worker or management command) wrote them.
+    """
+    path = generation_stamp_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(temporary_path, 'w') as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(temporary_path, path)
+
+# Chroma's own HNSW defaults, used to tell whether an existing collection matches the settings
+HNSW_DEFAULTS = {'hnsw:space': 'l2', 'hnsw:M': 16, 'hnsw:construction_ef': 100, 'hnsw:search_ef': 10}
+
+def hnsw_metadata() -> dict:
+    """Collection metadata carrying the HNSW index parameters from settings (CHROMA_HNSW_*)."""
+    return {
+        'hnsw:space': getattr(settings, 'CHROMA_HNSW_SPACE', HNSW_DEFAULTS['hnsw:space']),
+        'hnsw:M': getattr(settings, 'CHROMA_HNSW_M', HNSW_DEFAULTS['hnsw:M']),
+        'hnsw:construction_ef': getattr(settings, 'CHROMA_HNSW_CONSTRUCTION_EF', HNSW_DEFAULTS['hnsw:construction_ef']),
+        'hnsw:search_ef': getattr(settings, 'CHROMA_HNSW_SEARCH_EF', HNSW_DEFAULTS['hnsw:search_ef']),
+    }
+
+class CollectionCache:
+    """
+    LRU cache of collection handles, so per-tenant shards are opened on first use and the
+    least recently used handles are dropped once more than `max_size` tenants are active.
+    """
+
+    def __init__(self, client, max_size: int = 128, metadata: dict = None):
+        self.client = client
+        self.max_size = max_size
+        self.metadata = metadata
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, name: str, create: bool = True):
+        """
+        Returns the handle for collection `name`. A missing collection is created when `create`
+        is set, otherwise None is returned (so reads do not create empty shards).
+        """
+        with self._lock:
+            handle = self._handles.get(name)
+            if handle is not None:
+                self._handles.move_to_end(name)
+                self.hits += 1
+                return handle
+            self.misses += 1
+        if create:
+            handle = self.client.get_or_create_collection(name=name, metadata=self.metadata)
+        else:
+            try:
+                handle = self.client.get_collection(name)
+            except Exception:
+                return None  # No such collection yet
+        with self._lock:
+            self._handles[name] = handle
+            self._handles.move_to_end(name)
+            while len(self._handles) > self.max_size:
+                self._handles.popitem(last=False)
+                self.evictions += 1
+        return handle
+
+    def invalidate(self, name: str = None) -> None:
+        """Drops one cached handle (or all of them), e.g. after a collection was deleted or renamed."""
+        with self._lock:
+            if name is None:
+                self._handles.clear()
+            else:
+                self._handles.pop(name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'open': len(self._handles),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
 
 class ChromaService:
     _instance = None
@@ -22,18 +192,92 @@ class ChromaService:
 
     def _initialize_client(self):
         """Initializes the ChromaDB client and gets/creates the collection."""
-        print(f"DEBUG: Initializing ChromaDB client at: {CHROMADB_PERSIST_PATH}")
-        # Ensure the directory exists
-        os.makedirs(CHROMADB_PERSIST_PATH, exist_ok=True)
-        self.client = chromadb.PersistentClient(path=CHROMADB_PERSIST_PATH)
-        # Define your collection name - can be dynamic later if needed per user
-        self.collection_name = "vision_tracker_memories"
-        self._collection = self.client.get_or_create_collection(name=self.collection_name)
-        print(f"DEBUG: ChromaDB collection '{self.collection_name}' ready.")
-
-    def add_memory(self, doc_id: str, document_text: str, metadata: dict = None):
-        """
-        Adds a single document to the ChromaDB collection.
+        self.client = open_vector_store()
+        self.alias = MEMORIES_ALIAS
+        # Per-tenant shards (MEMORY_SHARDING_ENABLED) are opened lazily through this cache
+        self.shards = CollectionCache(
+            self.client, getattr(settings, 'MEMORY_SHARD_CACHE_SIZE', 128), metadata=hnsw_metadata()
+        )
+        # Bumped on every write so caches of query results (see recall_cache.py) know they are stale;
+        # writes made by other processes are seen through the shared stamp (see current_generation)
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self._alias_lock = threading.Lock()
+        self._alias_checked_at = time.monotonic()
+        self._open_collection(read_alias(self.alias))
+
+    def _open_collection(self, record: dict) -> None:
+        """Opens the collection an alias record points to (the alias's own name when there is none)."""
+        self.collection_name = record.get('collection', self.alias)
+        # Memories and queries must be embedded with the model the collection was built with
+        self.embedder = get_embedding_provider(record.get('embedding_provider'), record.get('embedding_model'))
+        self._collection = self.client.get_or_create_collection(name=self.collection_name, metadata=hnsw_metadata())
+        # HNSW parameters are fixed when a collection is created; changing them needs a rebuild
+        current = {**HNSW_DEFAULTS, **{key: value for key, value in (self._collection.metadata or {}).items() if key.startswith('hnsw:')}}
+        if current != hnsw_metadata() and not isinstance(self.client, FlatVectorStore):
+            print(f"WARNING: Collection '{self.collection_name}' was built with {current}, not the configured "
+                  f"{hnsw_metadata()}. Run `manage.py tune_vector_index --apply` to rebuild it.")
+        self.shards.invalidate()
+        print(f"DEBUG: ChromaDB collection '{self.collection_name}' ready (embeddings: {self.embedder.model_name}).")
+
+    def refresh_collection(self) -> None:
+        """
+        Follows the alias once `reembed_memories` has switched it to a rebuilt collection.
+        The aliases file is re-read at most every MEMORY_ALIAS_REFRESH_SECONDS.
+        """
+        with self._alias_lock:
+            now = time.monotonic()
+            if now - self._alias_checked_at < getattr(settings, 'MEMORY_ALIAS_REFRESH_SECONDS', 30):
+                return
+            self._alias_checked_at = now
+            record = read_alias(self.alias)
+            if record.get('collection', self.alias) == self.collection_name:
+                return
+            self._open_collection(record)
+        self.bump_generation()
+
+    def bump_generation(self) -> int:
+        """Marks the collection as changed, here and in every other process. Returns the new generation."""
+        with self._generation_lock:
+            self.generation += 1
+            generation = self.generation
+        try:
+            write_generation_stamp()
+        except OSError as e:
+            print(f"WARNING: Could not write the memory generation stamp: {e}")
+        return generation
+
+    def current_generation(self) -> tuple:
+        """
+        Identifies the state of the memories for cache keys: this process's own write counter plus
+        the shared stamp, which changes when any other process writes.
+        """
+        return self.generation, read_generation_stamp()
+
+    def resolve_tenant(self, tenant: str = None) -> Optional[str]:
+        """
+        The tenant whose shard an operation uses: `tenant` if given, else the current request's
+        tenant (see tenancy.py). None when sharding is disabled.
+        """
+        if not sharding_enabled():
+            return None
+        return tenant or get_current_tenant()
+
+    def collection_for(self, tenant: str = None, create: bool = True):
+        """
+        Returns the collection holding `tenant`'s memories: its shard when sharding is enabled,
+        otherwise the single shared collection. With create=False, a tenant without a shard yet
+        gets None.
+        """
+        self.refresh_collection()
+        tenant = self.resolve_tenant(tenant)
+        if tenant is None:
+            return self._collection
+        return self.shards.get(shard_collection_name(self.collection_name, tenant), create=create)
+
+    def add_memory(self, doc_id: str, document_text: str, metadata: dict = None, tenant: str = None):
+        """
+        Adds a single document to the ChromaDB collection (the tenant's shard when sharding is enabled).
         Generates embedding using Gemini.
         """
         if not document_text.strip():
@@ -41,58 +285,360 @@ class ChromaService:
             return
 
         try:
-            embedding = generate_embedding(document_text)
+            embedding = generate_embedding(document_text, provider=self.embedder)
             if not embedding:
                 print(f"Error: Could not generate embedding for document ID {doc_id}.")
                 return
 
-            self._collection.add(
+            self.collection_for(tenant).add(
                 documents=[document_text],
-                metadatas=[metadata if metadata is not None else {}],
+                # Chroma rejects empty metadata dicts; None stores a row without metadata
+                metadatas=[metadata or None],
                 embeddings=[embedding],
                 ids=[doc_id]
             )
+            self.bump_generation()
             print(f"DEBUG: Document ID '{doc_id}' added to ChromaDB.")
         except Exception as e:
             print(f"ERROR: Failed to add document ID '{doc_id}' to ChromaDB: {e}")
 
-    def query_memories(self, query_text: str, n_results: int = 5) -> list:
+    def add_memories(self, items: list, upsert: bool = False, embeddings: list = None, tenant: str = None) -> dict:
+        """
+        Adds many documents to the ChromaDB collection.
+        Embeds in batches and writes to Chroma in large add/upsert chunks.
+
+        Args:
+            items: A list of dicts with 'id', 'document' and optional 'metadata' keys.
+            upsert: Replace existing vectors with the same ID instead of failing on them.
+            embeddings: Optional precomputed embeddings aligned with `items` (see aadd_memories).
+            tenant: Whose shard to write to when sharding is enabled (default: the current tenant).
+
+        Returns:
+            A dict with 'added' (list of IDs written) and 'failed' (dict of ID -> reason; an item
+            without an ID is reported under '#<its index in items>').
+        """
+        added, failed = [], {}
+        valid_items, valid_embeddings = [], []
+        for index, item in enumerate(items):
+            doc_id, document_text = item.get('id'), item.get('document') or ''
+            if not doc_id:
+                failed[f"#{index}"] = "Missing document ID."
+            elif not document_text.strip():
+                failed[doc_id] = "Empty document."
+            else:
+                valid_items.append(item)
+                valid_embeddings.append(embeddings[index] if embeddings is not None else None)
+
+        if not valid_items:
+            return {'added': added, 'failed': failed}
+
+        if embeddings is None:
+            valid_embeddings = generate_embeddings([item['document'] for item in valid_items], provider=self.embedder)
+        embeddings = valid_embeddings
+
+        ready = []
+        for item, embedding in zip(valid_items, embeddings):
+            if embedding:
+                ready.append((item, embedding))
+            else:
+                failed[item['id']] = "Could not generate embedding."
+
+        write_batch_size = getattr(settings, 'CHROMA_WRITE_BATCH_SIZE', 1000)
+        collection = self.collection_for(tenant)
+        write = collection.upsert if upsert else collection.add
+        for start in range(0, len(ready), write_batch_size):
+            batch = ready[start:start + write_batch_size]
+            batch_ids = [item['id'] for item, _ in batch]
+            try:
+                write(
+                    documents=[item['document'] for item, _ in batch],
+                    metadatas=[item.get('metadata') or None for item, _ in batch],
+                    embeddings=[embedding for _, embedding in batch],
+                    ids=batch_ids
+                )
+                added.extend(batch_ids)
+                self.bump_generation()
+            except Exception as e:
+                print(f"ERROR: Failed to write batch of {len(batch_ids)} documents to ChromaDB: {e}")
+                for doc_id in batch_ids:
+                    failed[doc_id] = f"ChromaDB write failed: {e}"
+
+        print(f"DEBUG: Bulk {'upserted' if upsert else 'added'} {len(added)} documents to ChromaDB, {len(failed)} failed.")
+        return {'added': added, 'failed': failed}
+
+    def delete_memories(self, doc_ids: list, tenant: str = None, keep: set = None) -> bool:
+        """
+        Removes documents by ID from the collection (the tenant's shard when sharding is enabled),
+        together with the chunks of long memories stored under those IDs (see chunker.py).
+        IDs in `keep` are left alone, so a re-indexed memory can drop only its stale chunks.
+        Returns False if the delete failed.
+        """
+        collection = self.collection_for(tenant, create=False)
+        if collection is None or not doc_ids:
+            return True
+        try:
+            children = collection.get(where={'parent_id': {'$in': list(doc_ids)}}, include=[])['ids']
+            stale = [doc_id for doc_id in dict.fromkeys(list(doc_ids) + children) if doc_id not in (keep or ())]
+            if not stale:
+                return True
+            collection.delete(ids=stale)
+            self.bump_generation()
+            print(f"DEBUG: Deleted {len(stale)} documents from ChromaDB.")
+            return True
+        except Exception as e:
+            print(f"ERROR: Failed to delete {len(doc_ids)} documents from ChromaDB: {e}")
+            return False
+
+    @staticmethod
+    def build_where(where: dict = None, created_after: datetime = None, created_before: datetime = None,
+                    category: str = None) -> dict:
+        """
+        Combines the caller's `where` clause with the common metadata filters.
+        `created_at` is stored as epoch seconds (see ingestion_service.build_chroma_metadata).
+        """
+        clauses = [where] if where else []
+        if created_after:
+            clauses.append({'created_at': {'$gte': int(created_after.timestamp())}})
+        if created_before:
+            clauses.append({'created_at': {'$lte': int(created_before.timestamp())}})
+        if category:
+            clauses.append({'category': category})
+        if not clauses:
+            return None
+        # Chroma rejects an $and with fewer than two operands
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def _vector_search(self, collection, query_texts: list, n_results: int, where: dict = None,
+                       with_embeddings: bool = False, query_embeddings: list = None) -> list:
+        """
+        Embeds all queries in one batch (unless precomputed) and runs them as a single Chroma query.
+        Returns one ranked hit list per query that could be embedded.
+        """
+        if query_embeddings is None:
+            query_embeddings = generate_embeddings(query_texts, provider=self.embedder)
+        embedded = [(text, embedding) for text, embedding in zip(query_texts, query_embeddings) if embedding]
+        for text, embedding in zip(query_texts, query_embeddings):
+            if not embedding:
+                print(f"Error: Could not generate embedding for query '{text}'.")
+        if not embedded:
+            return []
+
+        include = ['documents', 'metadatas', 'distances'] + (['embeddings'] if with_embeddings else [])
+        results = collection.query(
+            query_embeddings=[embedding for _, embedding in embedded],
+            n_results=n_results,
+            where=where,
+            include=include
+        )
+
+        # Format results for easier use
+        ranked_lists = []
+        for q in range(len(results['ids']) if results and results['ids'] else 0):
+            formatted_results = []
+            for i in range(len(results['ids'][q])):
+                formatted_results.append({
+                    'id': results['ids'][q][i],
+                    'document': results['documents'][q][i],
+                    'metadata': results['metadatas'][q][i] if results['metadatas'][q] else {},
+                    'distance': results['distances'][q][i] if results['distances'][q] else None
+                })
+                if with_embeddings:
+                    formatted_results[-1]['embedding'] = results['embeddings'][q][i]
+            ranked_lists.append(formatted_results)
+        return ranked_lists
+
+    @staticmethod
+    def fuse_results(ranked_lists: list, n_results: int, rrf_k: int = 60) -> list:
+        """
+        Reciprocal Rank Fusion: every hit scores sum(1 / (rrf_k + rank)) over the lists it appears in,
+        which also de-duplicates hits shared by several queries. When the same ID appears in several
+        lists, the entry with the smallest vector distance is kept (keyword hits have none).
+        """
+        scores, hits = {}, {}
+        for ranked in ranked_lists:
+            for rank, hit in enumerate(ranked, start=1):
+                scores[hit['id']] = scores.get(hit['id'], 0.0) + 1.0 / (rrf_k + rank)
+                kept = hits.get(hit['id'])
+                if kept is None or (
+                    hit.get('distance') is not None
+                    and (kept.get('distance') is None or hit['distance'] < kept['distance'])
+                ):
+                    hits[hit['id']] = hit
+        fused = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return [
+            {
+                'id': doc_id,
+                'document': hits[doc_id]['document'],
+                'metadata': hits[doc_id]['metadata'],
+                'distance': hits[doc_id].get('distance'),
+                'score': scores[doc_id],
+                'embedding': hits[doc_id].get('embedding'),
+            }
+            for doc_id in fused
+        ]
+
+    @staticmethod
+    def collapse_by_parent(hits: list) -> list:
+        """
+        Keeps one hit per memory: chunks of a long memory (and keyword hits on it) share its
+        'parent_id', and only the best-ranked one is kept, under the parent's ID. A keyword hit
+        on the whole memory gives way to a matching chunk, whose span is more precise.
+        """
+        collapsed = {}
+        for hit in hits:
+            parent_id = hit['metadata'].get('parent_id') or hit['id']
+            kept = collapsed.get(parent_id)
+            if kept is None:
+                collapsed[parent_id] = {**hit, 'id': parent_id}
+            elif kept.get('distance') is None and hit.get('distance') is not None:
+                collapsed[parent_id] = {**hit, 'id': parent_id, 'score': kept['score']}
+        return list(collapsed.values())
+
+    def diversify(self, hits: list, n_results: int, collection=None) -> list:
+        """
+        Re-ranks fused hits with Maximal Marginal Relevance (see mmr.py) so near-identical memories
+        do not crowd out everything else. Relevance is the fused score scaled to [0, 1]; hits found
+        only by keyword search have their embeddings fetched from the collection.
+        """
+        if len(hits) <= n_results:
+            return hits
+        missing = [hit['id'] for hit in hits if hit.get('embedding') is None]
+        if missing:
+            stored = (collection or self._collection).get(ids=missing, include=['embeddings'])
+            by_id = dict(zip(stored['ids'], stored['embeddings']))
+            for hit in hits:
+                if hit.get('embedding') is None:
+                    hit['embedding'] = by_id.get(hit['id'])
+        dimensions = next((len(hit['embedding']) for hit in hits if hit['embedding'] is not None), 0)
+        if not dimensions:
+            return hits[:n_results]
+
+        # One contiguous float32 matrix: handing mmr_rerank a list of rows makes NumPy convert
+        # them element by element, which costs several times the re-ranking itself
+        embeddings = np.zeros((len(hits), dimensions), dtype=np.float32)
+        for row, hit in enumerate(hits):
+            if hit['embedding'] is not None:
+                embeddings[row] = hit['embedding']  # Hits without an embedding stay zero (similar to nothing)
+        top_score = hits[0]['score'] or 1.0
+        order = mmr_rerank(
+            embeddings,
+            np.fromiter((hit['score'] for hit in hits), dtype=np.float32, count=len(hits)) / top_score,
+            n_results,
+            getattr(settings, 'MEMORY_MMR_LAMBDA', 0.7),
+        )
+        return [hits[index] for index in order]
+
+    @staticmethod
+    def clean_queries(query_text: Union[str, List[str]]) -> List[str]:
+        """Normalizes a query or list of queries: strips whitespace, drops blanks and duplicates."""
+        query_texts = [query_text] if isinstance(query_text, str) else list(query_text)
+        return list(dict.fromkeys(text.strip() for text in query_texts if text and text.strip()))
+
+    def query_memories(self, query_text: Union[str, List[str]], n_results: int = 5, where: dict = None,
+                       created_after: datetime = None, created_before: datetime = None, category: str = None,
+                       query_embeddings: list = None, tenant: str = None) -> list:
         """
         Queries the ChromaDB collection for similar documents.
+        With MEMORY_SHARDING_ENABLED only the tenant's own shard (and keyword index rows) are searched.
         Generates embedding for the query using Gemini.
-        Returns a list of dictionaries with 'id', 'document', 'metadata', 'distance'.
+
+        Several queries can be given at once: they are embedded in one batch, sent as one Chroma
+        query, and their results are de-duplicated and merged into a single ranking.
+
+        With MEMORY_HYBRID_SEARCH enabled, a BM25 keyword search over MemoryChunk text (see
+        keyword_index.py) runs alongside the vector search and both rankings are merged with
+        Reciprocal Rank Fusion, so exact names and rare terms are found even when the embedding
+        misses them. Keyword-only hits have a 'distance' of None.
+        With MEMORY_MMR_ENABLED, MEMORY_MMR_FETCH_FACTOR times more candidates are fetched and
+        re-ranked with Maximal Marginal Relevance so the results are not near-duplicates.
+        Long memories are stored as several chunks; hits are collapsed to one per memory, and their
+        'document' is the matching span plus a little surrounding text rather than the whole memory.
+
+        Args:
+            query_text: The text to search for, or a list of texts.
+            n_results: The maximum number of memories to return per query.
+            where: An optional raw Chroma metadata filter. Keyword search is skipped when given,
+                   since it cannot be translated to SQL.
+            created_after / created_before: Only return memories created within this range.
+            category: Only return memories whose metadata 'category' matches.
+            query_embeddings: Optional precomputed embeddings aligned with the queries (see aquery_memories).
+            tenant: Whose memories to search when sharding is enabled (default: the current tenant).
+
+        Returns a list of dictionaries with 'id', 'document', 'metadata', 'distance', 'score'.
         """
-        if not query_text.strip():
+        query_texts = self.clean_queries(query_text)
+        if not query_texts:
             print("Warning: Attempted to query ChromaDB with empty text.")
             return []
+        total_results = n_results * len(query_texts)
+        tenant = self.resolve_tenant(tenant)
+        collection = self.collection_for(tenant, create=False)
 
+        hybrid = getattr(settings, 'MEMORY_HYBRID_SEARCH', True) and not where
+        # A tenant without a shard has no vectors to search or re-rank with
+        mmr = getattr(settings, 'MEMORY_MMR_ENABLED', True) and collection is not None
+        # Over-fetch so fusion and MMR have candidates to choose between
+        fetch_factor = max(2 if hybrid else 1, getattr(settings, 'MEMORY_MMR_FETCH_FACTOR', 4) if mmr else 1)
+        candidates = n_results * fetch_factor
         try:
-            query_embedding = generate_embedding(query_text)
-            if not query_embedding:
-                print(f"Error: Could not generate embedding for query '{query_text}'.")
-                return []
-
-            results = self._collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
-            )
-
-            # Format results for easier use
-            formatted_results = []
-            if results and results['ids']:
-                for i in range(len(results['ids'][0])):
-                    formatted_results.append({
-                        'id': results['ids'][0][i],
-                        'document': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'][0] else {},
-                        'distance': results['distances'][0][i] if results['distances'][0] else None
-                    })
-            print(f"DEBUG: Queried ChromaDB for '{query_text}', found {len(formatted_results)} results.")
-            return formatted_results
+            vector_hits = self._vector_search(
+                collection, query_texts, candidates, self.build_where(where, created_after, created_before, category),
+                with_embeddings=mmr, query_embeddings=query_embeddings
+            ) if collection is not None else []
         except Exception as e:
             print(f"ERROR: Failed to query ChromaDB: {e}")
+            vector_hits = []
+
+        keyword_hits = []
+        if hybrid:
+            keyword_hits = [
+                keyword_index.search(
+                    text, candidates, created_after=created_after, created_before=created_before, category=category,
+                    tenant=tenant
+                )
+                for text in query_texts
+            ]
+
+        formatted_results = self.collapse_by_parent(self.fuse_results(
+            vector_hits + keyword_hits, candidates * len(query_texts), getattr(settings, 'MEMORY_RRF_K', 60)
+        ))
+        if mmr:
+            try:
+                formatted_results = self.diversify(formatted_results, total_results, collection)
+            except Exception as e:
+                print(f"ERROR: MMR re-ranking failed, falling back to fused order: {e}")
+                formatted_results = formatted_results[:total_results]
+        else:
+            formatted_results = formatted_results[:total_results]
+        for result in formatted_results:
+            result.pop('embedding', None)
+        try:
+            formatted_results = expand_hits(formatted_results, query_texts)
+        except Exception as e:
+            print(f"ERROR: Could not load the surrounding text of long memories: {e}")
+        print(f"DEBUG: Queried memories for {query_texts}: {sum(map(len, vector_hits))} vector and "
+              f"{sum(map(len, keyword_hits))} keyword hits, returning {len(formatted_results)} results.")
+        return formatted_results
+
+    async def aquery_memories(self, query_text: Union[str, List[str]], n_results: int = 5, **filters) -> list:
+        """
+        Async query_memories: the queries are embedded on the Gemini executor and the search runs
+        on the Chroma executor, so each backend is bounded by its own concurrency limit.
+        """
+        query_texts = self.clean_queries(query_text)
+        if not query_texts:
             return []
+        self.refresh_collection()
+        query_embeddings = await agenerate_embeddings(query_texts, provider=self.embedder)
+        return await run_on(
+            CHROMA, self.query_memories, query_texts, n_results, query_embeddings=query_embeddings, **filters
+        )
+
+    async def aadd_memories(self, items: list, upsert: bool = False) -> dict:
+        """Async add_memories: embeds on the Gemini executor, writes on the Chroma executor."""
+        self.refresh_collection()
+        embeddings = await agenerate_embeddings([item.get('document') or '' for item in items], provider=self.embedder)
+        return await run_on(CHROMA, self.add_memories, items, upsert, embeddings)
 
 # Make it a singleton to ensure only one client instance
-chroma_service = ChromaService()
\ No newline at end of file
+chroma_service = ChromaService()
@@ -0,0 +1,128 @@
+# vision_tracker_app/vision_tracker_api/services/chunker.py
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .context_window import CHARS_PER_TOKEN, estimate_tokens
+
+_SENTENCE_END_RE = re.compile(r"[.!?]['\")\]]*\s+|\n\s*")
+_WORD_RE = re.compile(r"\w+")
+
+
+def chunk_settings() -> Tuple[int, int]:
+    """Returns (max_tokens, overlap_tokens) per chunk from settings."""
+    max_tokens = getattr(settings, 'MEMORY_CHUNK_MAX_TOKENS', 256)
+    overlap_tokens = min(getattr(settings, 'MEMORY_CHUNK_OVERLAP_TOKENS', 32), max_tokens // 2)
+    return max_tokens, overlap_tokens
+
+
+def chunk_vector_id(parent_id: str, index: int) -> str:
+    """Vector-store ID of the `index`-th chunk of the memory stored as `parent_id`."""
+    return f"{parent_id}#c{index}"
+
+
+def _snap_end(text: str, start: int, end: int) -> int:
+    """Moves a chunk end back to the last sentence end, else word break, in the second half of the chunk."""
+    floor = start + (end - start) // 2
+    last_sentence = None
+    for match in _SENTENCE_END_RE.finditer(text, floor, end):
+        last_sentence = match.end()
+    if last_sentence:
+        return last_sentence
+    space = text.rfind(' ', floor, end)
+    return space + 1 if space > floor else end
+
+
+def _snap_start(text: str, start: int) -> int:
+    """Moves a chunk start forward to the beginning of the next word."""
+    if start <= 0 or text[start - 1].isspace():
+        return start
+    space = text.find(' ', start)
+    return space + 1 if space != -1 else start
+
+
+def split_text(text: str, max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Splits text into overlapping pieces of at most `max_tokens` estimated tokens (see
+    context_window.estimate_tokens), preferring to cut at sentence ends, then at word breaks.
+
+    Returns:
+        List[Tuple[int, int]]: (char_start, char_end) of each piece. Text that fits in one piece
+        gives a single span covering all of it.
+    """
+    default_max, default_overlap = chunk_settings()
+    max_tokens = max_tokens or default_max
+    overlap_tokens = default_overlap if overlap_tokens is None else overlap_tokens
+    if estimate_tokens(text) <= max_tokens:
+        return [(0, len(text))]
+
+    window = max_tokens * CHARS_PER_TOKEN
+    overlap = overlap_tokens * CHARS_PER_TOKEN
+    spans = []
+    start = 0
+    while start < len(text):
+        end = min(start + window, len(text))
+        if end < len(text):
+            end = _snap_end(text, start, end)
+        spans.append((start, end))
+        if end >= len(text):
+            break
+        start = max(_snap_start(text, end - overlap), start + 1)
+    return spans
+
+
+def expand_span(text: str, start: int, end: int, context_chars: int) -> str:
+    """Returns text[start:end] widened by about `context_chars` on each side, cut at word breaks."""
+    left = max(0, start - context_chars)
+    right = min(len(text), end + context_chars)
+    if left > 0:
+        left = _snap_start(text, left)
+    if right < len(text):
+        space = text.rfind(' ', end, right)
+        right = space if space != -1 else right
+    snippet = text[left:right].strip()
+    return f"{'…' if left > 0 else ''}{snippet}{'…' if right < len(text) else ''}"
+
+
+def keyword_span(text: str, query_texts: List[str]) -> Tuple[int, int]:
+    """The chunk-sized span of `text` around the first occurrence of any query word."""
+    max_tokens, _ = chunk_settings()
+    window = max_tokens * CHARS_PER_TOKEN
+    lowered = text.lower()
+    positions = [
+        position for query in query_texts for word in _WORD_RE.findall(query.lower())
+        if len(word) > 2 and (position := lowered.find(word)) != -1
+    ]
+    center = min(positions) if positions else 0
+    start = max(0, min(center - window // 4, len(text) - window))
+    return start, min(len(text), start + window)
+
+
+def expand_hits(hits: List[Dict[str, Any]], query_texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    Replaces the document of each hit on a long memory with the matching span plus
+    MEMORY_CHUNK_CONTEXT_TOKENS of surrounding text, so recall does not paste whole journal
+    entries into the prompt. Chunk hits carry their span in metadata; keyword hits (which
+    return the full text) are cut around the first matching query word.
+    """
+    from ..models import MemoryChunk
+
+    max_tokens, _ = chunk_settings()
+    context_chars = getattr(settings, 'MEMORY_CHUNK_CONTEXT_TOKENS', 32) * CHARS_PER_TOKEN
+    chunked = {
+        hit['metadata']['memory_chunk_id'] for hit in hits
+        if 'char_start' in hit['metadata'] and hit['metadata'].get('memory_chunk_id') is not None
+    }
+    parents = dict(MemoryChunk.objects.filter(pk__in=chunked).values_list('pk', 'text_content')) if chunked else {}
+
+    for hit in hits:
+        metadata = hit['metadata']
+        parent_text = parents.get(metadata.get('memory_chunk_id'))
+        if parent_text is not None:
+            hit['document'] = expand_span(parent_text, metadata['char_start'], metadata['char_end'], context_chars)
+        elif hit['document'] and estimate_tokens(hit['document']) > max_tokens:
+            start, end = keyword_span(hit['document'], query_texts)
+            hit['document'] = expand_span(hit['document'], start, end, context_chars)
+    return hits
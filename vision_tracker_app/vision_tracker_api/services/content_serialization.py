@@ -0,0 +1,49 @@
+# vision_tracker_app/vision_tracker_api/services/content_serialization.py
+
+import logging
+from typing import Any, Dict, List
+
+import google.generativeai as genai
+from google.protobuf.json_format import MessageToDict, ParseDict
+
+logger = logging.getLogger(__name__)
+
+
+def deserialize_messages(conversation_id: str, message_dicts: List[Dict[str, Any]]) -> List[genai.protos.Content]:
+    """
+    Converts stored message dictionaries back into genai.protos.Content objects.
+    Corrupted messages are logged and skipped.
+    """
+    deserialized_history = []
+    for msg_dict in message_dicts:
+        content_message = genai.protos.Content()
+        try:
+            # ParseDict populates the message object from a dictionary
+            ParseDict(js_dict=msg_dict, message=content_message._pb)
+            deserialized_history.append(content_message)
+        except Exception as e:
+            logger.error(f"Failed to deserialize message: {msg_dict} for conversation '{conversation_id}'. Error: {e}")
+            # For robustness, we skip the corrupted message here.
+            continue
+    return deserialized_history
+
+
+def serialize_messages(conversation_id: str, history: List[genai.protos.Content]) -> List[Dict[str, Any]]:
+    """
+    Converts genai.protos.Content objects into JSON-serializable dictionaries for storage.
+    Non-Content objects and messages that fail to serialize are logged and skipped.
+    """
+    serializable_history = []
+    for content_message in history:
+        if not isinstance(content_message, genai.protos.Content):
+            logger.warning(f"Skipping non-Content object in history for conversation '{conversation_id}': {type(content_message)}")
+            continue
+        try:
+            # MessageToDict converts the protobuf message to a dictionary
+            # preserving_proto_field_name=True ensures field names match the proto definition
+            serializable_history.append(MessageToDict(message=content_message._pb, preserving_proto_field_name=True))
+        except Exception as e:
+            logger.error(f"Failed to serialize message: {content_message} for conversation '{conversation_id}'. Error: {e}")
+            # Skipping offers more robustness against individual message corruption.
+            continue
+    return serializable_history
@@ -0,0 +1,153 @@
+# vision_tracker_app/vision_tracker_api/services/context_window.py
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import google.generativeai as genai
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from .model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Rough chars-per-token ratio for Gemini's tokenizer on English text. Good enough for
+# budgeting without a count_tokens round trip per turn.
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PREFIX = "Summary of our earlier conversation (older turns are not shown verbatim):\n"
+SUMMARY_ACK = "Understood. I'll keep that earlier context in mind."
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the token count of a string locally."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def content_tokens(content: genai.protos.Content) -> int:
+    """Estimates the tokens a Content message contributes to the prompt, including tool calls and results."""
+    tokens = 1 # Role / turn separator overhead
+    for part in content.parts:
+        if part.text:
+            tokens += estimate_tokens(part.text)
+        elif part.function_call:
+            tokens += estimate_tokens(part.function_call.name) + estimate_tokens(json.dumps(type(part.function_call).to_dict(part.function_call).get('args', {})))
+        elif part.function_response:
+            tokens += estimate_tokens(json.dumps(type(part.function_response).to_dict(part.function_response).get('response', {})))
+    return tokens
+
+
+def is_turn_start(content: genai.protos.Content) -> bool:
+    """A turn starts with a user message carrying text (not a function response)."""
+    return content.role == 'user' and any(part.text for part in content.parts)
+
+
+def content_text(content: genai.protos.Content) -> str:
+    """Returns the plain text of a message, ignoring tool calls and results."""
+    return "".join(part.text for part in content.parts if part.text)
+
+
+class ContextWindow:
+    """The slice of a conversation that is sent to the model for one turn."""
+
+    def __init__(self, messages: List[genai.protos.Content], start: int, summarized_count: int, tokens: int):
+        self.messages = messages # What start_chat receives: optional summary pair + verbatim tail
+        self.start = start # Index in the full history where the verbatim tail begins
+        self.summarized_count = summarized_count # Messages already folded into the stored summary
+        self.tokens = tokens
+
+    @property
+    def needs_summary(self) -> bool:
+        """True when messages before the verbatim tail are not yet covered by the summary."""
+        return self.start > self.summarized_count
+
+
+def build_context_window(history: List[genai.protos.Content], summary: str = "", summarized_count: int = 0,
+                         max_turns: Optional[int] = None, token_budget: Optional[int] = None) -> ContextWindow:
+    """
+    Keeps at most `max_turns` recent turns verbatim, dropping older ones until the estimated
+    prompt size (summary included) fits `token_budget`. The most recent turn is always kept.
+    """
+    max_turns = max_turns or getattr(settings, 'CHAT_HISTORY_MAX_TURNS', 10)
+    token_budget = token_budget or getattr(settings, 'CHAT_HISTORY_TOKEN_BUDGET', 8000)
+
+    turn_starts = [index for index, content in enumerate(history) if is_turn_start(content)]
+    if not turn_starts or turn_starts[0] != 0:
+        turn_starts.insert(0, 0)
+    if summary and summarized_count > 0:
+        # Turns already folded into the summary are never repeated verbatim
+        turn_starts = [index for index in turn_starts if index >= summarized_count] or [summarized_count]
+    turn_starts = turn_starts[-max_turns:]
+
+    summary_tokens = estimate_tokens(summary) + estimate_tokens(SUMMARY_PREFIX + SUMMARY_ACK) if summary else 0
+    message_tokens = [content_tokens(content) for content in history]
+
+    start = turn_starts[0] if history else 0
+    tokens = summary_tokens + sum(message_tokens[start:])
+    for next_start in turn_starts[1:]:
+        if tokens <= token_budget:
+            break
+        tokens -= sum(message_tokens[start:next_start])
+        start = next_start
+
+    messages = list(history[start:])
+    if summary and summarized_count > 0:
+        messages = [
+            genai.protos.Content(role='user', parts=[genai.protos.Part(text=SUMMARY_PREFIX + summary)]),
+            genai.protos.Content(role='model', parts=[genai.protos.Part(text=SUMMARY_ACK)]),
+        ] + messages
+    return ContextWindow(messages, start, summarized_count, tokens)
+
+
+class ConversationSummarizer:
+    """
+    Folds turns that fell out of the context window into the conversation's rolling summary.
+    Runs on a small background pool so it never adds latency to a chat request; at most one
+    refresh per conversation is in flight at a time.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=getattr(settings, 'CHAT_SUMMARY_WORKERS', 1), thread_name_prefix='chat-summary')
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, store, conversation_id: str, history: List[genai.protos.Content], window: ContextWindow, summary: str) -> bool:
+        """Queues an incremental summary refresh covering history[window.summarized_count:window.start]."""
+        if not window.needs_summary:
+            return False
+        with self._lock:
+            if conversation_id in self._in_flight:
+                return False
+            self._in_flight.add(conversation_id)
+        to_fold = list(history[window.summarized_count:window.start])
+        self._executor.submit(self._refresh, store, conversation_id, summary, to_fold, window.start)
+        return True
+
+    def _refresh(self, store, conversation_id: str, summary: str, to_fold: List[genai.protos.Content], upto: int) -> None:
+        try:
+            transcript = "\n".join(
+                f"{content.role}: {content_text(content)}" for content in to_fold if content_text(content)
+            )
+            if transcript:
+                prompt = (
+                    "You maintain a running summary of a coaching conversation between a user and their Vision Assistant. "
+                    "Update the summary with the new exchanges below. Keep facts, decisions, goals, commitments and open "
+                    "questions; drop pleasantries. Reply with the updated summary only, in at most 250 words.\n\n"
+                    f"Current summary:\n{summary or '(none yet)'}\n\nNew exchanges:\n{transcript}"
+                )
+                model = model_registry.get_model(getattr(settings, 'CHAT_SUMMARY_MODEL', 'gemini-1.5-flash'))
+                summary = model.generate_content(prompt).text.strip()
+            async_to_sync(store.save_conversation_summary)(conversation_id, summary, upto)
+            logger.info(f"Refreshed summary of conversation {conversation_id} through message {upto}.")
+        except Exception:
+            logger.exception(f"Failed to refresh summary of conversation {conversation_id}.")
+        finally:
+            with self._lock:
+                self._in_flight.discard(conversation_id)
+
+
+# Initialize the singleton instance when the module is imported
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,160 @@
+# vision_tracker_app/vision_tracker_api/services/dedup.py
+
+import hashlib
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+DEDUP_LINK = 'link'
+DEDUP_MERGE = 'merge'
+DEDUP_MODES = (DEDUP_LINK, DEDUP_MERGE)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the text with case and whitespace normalised, so re-pasted copies hash the same."""
+    normalized = _WHITESPACE_RE.sub(' ', (text or '').strip().lower())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """
+    Converts a vector-store distance into cosine similarity for the collection's `space`.
+    'l2' is Chroma's squared L2 distance, which for unit-length embeddings (Gemini and the
+    normalised MiniLM vectors both are) equals 2 - 2 * cosine similarity.
+    """
+    if space == 'l2':
+        return 1.0 - distance / 2.0
+    return 1.0 - distance  # 'cosine' and 'ip' distances are 1 - similarity
+
+
+class MemoryDeduplicator:
+    """
+    Ingest-time duplicate detection for MemoryChunk rows.
+
+    Exact duplicates share a content hash with an existing memory of the same tenant. Near
+    duplicates are found by embedding similarity to the top neighbour in the tenant's
+    collection. Either way the new row is not indexed: with MEMORY_DEDUP_MODE 'link' it only
+    points at the original (duplicate_of), with 'merge' the original also takes over the new
+    text and metadata, so the latest edit of a reflection is what gets recalled.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MemoryDeduplicator, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.enabled = getattr(settings, 'MEMORY_DEDUP_ENABLED', True)
+        self.threshold = getattr(settings, 'MEMORY_DEDUP_SIMILARITY_THRESHOLD', 0.97)
+        self.mode = getattr(settings, 'MEMORY_DEDUP_MODE', DEDUP_LINK)
+        if self.mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown MEMORY_DEDUP_MODE '{self.mode}'. Expected one of {DEDUP_MODES}.")
+        self._lock = threading.Lock()
+        self._stats = {'exact_duplicates': 0, 'near_duplicates': 0, 'merged': 0, 'skipped_inserts': 0}
+
+    def find_exact(self, chunk) -> Optional[int]:
+        """
+        Returns the primary key of an earlier memory of the same tenant with the same content hash.
+        Rows already indexed are preferred; among pending ones the oldest wins, so two identical rows
+        in one batch do not mark each other as duplicates.
+        """
+        from ..models import MemoryChunk
+
+        return (
+            MemoryChunk.objects
+            .filter(tenant_id=chunk.tenant_id, content_hash=chunk.content_hash, duplicate_of__isnull=True)
+            .filter(Q(index_status=MemoryChunk.INDEX_INDEXED) | Q(pk__lt=chunk.pk))
+            .exclude(pk=chunk.pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+
+    def find_near(self, collection, doc_ids: List[str], embeddings: List[List[float]], tenant_id: str) -> Dict[str, int]:
+        """
+        Looks up the nearest stored neighbour of each embedding in one query, among the vectors
+        of `tenant_id` only: a shared collection holds every tenant's memories, and one tenant's
+        memory must never be linked to (or merged into) another's.
+
+        Returns:
+            Dict[str, int]: Vector ID -> primary key of the memory it nearly duplicates, for every
+            embedding whose closest other vector is at or above the similarity threshold.
+        """
+        from ..models import MemoryChunk
+
+        if collection is None or not doc_ids:
+            return {}
+        space = (collection.metadata or {}).get('hnsw:space', 'l2')
+        try:
+            # Two neighbours, since a re-indexed memory's own previous vector is its closest match
+            results = collection.query(
+                query_embeddings=embeddings, n_results=2, include=['metadatas', 'distances'],
+                where={'tenant_id': tenant_id} if tenant_id else None,
+            )
+        except Exception as e:
+            logger.error(f"Near-duplicate lookup failed, indexing without it: {e}")
+            return {}
+
+        matches = {}
+        for doc_id, hit_ids, metadatas, distances in zip(
+            doc_ids, results['ids'], results['metadatas'], results['distances']
+        ):
+            for hit_id, metadata, distance in zip(hit_ids, metadatas, distances):
+                metadata = metadata or {}
+                # Vectors written before tenants existed have no tenant_id; they only match untenanted rows
+                if hit_id == doc_id or metadata.get('parent_id') == doc_id or metadata.get('tenant_id', '') != tenant_id:
+                    continue
+                original_pk = metadata.get('memory_chunk_id')
+                if original_pk is not None and distance_to_similarity(distance, space) >= self.threshold:
+                    matches[doc_id] = int(original_pk)
+                break
+        if not matches:
+            return matches
+        # Vector metadata can be stale (e.g. copied by shard_memories); the row decides whose memory it is
+        owned = set(
+            MemoryChunk.objects.filter(pk__in=set(matches.values()), tenant_id=tenant_id).values_list('pk', flat=True)
+        )
+        return {doc_id: original_pk for doc_id, original_pk in matches.items() if original_pk in owned}
+
+    def resolve(self, chunk, original_pk: int, near: bool) -> None:
+        """Marks `chunk` as a duplicate of `original_pk` and, in merge mode, folds it into the original."""
+        from ..models import MemoryChunk
+
+        MemoryChunk.objects.filter(pk=chunk.pk).update(
+            duplicate_of_id=original_pk, index_status=MemoryChunk.INDEX_DUPLICATE
+        )
+        merged = False
+        if self.mode == DEDUP_MERGE and near:
+            original = MemoryChunk.objects.filter(pk=original_pk).first()
+            if original is not None and original.tenant_id == chunk.tenant_id:
+                original.text_content = chunk.text_content
+                original.content_hash = chunk.content_hash
+                original.metadata = {**(original.metadata or {}), **(chunk.metadata or {})}
+                original.save()  # post_save re-indexes the original with the merged content
+                merged = True
+        with self._lock:
+            self._stats['near_duplicates' if near else 'exact_duplicates'] += 1
+            self._stats['merged'] += int(merged)
+            self._stats['skipped_inserts'] += 1
+        logger.info(
+            f"MemoryChunk {chunk.pk} is {'a near' if near else 'an exact'} duplicate of {original_pk}; "
+            f"{'merged into it' if merged else 'linked to it'} instead of indexing."
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'enabled': self.enabled, 'mode': self.mode, 'threshold': self.threshold}
+
+
+# Initialize the singleton instance when the module is imported
+memory_deduplicator = MemoryDeduplicator()
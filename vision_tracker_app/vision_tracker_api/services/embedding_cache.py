@@ -0,0 +1,193 @@
+# vision_tracker_app/vision_tracker_api/services/embedding_cache.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'embedding_cache.sqlite3')
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace so trivially different copies of a text share a cache entry."""
+    return " ".join(text.split())
+
+
+def make_cache_key(model: str, task_type: str, text: str) -> str:
+    """
+    Builds the content-addressed key for an embedding.
+
+    Args:
+        model (str): The embedding model name, e.g. "models/embedding-001".
+        task_type (str): The task type the embedding was generated for.
+        text (str): The raw text; it is normalized before hashing.
+
+    Returns:
+        str: "<model>|<task_type>|<sha256 hex digest of the normalized text>".
+    """
+    text_hash = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model}|{task_type}|{text_hash}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of a size-bounded SQLite file.
+
+    Entries are keyed by model name, task type and a hash of the normalized text, so a
+    model change never serves stale vectors. The SQLite tier survives restarts and is
+    shared by every worker process on the host.
+
+    The LRU and the SQLite connection have separate locks, so memory hits never wait behind
+    disk reads or writes of other threads.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingCache, cls).__new__(cls)
+            cls._instance._initialize(*args, **kwargs)
+        return cls._instance
+
+    def _initialize(self, path: Optional[str] = None, memory_size: Optional[int] = None, max_disk_entries: Optional[int] = None):
+        self.path = path or getattr(settings, 'EMBEDDING_CACHE_PATH', DEFAULT_EMBEDDING_CACHE_PATH)
+        self.memory_size = memory_size or getattr(settings, 'EMBEDDING_CACHE_MEMORY_SIZE', 2048)
+        self.max_disk_entries = max_disk_entries or getattr(settings, 'EMBEDDING_CACHE_MAX_DISK_ENTRIES', 100000)
+        self.enabled = getattr(settings, 'EMBEDDING_CACHE_ENABLED', True)
+
+        self._lock = threading.Lock()  # Guards the in-memory LRU and the counters
+        self._db_lock = threading.Lock()  # Serializes use of the shared SQLite connection
+        self._disk_entries = 0  # Running row count, so writes do not COUNT(*) the table
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._conn = None
+
+        if self.enabled:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    " key TEXT PRIMARY KEY,"
+                    " vector BLOB NOT NULL,"
+                    " last_access REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+                self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                logger.info(f"Embedding cache ready at {self.path}.")
+            except sqlite3.Error as e:
+                logger.error(f"Failed to open embedding cache at {self.path}, continuing with memory tier only: {e}")
+                self._conn = None
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Returns the cached embedding for key, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return list(vector)
+
+        row = None
+        if self._conn is not None:
+            try:
+                with self._db_lock:
+                    row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache read failed for key '{key}': {e}")
+
+        with self._lock:
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            vector = array('d')
+            vector.frombytes(row[0])
+            vector = vector.tolist()
+            self._remember(key, vector)
+            self._stats['disk_hits'] += 1
+            return list(vector)
+
+    def set(self, key: str, vector: List[float]) -> None:
+        """Stores an embedding in both tiers. Empty vectors (failed calls) are never cached."""
+        if not self.enabled or not vector:
+            return
+
+        with self._lock:
+            self._remember(key, list(vector))
+            self._stats['writes'] += 1
+        if self._conn is None:
+            return
+        try:
+            with self._db_lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                    (key, array('d', vector).tobytes(), time.time())
+                )
+                # Counts replacements too; that only makes the real COUNT below run a little early
+                self._disk_entries += 1
+                if self._disk_entries > self.max_disk_entries:
+                    self._evict_disk()
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache write failed for key '{key}': {e}")
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """
+        Runs (with the database lock held) once the running count passes the limit. The real
+        count is taken then, since other worker processes write to the same file; eviction
+        removes ~10% extra, so it runs again only after that many more writes.
+        """
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._disk_entries = count
+        if count <= self.max_disk_entries:
+            return
+        excess = count - self.max_disk_entries + max(1, self.max_disk_entries // 10)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+            (excess,)
+        )
+        self._disk_entries = count - excess
+        with self._lock:
+            self._stats['evictions'] += excess
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters for both tiers plus the overall hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        """Drops every cached embedding from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        if self._conn is not None:
+            with self._db_lock:
+                self._conn.execute("DELETE FROM embeddings")
+                self._disk_entries = 0
+
+
+# Make it a singleton so every caller shares the same tiers and counters
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,144 @@
+# vision_tracker_app/vision_tracker_api/services/embedding_providers.py
+
+import os
+import threading
+from typing import List
+
+from django.conf import settings
+
+from .executors import GEMINI, LOCAL_EMBEDDING
+
+
+class EmbeddingProvider:
+    """
+    Interface for the models behind gemini_service.generate_embedding(s).
+    Providers only embed; caching, de-duplication and batching across calls live in gemini_service.
+    """
+    name = None
+    # Included in embedding-cache keys, so vectors from different models never mix
+    model_name = None
+    # Backend executor (see executors.py) that async callers run this provider on
+    executor = None
+    # Largest number of texts sent to embed() at once
+    batch_size = 100
+
+    def embed(self, texts: List[str], task_type: str = "retrieval_document") -> List[List[float]]:
+        """Returns one embedding per text, in order. Raises on failure."""
+        raise NotImplementedError
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """
+    Google's hosted embedding models (embedding-001, 768 dimensions, unless GEMINI_EMBEDDING_MODEL
+    names another); one network call per batch.
+    """
+    name = 'gemini'
+    model_name = "models/embedding-001"
+    executor = GEMINI
+
+    def __init__(self, model_name: str = None):
+        import google.generativeai as genai
+        self._genai = genai
+        self.model_name = model_name or getattr(settings, 'GEMINI_EMBEDDING_MODEL', self.model_name)
+        self.batch_size = getattr(settings, 'EMBEDDING_BATCH_SIZE', 100)
+
+    def embed(self, texts, task_type="retrieval_document"):
+        if not settings.GEMINI_API_KEY:
+            raise RuntimeError("GEMINI_API_KEY is not configured.")
+        response = self._genai.embed_content(model=self.model_name, content=list(texts), task_type=task_type)
+        return response['embedding']
+
+
+class OnnxMiniLMEmbeddingProvider(EmbeddingProvider):
+    """
+    all-MiniLM-L6-v2 (384 dimensions) run locally on CPU with onnxruntime, using the ONNX export
+    Chroma ships for its default embedding function. Needs no API key or network once the model
+    is downloaded (Chroma fetches it into its cache directory on first use).
+
+    The task type is ignored: MiniLM uses the same embedding for documents and queries.
+    """
+    name = 'onnx'
+    model_name = "onnx/all-MiniLM-L6-v2"
+    executor = LOCAL_EMBEDDING
+    max_tokens = 256
+
+    def __init__(self, model_name: str = None):
+        if model_name not in (None, self.model_name):
+            raise ValueError(f"The ONNX provider only runs {self.model_name}, not '{model_name}'.")
+        self.batch_size = getattr(settings, 'ONNX_EMBEDDING_BATCH_SIZE', 32)
+        self.num_threads = getattr(settings, 'ONNX_EMBEDDING_THREADS', 0)  # 0 lets onnxruntime decide
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+            from tokenizers import Tokenizer
+
+            # Reuse Chroma's download of the model, but build our own session so the thread count is ours
+            chroma_function = ONNXMiniLM_L6_V2(preferred_providers=['CPUExecutionProvider'])
+            chroma_function._download_model_if_not_exists()
+            model_dir = os.path.join(chroma_function.DOWNLOAD_PATH, chroma_function.EXTRACTED_FOLDER_NAME)
+
+            tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+            tokenizer.enable_truncation(max_length=self.max_tokens)
+            tokenizer.enable_padding(pad_id=0, pad_token='[PAD]', length=None)
+
+            options = onnxruntime.SessionOptions()
+            if self.num_threads:
+                options.intra_op_num_threads = self.num_threads
+                options.inter_op_num_threads = 1
+            self._session = onnxruntime.InferenceSession(
+                os.path.join(model_dir, 'model.onnx'), sess_options=options, providers=['CPUExecutionProvider']
+            )
+            self._tokenizer = tokenizer
+
+    def embed(self, texts, task_type="retrieval_document"):
+        import numpy as np
+
+        if self._session is None:
+            self._load()
+        encoded = self._tokenizer.encode_batch(list(texts))
+        input_ids = np.array([encoding.ids for encoding in encoded], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encoded], dtype=np.int64)
+        outputs = self._session.run(None, {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'token_type_ids': np.zeros_like(input_ids),
+        })
+        # Mean-pool the token embeddings over the attention mask, then L2-normalise
+        token_embeddings = outputs[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+
+EMBEDDING_PROVIDERS = {
+    GeminiEmbeddingProvider.name: GeminiEmbeddingProvider,
+    OnnxMiniLMEmbeddingProvider.name: OnnxMiniLMEmbeddingProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(name=None, model_name: str = None) -> EmbeddingProvider:
+    """
+    Returns the shared provider for `name`, defaulting to settings.EMBEDDING_PROVIDER, running
+    `model_name` if given (e.g. the model a re-embedded collection was built with).
+    A provider instance is returned as is.
+    """
+    if isinstance(name, EmbeddingProvider):
+        return name
+    name = name or getattr(settings, 'EMBEDDING_PROVIDER', GeminiEmbeddingProvider.name)
+    if name not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{name}'. Expected one of {list(EMBEDDING_PROVIDERS)}.")
+    with _providers_lock:
+        if (name, model_name) not in _providers:
+            _providers[(name, model_name)] = EMBEDDING_PROVIDERS[name](model_name)
+        return _providers[(name, model_name)]
@@ -0,0 +1,109 @@
+# vision_tracker_app/vision_tracker_api/services/executors.py
+
+import asyncio
+import contextvars
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+
+CHROMA = 'chroma'
+FIRESTORE = 'firestore'
+GEMINI = 'gemini'
+LOCAL_EMBEDDING = 'local_embedding'
+
+# Worker threads per backend; this is also the backend's concurrency limit
+DEFAULT_WORKERS = {CHROMA: 4, FIRESTORE: 8, GEMINI: 8, LOCAL_EMBEDDING: 2}
+
+
+class BackendExecutor:
+    """
+    A bounded thread pool dedicated to one blocking backend (Chroma, Firestore, Gemini or local embedding).
+
+    At most `max_workers` calls run against the backend at once; further calls wait in the
+    pool's queue, and that wait is measured so a saturated backend shows up in /metrics.
+    Because each backend has its own pool, a slow Firestore cannot starve vector search or
+    embedding. Calls run inside a copy of the caller's contextvars context.
+    """
+
+    def __init__(self, name: str, max_workers: int, sample_size: int = 1024):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-backend")
+        self._lock = threading.Lock()
+        self._queue_waits = deque(maxlen=sample_size)
+        self._run_times = deque(maxlen=sample_size)
+        self._stats = {'calls': 0, 'errors': 0, 'queued': 0, 'in_flight': 0}
+
+    def _timed(self, submitted: float, func: Callable, *args, **kwargs) -> Any:
+        started = time.monotonic()
+        with self._lock:
+            self._queue_waits.append((started - submitted) * 1000)
+            self._stats['queued'] -= 1
+            self._stats['in_flight'] += 1
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._run_times.append((time.monotonic() - started) * 1000)
+                self._stats['in_flight'] -= 1
+
+    def submit(self, func: Callable, *args, **kwargs):
+        """Schedules a blocking call and returns its concurrent.futures.Future."""
+        context = contextvars.copy_context()
+        with self._lock:
+            self._stats['calls'] += 1
+            self._stats['queued'] += 1
+        return self._executor.submit(context.run, self._timed, time.monotonic(), func, *args, **kwargs)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Runs a blocking call on this backend's pool and awaits its result."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            waits = sorted(self._queue_waits)
+            run_times = list(self._run_times)
+        stats['max_workers'] = self.max_workers
+        stats['queue_wait_ms_p50'] = round(statistics.median(waits), 3) if waits else None
+        stats['queue_wait_ms_p99'] = round(waits[max(0, int(len(waits) * 0.99) - 1)], 3) if waits else None
+        stats['queue_wait_ms_max'] = round(waits[-1], 3) if waits else None
+        stats['run_ms_mean'] = round(statistics.fmean(run_times), 3) if run_times else None
+        return stats
+
+
+_executors: Dict[str, BackendExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BackendExecutor:
+    """Returns the shared executor for a backend, sized from settings.BACKEND_EXECUTOR_WORKERS."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                workers = {**DEFAULT_WORKERS, **getattr(settings, 'BACKEND_EXECUTOR_WORKERS', {})}
+                if name not in workers:
+                    raise ValueError(f"Unknown backend '{name}'. Expected one of {list(workers)}.")
+                executor = _executors[name] = BackendExecutor(name, workers[name])
+    return executor
+
+
+async def run_on(name: str, func: Callable, *args, **kwargs) -> Any:
+    """Shortcut for `await get_executor(name).run(func, *args, **kwargs)`."""
+    return await get_executor(name).run(func, *args, **kwargs)
+
+
+def executor_stats() -> Dict[str, Any]:
+    """Queue-wait and concurrency counters for every backend executor created so far."""
+    return {name: executor.stats() for name, executor in list(_executors.items())}
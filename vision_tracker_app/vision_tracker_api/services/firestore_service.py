@@ -2,16 +2,19 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from django.conf import settings
 import logging
-from google.protobuf.json_format import MessageToDict, ParseDict
 import google.generativeai as genai 
-from asgiref.sync import sync_to_async
 from typing import List, Dict, Any
+from .executors import FIRESTORE, run_on
+from .history_cache import ConversationHistoryCache
+from .content_serialization import deserialize_messages, serialize_messages
 
 logger = logging.getLogger(__name__)
 
 class FirestoreService:
     _instance = None
     _db = None
+    # Deserialized histories of recently active conversations (see get_conversation_history)
+    history_cache = ConversationHistoryCache()
 
     def __new__(cls, *args, **kwargs):
         """
@@ -70,7 +73,7 @@ class FirestoreService:
             raise ConnectionError("Firestore service not available.")
         try:
             doc_ref = self._db.collection(collection_name).document(doc_id)
-            await sync_to_async(doc_ref.set)(data)
+            await run_on(FIRESTORE, doc_ref.set, data)
             logger.debug(f"Document '{doc_id}' added to collection '{collection_name}'.")
             return True
         except Exception as e:
@@ -93,7 +96,7 @@ class FirestoreService:
             raise ConnectionError("Firestore service not available.")
         try:
             doc_ref = self._db.collection(collection_name).document(doc_id)
-            doc_snapshot = await sync_to_async(doc_ref.get)()
+            doc_snapshot = await run_on(FIRESTORE, doc_ref.get)
             logger.debug(f"Document '{doc_id}' retrieved from collection '{collection_name}'. Exists: {doc_snapshot.exists}")
             return doc_snapshot
         except Exception as e:
@@ -101,11 +104,63 @@ class FirestoreService:
             return None
         
     ## Conversation History Management
+    #
+    # Layout: conversations/{conversation_id} holds only bookkeeping fields
+    # ({'layout': 'segmented', 'message_count': n, 'updated_at': ...}); every message lives in
+    # its own document conversations/{conversation_id}/messages/{seq:08d}. A turn therefore
+    # writes only its new messages instead of rewriting the whole history.
+    # Conversations saved before this layout keep every message in a 'messages' array on the
+    # parent document; they are still readable and are migrated on their next save
+    # (or in bulk with `manage.py migrate_conversations`).
+
+    CONVERSATIONS_COLLECTION = 'conversations'
+    MESSAGES_SUBCOLLECTION = 'messages'
+    SEGMENTED_LAYOUT = 'segmented'
+    MAX_BATCH_WRITES = 400 # Firestore allows 500 writes per batch/transaction; keep headroom
+
+    def _conversation_ref(self, conversation_id: str):
+        return self._db.collection(self.CONVERSATIONS_COLLECTION).document(conversation_id)
+
+    def _message_ref(self, conversation_ref, seq: int):
+        return conversation_ref.collection(self.MESSAGES_SUBCOLLECTION).document(f"{seq:08d}")
+
+    @staticmethod
+    def _is_legacy(conversation_data: Dict[str, Any]) -> bool:
+        return 'messages' in conversation_data and conversation_data.get('layout') != FirestoreService.SEGMENTED_LAYOUT
+
+    def _read_history_sync(self, conversation_id: str):
+        """Returns (message dicts, stored message count, parent document fields)."""
+        conversation_ref = self._conversation_ref(conversation_id)
+        snapshot = conversation_ref.get()
+        if not snapshot.exists:
+            return [], 0, {}
+        conversation_data = snapshot.to_dict() or {}
+        if self._is_legacy(conversation_data):
+            message_dicts = conversation_data.get('messages', [])
+            return message_dicts, len(message_dicts), conversation_data
+        message_docs = conversation_ref.collection(self.MESSAGES_SUBCOLLECTION).order_by('seq').stream()
+        message_dicts = [doc.to_dict().get('message', {}) for doc in message_docs]
+        return message_dicts, conversation_data.get('message_count', len(message_dicts)), conversation_data
+
+    def _read_message_count_sync(self, conversation_id: str):
+        """Returns the stored message count from the parent document only, or None for legacy/missing conversations."""
+        snapshot = self._conversation_ref(conversation_id).get()
+        if not snapshot.exists:
+            return None
+        conversation_data = snapshot.to_dict() or {}
+        if self._is_legacy(conversation_data):
+            return None
+        return conversation_data.get('message_count')
 
     async def get_conversation_history(self, conversation_id: str) -> List[genai.protos.Content]:
         """
         Retrieves and deserializes the message history for a given conversation_id from Firestore.
-        This method converts stored dictionary representations back into genai.protos.Content objects.
+        Messages are read from the per-message subcollection in order; legacy single-document
+        conversations are read from their 'messages' array.
+
+        Recently used histories are served from an in-process cache: only the parent document is
+        read, to check that the stored message count (the history's version) has not moved since.
+        With a positive CONVERSATION_CACHE_TTL_SECONDS that check is skipped within the TTL.
 
         Args:
             conversation_id (str): The ID of the conversation to retrieve history for.
@@ -117,33 +172,29 @@ class FirestoreService:
         if not self._db:
             logger.error("Firestore not initialized, cannot get conversation history.")
             raise ConnectionError("Firestore service not available.")
-        
+
         try:
-            doc_ref = self._db.collection('conversations').document(conversation_id)
-            doc_snapshot = await sync_to_async(doc_ref.get)()
+            cached = self.history_cache.get(conversation_id)
+            if cached is not None:
+                if self.history_cache.is_fresh(cached):
+                    self.history_cache.record('hits')
+                    return list(cached.messages)
+                stored_count = await run_on(FIRESTORE, self._read_message_count_sync, conversation_id)
+                if stored_count == cached.message_count:
+                    self.history_cache.touch(conversation_id)
+                    self.history_cache.record('revalidated')
+                    return list(cached.messages)
+                self.history_cache.invalidate(conversation_id)
 
-            if doc_snapshot.exists:
-                raw_history_data = doc_snapshot.to_dict()
-                message_dicts = raw_history_data.get('messages', [])
-                
-                deserialized_history = []
-                for msg_dict in message_dicts:
-                    content_message = genai.protos.Content()
-                    try:
-                        # ParseDict populates the message object from a dictionary
-                        ParseDict(js_dict=msg_dict, message=content_message)
-                        deserialized_history.append(content_message)
-                    except Exception as e:
-                        logger.error(f"Failed to deserialize message: {msg_dict} for conversation '{conversation_id}'. Error: {e}")
-                        # Decide how to handle corrupted messages: skip or raise?
-                        # For robustness, we'll skip the corrupted message here.
-                        continue
-                        
-                logger.debug(f"Retrieved and deserialized {len(deserialized_history)} messages for conversation '{conversation_id}'.")
-                return deserialized_history
-            else:
-                logger.debug(f"No history found for conversation '{conversation_id}'. Returning empty list.")
-                return []
+            self.history_cache.record('misses')
+            message_dicts, stored_count, conversation_data = await run_on(FIRESTORE, self._read_history_sync, conversation_id)
+            deserialized_history = deserialize_messages(conversation_id, message_dicts)
+            self.history_cache.put(
+                conversation_id, deserialized_history, stored_count,
+                conversation_data.get('summary', ''), conversation_data.get('summarized_count', 0)
+            )
+            logger.debug(f"Retrieved and deserialized {len(deserialized_history)} messages for conversation '{conversation_id}'.")
+            return deserialized_history
         except ConnectionError:
             # Re-raise ConnectionError as it indicates a service availability issue
             raise
@@ -151,10 +202,119 @@ class FirestoreService:
             logger.exception(f"Error retrieving or deserializing history for conversation '{conversation_id}'.")
             return []
 
+    def _migrate_legacy_sync(self, conversation_id: str) -> int:
+        conversation_ref = self._conversation_ref(conversation_id)
+        snapshot = conversation_ref.get()
+        if not snapshot.exists:
+            return 0
+        conversation_data = snapshot.to_dict() or {}
+        if not self._is_legacy(conversation_data):
+            return 0
+
+        message_dicts = conversation_data.get('messages', [])
+        for start in range(0, len(message_dicts), self.MAX_BATCH_WRITES):
+            batch = self._db.batch()
+            for seq in range(start, min(start + self.MAX_BATCH_WRITES, len(message_dicts))):
+                batch.set(self._message_ref(conversation_ref, seq), {'seq': seq, 'message': message_dicts[seq]})
+            batch.commit()
+        # Flip the layout last so a partially migrated conversation is still read from the array
+        conversation_ref.update({
+            'layout': self.SEGMENTED_LAYOUT,
+            'message_count': len(message_dicts),
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'messages': firestore.DELETE_FIELD,
+        })
+        return len(message_dicts)
+
+    async def migrate_legacy_conversation(self, conversation_id: str) -> int:
+        """
+        Moves a single-document conversation into the per-message layout.
+
+        Args:
+            conversation_id (str): The ID of the conversation to migrate.
+
+        Returns:
+            int: The number of messages migrated (0 if it was already migrated or does not exist).
+        """
+        if not self._db:
+            logger.error("Firestore not initialized, cannot migrate conversation.")
+            raise ConnectionError("Firestore service not available.")
+        migrated = await run_on(FIRESTORE, self._migrate_legacy_sync, conversation_id)
+        if migrated:
+            logger.info(f"Migrated {migrated} messages of conversation '{conversation_id}' to the segmented layout.")
+        return migrated
+
+    def _append_sync(self, conversation_id: str, message_dicts: List[Dict[str, Any]], full_history: bool = False):
+        """
+        Appends message dicts in one transaction. With full_history=True, `message_dicts` is the
+        whole conversation and only the entries past the stored count are written.
+        Returns (stored count before the write, number of messages written).
+        """
+        conversation_ref = self._conversation_ref(conversation_id)
+
+        @firestore.transactional
+        def _append_in_transaction(transaction):
+            snapshot = conversation_ref.get(transaction=transaction)
+            conversation_data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            if self._is_legacy(conversation_data):
+                return None # Caller migrates and retries
+            stored_count = conversation_data.get('message_count', 0)
+            new_messages = message_dicts[stored_count:] if full_history else message_dicts
+            for offset, message_dict in enumerate(new_messages):
+                seq = stored_count + offset
+                transaction.set(self._message_ref(conversation_ref, seq), {'seq': seq, 'message': message_dict})
+            transaction.set(conversation_ref, {
+                'layout': self.SEGMENTED_LAYOUT,
+                'message_count': stored_count + len(new_messages),
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            }, merge=True)
+            return stored_count, len(new_messages)
+
+        result = _append_in_transaction(self._db.transaction())
+        if result is None:
+            self._migrate_legacy_sync(conversation_id)
+            result = _append_in_transaction(self._db.transaction())
+        return result
+
+    async def append_conversation_messages(self, conversation_id: str, messages: List[genai.protos.Content], expected_count: int = None) -> bool:
+        """
+        Appends messages to the end of a conversation, writing one document per new message.
+
+        Args:
+            conversation_id (str): The ID of the conversation.
+            messages (List[genai.protos.Content]): The new messages of this turn.
+            expected_count (int, optional): The message count the caller loaded the history at.
+                                            If another worker appended in between, the messages
+                                            are still appended but the cached history is dropped.
+
+        Returns:
+            bool: True if the messages were saved successfully, False otherwise.
+        """
+        if not self._db:
+            logger.error("Firestore not initialized, cannot save conversation history.")
+            raise ConnectionError("Firestore service not available.")
+
+        try:
+            message_dicts = serialize_messages(conversation_id, messages)
+            stored_count, written = await run_on(FIRESTORE, self._append_sync, conversation_id, message_dicts)
+            if expected_count is not None and expected_count != stored_count:
+                logger.warning(f"Conversation '{conversation_id}' was appended to concurrently (expected {expected_count} messages, found {stored_count}).")
+            # Write-through: only valid if the cached history is exactly what was stored before this append
+            if not self.history_cache.extend(conversation_id, stored_count, messages, stored_count + written):
+                self.history_cache.invalidate(conversation_id)
+            logger.debug(f"Appended {written} messages to conversation '{conversation_id}'.")
+            return True
+        except ConnectionError:
+            raise
+        except Exception as e:
+            self.history_cache.invalidate(conversation_id)
+            logger.exception(f"Error appending messages to conversation '{conversation_id}'.")
+            return False
+
     async def save_conversation_history(self, conversation_id: str, history: List[genai.protos.Content]) -> bool:
         """
-        Serializes and saves the complete message history for a conversation to Firestore.
-        This method converts genai.protos.Content objects into a serializable dictionary format for storage.
+        Saves the complete message history for a conversation to Firestore.
+        Only the messages beyond what is already stored are written.
 
         Args:
             conversation_id (str): The ID of the conversation.
@@ -168,34 +328,71 @@ class FirestoreService:
             raise ConnectionError("Firestore service not available.")
 
         try:
-            serializable_history = []
-            for content_message in history:
-                if not isinstance(content_message, genai.protos.Content):
-                    logger.warning(f"Skipping non-Content object in history for conversation '{conversation_id}': {type(content_message)}")
-                    continue
-                try:
-                    # MessageToDict converts the protobuf message to a dictionary
-                    # preserving_proto_field_name=True ensures field names match the proto definition
-                    msg_dict = MessageToDict(message=content_message, preserving_proto_field_name=True)
-                    serializable_history.append(msg_dict)
-                except Exception as e:
-                    logger.error(f"Failed to serialize message: {content_message} for conversation '{conversation_id}'. Error: {e}")
-                    # Decide: skip this message or fail the entire save operation?
-                    # Skipping offers more robustness against individual message corruption.
-                    continue
-
-            doc_ref = self._db.collection('conversations').document(conversation_id)
-            # Using set with merge=True is robust as it creates the document if it doesn't exist
-            # or updates the 'messages' field without affecting other potential fields.
-            await sync_to_async(doc_ref.set)({'messages': serializable_history}, merge=True)
-            logger.debug(f"Serialized and saved {len(serializable_history)} messages for conversation '{conversation_id}'.")
+            message_dicts = serialize_messages(conversation_id, history)
+            stored_count, written = await run_on(FIRESTORE, self._append_sync, conversation_id, message_dicts, True)
+            if stored_count <= len(history):
+                self.history_cache.put(conversation_id, history, stored_count + written)
+            else:
+                self.history_cache.invalidate(conversation_id)
+            logger.debug(f"Saved {written} new messages for conversation '{conversation_id}'.")
             return True
         except ConnectionError:
-            # Re-raise ConnectionError for consistent service availability handling
             raise
         except Exception as e:
+            self.history_cache.invalidate(conversation_id)
             logger.exception(f"Error serializing or saving history for conversation '{conversation_id}'.")
             return False
 
+    async def get_conversation_summary(self, conversation_id: str):
+        """
+        Returns the rolling summary of a conversation's older turns.
+
+        Args:
+            conversation_id (str): The ID of the conversation.
+
+        Returns:
+            tuple: (summary text, number of leading messages it covers); ("", 0) if there is none.
+        """
+        if not self._db:
+            logger.error("Firestore not initialized, cannot get conversation summary.")
+            raise ConnectionError("Firestore service not available.")
+
+        cached = self.history_cache.get(conversation_id)
+        if cached is not None:
+            return cached.summary, cached.summarized_count
+        try:
+            snapshot = await run_on(FIRESTORE, self._conversation_ref(conversation_id).get)
+            conversation_data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+            return conversation_data.get('summary', ''), conversation_data.get('summarized_count', 0)
+        except Exception:
+            logger.exception(f"Error retrieving summary for conversation '{conversation_id}'.")
+            return "", 0
+
+    async def save_conversation_summary(self, conversation_id: str, summary: str, summarized_count: int) -> bool:
+        """
+        Stores the rolling summary on the conversation's parent document.
+
+        Args:
+            conversation_id (str): The ID of the conversation.
+            summary (str): The summary text.
+            summarized_count (int): How many leading messages of the history the summary covers.
+
+        Returns:
+            bool: True if the summary was saved successfully, False otherwise.
+        """
+        if not self._db:
+            logger.error("Firestore not initialized, cannot save conversation summary.")
+            raise ConnectionError("Firestore service not available.")
+        try:
+            await run_on(
+                FIRESTORE, self._conversation_ref(conversation_id).set,
+                {'summary': summary, 'summarized_count': summarized_count}, merge=True
+            )
+            self.history_cache.set_summary(conversation_id, summary, summarized_count)
+            return True
+        except Exception:
+            logger.exception(f"Error saving summary for conversation '{conversation_id}'.")
+            return False
+
 # Initialize the singleton instance when the module is imported
 firestore_service = FirestoreService()
\ No newline at end of file
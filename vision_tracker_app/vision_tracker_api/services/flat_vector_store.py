@@ -0,0 +1,609 @@
+# vision_tracker_app/vision_tracker_api/services/flat_vector_store.py
+
+import contextlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, so a store must only be opened by one process there
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FLOAT16 = 'float16'
+INT8 = 'int8'
+DTYPES = (FLOAT16, INT8)
+
+VECTORS_FILE = 'vectors.bin'
+SCALES_FILE = 'scales.f32'  # Per-row dequantisation scale (int8 only)
+NORMS_FILE = 'norms.f32'  # Squared norm of each stored (dequantised) row, for L2 distances
+ROWS_FILE = 'rows.jsonl'  # Append-only sidecar: one 'add' record per row, 'delete' records for removals
+META_FILE = 'meta.json'
+LOCK_FILE = 'lock'  # flock()ed: shared while reading new records, exclusive while writing or compacting
+
+# Rows scored per matrix product; bounds the float32 working set during a query
+QUERY_BLOCK_ROWS = 16384
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{1,62}[A-Za-z0-9]$")
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates a Chroma-style metadata filter ($and/$or, $eq/$ne/$gt/$gte/$lt/$lte/$in/$nin)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            operators = condition if isinstance(condition, dict) else {'$eq': condition}
+            for operator, operand in operators.items():
+                if operator == '$eq':
+                    ok = value == operand
+                elif operator == '$ne':
+                    ok = value != operand
+                elif operator == '$in':
+                    ok = value in operand
+                elif operator == '$nin':
+                    ok = value not in operand
+                elif value is None:
+                    ok = False
+                elif operator == '$gt':
+                    ok = value > operand
+                elif operator == '$gte':
+                    ok = value >= operand
+                elif operator == '$lt':
+                    ok = value < operand
+                elif operator == '$lte':
+                    ok = value <= operand
+                else:
+                    raise ValueError(f"Unsupported where operator '{operator}'.")
+                if not ok:
+                    return False
+    return True
+
+
+class FlatCollection:
+    """
+    Exact (brute-force) vector search over a memory-mapped float16 or int8 matrix.
+
+    Mimics the parts of the Chroma collection API the services use: add, upsert, query, get,
+    delete and count, with the same argument names and result shapes.
+
+    Storage is append-only. New rows are appended to the vector, norm and scale files and
+    described by 'add' records in a JSON-lines sidecar (ID, document, metadata); upserts and
+    deletes append 'delete' records for the superseded rows. Once dead rows exceed
+    `compact_ratio` of the file, live rows are rewritten into a new generation directory and
+    meta.json is switched to it with an atomic rename, so a crash mid-compaction leaves the
+    previous generation intact.
+
+    The sidecar is the source of truth. Before every write the files are cut back to the rows
+    the sidecar describes: vectors appended by a process that died before writing their
+    records, and a torn last record, are truncated away.
+
+    Several processes may open the same path (the web server and management commands such as
+    sync_memory_index do). Writes and compactions hold an exclusive flock() on the collection's
+    lock file, and every operation first picks up records and generation switches made by
+    other processes. A process still scanning a compacted generation keeps reading its
+    unlinked files until it notices the switch, which POSIX allows; on Windows, where there is
+    no flock(), only one process may use a store.
+    """
+
+    def __init__(self, path: str, name: str, metadata: Optional[Dict[str, Any]] = None, dtype: str = FLOAT16,
+                 compact_ratio: float = 0.25):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}'. Expected one of {DTYPES}.")
+        self.name = name
+        self._dir = path
+        self._lock = threading.RLock()
+        self.compact_ratio = compact_ratio
+        os.makedirs(path, exist_ok=True)
+        self._lock_file = open(os.path.join(path, LOCK_FILE), 'a')
+
+        with self._file_lock(exclusive=True):
+            meta = self._read_meta()
+            if meta is None:
+                meta = {'dtype': dtype, 'dim': None, 'generation': 0, 'metadata': metadata or {}}
+                os.makedirs(os.path.join(path, 'gen-0'), exist_ok=True)
+                self._write_meta(meta)
+            self._meta = meta
+            self.metadata = meta['metadata']
+            self.space = self.metadata.get('hnsw:space', 'l2')
+            self.dtype = meta['dtype']
+            self._load(repair=True)
+
+    # --- Persistence ---
+
+    @contextlib.contextmanager
+    def _file_lock(self, exclusive: bool = False):
+        """Holds the cross-process lock on this collection (a no-op without fcntl)."""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self._dir, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        temp_path = os.path.join(self._dir, META_FILE + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self._dir, META_FILE))
+        self._meta_key = self._meta_stat()
+
+    def _meta_stat(self) -> tuple:
+        try:
+            stat = os.stat(os.path.join(self._dir, META_FILE))
+        except FileNotFoundError:
+            raise ValueError(f"Collection {self.name} does not exist.") from None
+        # os.replace gives meta.json a new inode, so a switch is seen even within one mtime tick
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _generation_dir(self, generation: Optional[int] = None) -> str:
+        generation = self._meta['generation'] if generation is None else generation
+        return os.path.join(self._dir, f"gen-{generation}")
+
+    def _file(self, filename: str) -> str:
+        return os.path.join(self._generation_dir(), filename)
+
+    def _row_bytes(self) -> Dict[str, int]:
+        """Bytes per row of each per-row file of this collection."""
+        sizes = {VECTORS_FILE: self._meta['dim'] * np.dtype(self.dtype).itemsize, NORMS_FILE: 4}
+        if self.dtype == INT8:
+            sizes[SCALES_FILE] = 4
+        return sizes
+
+    def _file_rows(self) -> int:
+        """Rows present in all of the vector, norm and scale files."""
+        if not self._meta['dim']:
+            return 0
+        rows = []
+        for filename, row_bytes in self._row_bytes().items():
+            try:
+                rows.append(os.path.getsize(self._file(filename)) // row_bytes)
+            except FileNotFoundError:
+                rows.append(0)
+        return min(rows)
+
+    def _load(self, repair: bool = False) -> None:
+        """
+        Reads the current generation from scratch. With `repair` (exclusive file lock held), the
+        files are first cut back to what the sidecar and each other describe, and generation
+        directories left behind by earlier compactions are removed.
+        """
+        self._meta_key = self._meta_stat()
+        self._meta = self._read_meta()
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._rows_offset = 0  # Sidecar bytes applied so far
+        self._rows_seen = 0  # Sidecar size at the last read, torn tail included
+        self._read_rows()
+        if repair:
+            self._repair()
+            for entry in os.listdir(self._dir):
+                if entry.startswith('gen-') and entry != os.path.basename(self._generation_dir()):
+                    shutil.rmtree(os.path.join(self._dir, entry), ignore_errors=True)
+        self._remap()
+
+    def _read_rows(self) -> None:
+        """
+        Applies the sidecar records written since the last read. Stops before a line that is
+        torn or unreadable: it is either still being written or left by a crash, which _repair
+        truncates.
+        """
+        try:
+            with open(self._file(ROWS_FILE), 'rb') as f:
+                f.seek(self._rows_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        self._rows_seen = self._rows_offset + len(data)
+        position = 0
+        while position < len(data):
+            end = data.find(b'\n', position)
+            if end == -1:
+                break
+            try:
+                record = json.loads(data[position:end])
+            except ValueError:
+                break
+            if record['op'] == 'add':
+                previous = self._id_to_row.get(record['id'])
+                if previous is not None:
+                    self._ids[previous] = None
+                self._id_to_row[record['id']] = len(self._ids)
+                self._ids.append(record['id'])
+                self._documents.append(record.get('document'))
+                self._metadatas.append(record.get('metadata') or {})
+            else:
+                row = self._id_to_row.pop(record['id'], None)
+                if row is not None:
+                    self._ids[row] = None
+            position = end + 1
+        self._rows_offset += position
+
+    def _repair(self) -> None:
+        """
+        Cuts the current generation back to a consistent state after a crash (exclusive file
+        lock held): a torn or unreadable sidecar tail is truncated, vector/norm/scale rows
+        beyond the sidecar's 'add' records are truncated, and 'add' records whose vectors never
+        reached disk are dropped together with everything after them.
+        """
+        rows_path = self._file(ROWS_FILE)
+        if self._rows_seen > self._rows_offset:
+            logger.warning(
+                f"Flat collection '{self.name}': truncating {self._rows_seen - self._rows_offset} bytes of torn records."
+            )
+            os.truncate(rows_path, self._rows_offset)
+            self._rows_seen = self._rows_offset
+        if not self._meta['dim']:
+            return
+
+        file_rows = self._file_rows()
+        if file_rows < len(self._ids):
+            # Records without vectors: cut the sidecar at the first of them and read it again
+            with open(rows_path, 'rb') as f:
+                offset, adds = 0, 0
+                for line in f:
+                    if json.loads(line)['op'] == 'add':
+                        if adds == file_rows:
+                            break
+                        adds += 1
+                    offset += len(line)
+            logger.warning(f"Flat collection '{self.name}': dropping {len(self._ids) - file_rows} records without vectors.")
+            os.truncate(rows_path, offset)
+            self._load()
+        for filename, row_bytes in self._row_bytes().items():
+            path = self._file(filename)
+            if os.path.exists(path) and os.path.getsize(path) > len(self._ids) * row_bytes:
+                logger.warning(f"Flat collection '{self.name}': truncating rows without records from {filename}.")
+                os.truncate(path, len(self._ids) * row_bytes)
+
+    def _refresh(self) -> None:
+        """Picks up records and compactions written by other processes since the last look."""
+        meta_key = self._meta_stat()
+        if meta_key != self._meta_key:
+            meta = self._read_meta()
+            if meta['generation'] != self._meta['generation']:
+                self._load()
+                return
+            self._meta, self._meta_key = meta, meta_key  # e.g. another process set the dimension
+        try:
+            rows_size = os.path.getsize(self._file(ROWS_FILE))
+        except FileNotFoundError:
+            rows_size = 0
+        if rows_size < self._rows_seen:
+            self._load()  # Truncated by another process's repair
+        elif rows_size > self._rows_seen:
+            self._read_rows()
+            self._remap()
+
+    def _sync(self, repair: bool = False) -> None:
+        """
+        Brings this instance up to date with the files (file lock held). With `repair` (exclusive
+        lock held, before a write), files left inconsistent by a crashed writer are repaired.
+        """
+        self._refresh()
+        if repair and (self._rows_seen > self._rows_offset or self._file_rows() != len(self._ids)):
+            self._repair()
+            self._remap()
+
+    def _remap(self) -> None:
+        dim = self._meta['dim']
+        # Never map past what both the files and the sidecar describe
+        rows = min(len(self._ids), self._file_rows())
+        if dim and rows:
+            self._vectors = np.memmap(self._file(VECTORS_FILE), dtype=self.dtype, mode='r', shape=(rows, dim))
+            self._norms = np.memmap(self._file(NORMS_FILE), dtype=np.float32, mode='r', shape=(rows,))
+            self._scales = (
+                np.memmap(self._file(SCALES_FILE), dtype=np.float32, mode='r', shape=(rows,)) if self.dtype == INT8 else None
+            )
+        else:
+            self._vectors = self._norms = self._scales = None
+        self._alive = np.array([doc_id is not None for doc_id in self._ids[:rows]], dtype=bool)
+
+    # --- Encoding ---
+
+    def _prepare(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("Embeddings must be a list of equal-length vectors.")
+        if self._meta['dim'] is not None and vectors.shape[1] != self._meta['dim']:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {self._meta['dim']}.")
+        if self.space == 'cosine':
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def _encode(self, vectors: np.ndarray):
+        if self.dtype == INT8:
+            scales = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127.0
+            stored = np.clip(np.round(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            decoded = stored.astype(np.float32) * scales[:, None]
+            return stored, scales.astype(np.float32), (decoded ** 2).sum(axis=1).astype(np.float32)
+        stored = vectors.astype(np.float16)
+        return stored, None, (stored.astype(np.float32) ** 2).sum(axis=1)
+
+    def _decode(self, start: int, stop: int) -> np.ndarray:
+        block = np.asarray(self._vectors[start:stop], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[start:stop, None]
+        return block
+
+    def _decode_rows(self, rows) -> np.ndarray:
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows, None]
+        return block
+
+    # --- Writes ---
+
+    def _append(self, ids: List[str], embeddings, documents, metadatas, replace: bool) -> None:
+        if not ids:
+            return
+        vectors = self._prepare(embeddings)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(repair=True)
+            if self._meta['dim'] is None:
+                self._meta['dim'] = int(vectors.shape[1])
+                self._write_meta(self._meta)
+            elif vectors.shape[1] != self._meta['dim']:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {self._meta['dim']}.")
+
+            keep = []
+            for index, doc_id in enumerate(ids):
+                if doc_id in self._id_to_row and not replace:
+                    logger.warning(f"Add of existing embedding ID '{doc_id}' to flat collection '{self.name}' ignored.")
+                else:
+                    keep.append(index)
+            if not keep:
+                return
+            stored, scales, norms = self._encode(vectors[keep])
+
+            records = []
+            for index in keep:
+                if ids[index] in self._id_to_row:
+                    records.append({'op': 'delete', 'id': ids[index]})
+                records.append({'op': 'add', 'id': ids[index], 'document': documents[index], 'metadata': metadatas[index] or {}})
+            # Vectors first: rows without sidecar records are truncated by the next writer's repair
+            os.makedirs(self._generation_dir(), exist_ok=True)
+            with open(self._file(VECTORS_FILE), 'ab') as f:
+                f.write(stored.tobytes())
+            with open(self._file(NORMS_FILE), 'ab') as f:
+                f.write(norms.tobytes())
+            if scales is not None:
+                with open(self._file(SCALES_FILE), 'ab') as f:
+                    f.write(scales.tobytes())
+            self._write_records(records)
+            self._maybe_compact()
+
+    def _write_records(self, records: List[Dict[str, Any]]) -> None:
+        """Appends sidecar records and applies them to this instance (exclusive file lock held)."""
+        with open(self._file(ROWS_FILE), 'a') as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        self._read_rows()
+        self._remap()
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        if embeddings is None:
+            raise ValueError("FlatCollection stores precomputed embeddings only; pass `embeddings`.")
+        self._append(list(ids), embeddings, documents, metadatas, replace=False)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        if embeddings is None:
+            raise ValueError("FlatCollection stores precomputed embeddings only; pass `embeddings`.")
+        self._append(list(ids), embeddings, documents, metadatas, replace=True)
+
+    def delete(self, ids=None, where=None, **kwargs) -> None:
+        # As in Chroma, emptying a collection takes an explicit filter rather than a bare delete()
+        if ids is None and not where:
+            raise ValueError("Pass `ids` or `where` to delete from a FlatCollection.")
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(repair=True)
+            rows = self._select_rows(ids, where)
+            if not rows:
+                return
+            self._write_records([{'op': 'delete', 'id': self._ids[row]} for row in rows])
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        dead = len(self._ids) - len(self._id_to_row)
+        if dead and dead >= self.compact_ratio * len(self._ids):
+            self._compact()
+
+    def compact(self) -> None:
+        """Rewrites live rows into a new generation and switches meta.json to it atomically."""
+        with self._lock, self._file_lock(exclusive=True):
+            self._sync(repair=True)
+            self._compact()
+
+    def _compact(self) -> None:
+        live_rows = [row for row in range(len(self._alive)) if self._alive[row]]
+        old_generation = self._meta['generation']
+        new_generation = old_generation + 1
+        new_dir = self._generation_dir(new_generation)
+        os.makedirs(new_dir, exist_ok=True)
+        with open(os.path.join(new_dir, VECTORS_FILE), 'wb') as vectors_file, \
+                open(os.path.join(new_dir, NORMS_FILE), 'wb') as norms_file, \
+                open(os.path.join(new_dir, SCALES_FILE), 'wb') as scales_file:
+            for start in range(0, len(live_rows), QUERY_BLOCK_ROWS):
+                block = live_rows[start:start + QUERY_BLOCK_ROWS]
+                vectors_file.write(np.asarray(self._vectors[block]).tobytes())
+                norms_file.write(np.asarray(self._norms[block]).tobytes())
+                if self._scales is not None:
+                    scales_file.write(np.asarray(self._scales[block]).tobytes())
+        with open(os.path.join(new_dir, ROWS_FILE), 'w') as f:
+            for row in live_rows:
+                f.write(json.dumps({
+                    'op': 'add', 'id': self._ids[row], 'document': self._documents[row], 'metadata': self._metadatas[row],
+                }) + "\n")
+
+        self._vectors = self._norms = self._scales = None  # Release the old maps before switching
+        self._write_meta({**self._meta, 'generation': new_generation})
+        # Other processes still mapping the old files keep them until they see the new generation
+        shutil.rmtree(self._generation_dir(old_generation), ignore_errors=True)
+        self._load()
+        logger.info(f"Compacted flat collection '{self.name}' to {len(live_rows)} rows (generation {new_generation}).")
+
+    # --- Reads ---
+
+    def _sync_for_read(self) -> None:
+        with self._file_lock():
+            self._sync()
+
+    def count(self) -> int:
+        with self._lock:
+            self._sync_for_read()
+            return len(self._id_to_row)
+
+    def _select_rows(self, ids=None, where=None) -> List[int]:
+        if ids is not None:
+            rows = [self._id_to_row[doc_id] for doc_id in ids if doc_id in self._id_to_row]
+        else:
+            rows = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+        if where:
+            rows = [row for row in rows if matches_where(self._metadatas[row], where)]
+        return rows
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=('metadatas', 'documents'), **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._sync_for_read()
+            rows = self._select_rows(ids, where)
+            rows = rows[offset or 0:(offset or 0) + limit if limit else None]
+            return {
+                'ids': [self._ids[row] for row in rows],
+                'documents': [self._documents[row] for row in rows] if 'documents' in include else None,
+                'metadatas': [self._metadatas[row] for row in rows] if 'metadatas' in include else None,
+                'embeddings': self._decode_rows(rows) if 'embeddings' in include and rows else ([] if 'embeddings' in include else None),
+            }
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=('metadatas', 'documents', 'distances'),
+              **kwargs) -> Dict[str, Any]:
+        """Exact top-k by the collection's space ('l2' squared distance, 'cosine' or 'ip'), smallest distance first."""
+        with self._lock:
+            self._sync_for_read()
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if self.space == 'cosine':
+                queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+            query_norms = (queries ** 2).sum(axis=1)
+            total = 0 if self._vectors is None else len(self._vectors)
+            mask = self._alive
+            if where:
+                mask = mask & np.array([matches_where(metadata, where) for metadata in self._metadatas[:total]], dtype=bool)
+            k = min(n_results, int(mask.sum()))
+
+            best_distances = np.full((len(queries), 0), np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            for start in range(0, total if k else 0, QUERY_BLOCK_ROWS):
+                stop = min(start + QUERY_BLOCK_ROWS, total)
+                dots = queries @ self._decode(start, stop).T
+                if self.space == 'l2':
+                    distances = query_norms[:, None] + self._norms[start:stop][None, :] - 2.0 * dots
+                else:
+                    distances = 1.0 - dots
+                distances[:, ~mask[start:stop]] = np.inf
+                distances = np.concatenate([best_distances, distances], axis=1)
+                rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, stop), (len(queries), stop - start))], axis=1)
+                if distances.shape[1] > k:
+                    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                    distances = np.take_along_axis(distances, top, axis=1)
+                    rows = np.take_along_axis(rows, top, axis=1)
+                best_distances, best_rows = distances, rows
+
+            order = np.argsort(best_distances, axis=1)
+            best_distances = np.take_along_axis(best_distances, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+            result = {'ids': [], 'documents': [], 'metadatas': [], 'distances': [], 'embeddings': []}
+            for query_rows, query_distances in zip(best_rows, best_distances):
+                rows = [int(row) for row, distance in zip(query_rows, query_distances) if np.isfinite(distance)]
+                result['ids'].append([self._ids[row] for row in rows])
+                result['documents'].append([self._documents[row] for row in rows])
+                result['metadatas'].append([self._metadatas[row] for row in rows])
+                result['distances'].append([float(distance) for distance in query_distances[:len(rows)]])
+                result['embeddings'].append(self._decode_rows(rows) if rows else [])
+            for key in ('documents', 'metadatas', 'distances', 'embeddings'):
+                if key not in include:
+                    result[key] = None
+            return result
+
+
+class FlatVectorStore:
+    """
+    Client for FlatCollection, with the Chroma client methods the services use
+    (get_or_create_collection, get_collection, delete_collection, list_collections).
+    Each collection lives in its own directory under `path`; the web server and management
+    commands may open the same path at once on POSIX systems (see FlatCollection).
+    """
+
+    def __init__(self, path: str, dtype: str = FLOAT16, compact_ratio: float = 0.25):
+        self.path = path
+        self.dtype = dtype
+        self.compact_ratio = compact_ratio
+        self._collections: Dict[str, FlatCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_path(self, name: str) -> str:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid collection name '{name}'.")
+        return os.path.join(self.path, name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> FlatCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FlatCollection(
+                    self._collection_path(name), name, metadata=metadata, dtype=self.dtype, compact_ratio=self.compact_ratio
+                )
+            return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs) -> FlatCollection:
+        if name not in self._collections and not os.path.exists(os.path.join(self._collection_path(name), META_FILE)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs) -> FlatCollection:
+        if name in self._collections or os.path.exists(os.path.join(self._collection_path(name), META_FILE)):
+            raise ValueError(f"Collection {name} already exists.")
+        return self.get_or_create_collection(name, metadata=metadata)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+            path = self._collection_path(name)
+            if not os.path.exists(path):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(path)
+
+    def list_collections(self) -> List[FlatCollection]:
+        names = sorted(
+            name for name in os.listdir(self.path)
+            if os.path.exists(os.path.join(self.path, name, META_FILE))
+        )
+        return [self.get_or_create_collection(name) for name in names]
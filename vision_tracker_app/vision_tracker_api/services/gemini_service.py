@@ -3,27 +3,65 @@
 import google.generativeai as genai
 import os
 from django.conf import settings # Import settings to access GEMINI_API_KEY
+from .embedding_cache import embedding_cache, make_cache_key
+from .embedding_providers import get_embedding_provider
+from .executors import run_on
 
 # Configure the API key from Django settings
 genai.configure(api_key=settings.GEMINI_API_KEY)
 
-def generate_embedding(text: str) -> list:
+def generate_embedding(text: str, task_type: str = "retrieval_document", provider=None) -> list:
     """
-    Generates an embedding for the given text using Google's embedding model.
+    Generates an embedding for the given text using the configured embedding provider
+    (settings.EMBEDDING_PROVIDER: Google's embedding model by default, or local ONNX MiniLM).
+    Results are served from the embedding cache when the same text was embedded before.
     """
-    if not settings.GEMINI_API_KEY:
-        print("Warning: GEMINI_API_KEY is not configured.")
-        return [] # Return empty list or raise an error
-
-    try:
-        # Use the embedding model configured with the API key
-        # The task_type is important for embedding quality
-        response = genai.embed_content(
-            model="models/embedding-001",
-            content=text,
-            task_type="retrieval_document" # Or "retrieval_query" depending on use case
-        )
-        return response['embedding']
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return [] 
\ No newline at end of file
+    return generate_embeddings([text], task_type=task_type, provider=provider)[0]
+
+def generate_embeddings(texts: list, task_type: str = "retrieval_document", batch_size: int = None, provider=None) -> list:
+    """
+    Generates embeddings for many texts, sending cache misses to the provider in batches.
+    `provider` is a provider name or an EmbeddingProvider (see get_embedding_provider).
+    Returns a list aligned with `texts`; an entry is [] when that text could not be embedded.
+    """
+    embedding_provider = get_embedding_provider(provider)
+    batch_size = batch_size or embedding_provider.batch_size
+    embeddings = [[] for _ in texts]
+
+    # Serve what we can from the cache and collect the rest, de-duplicated by key
+    pending = {}
+    for index, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        cache_key = make_cache_key(embedding_provider.model_name, task_type, text)
+        cached = embedding_cache.get(cache_key)
+        if cached is not None:
+            embeddings[index] = cached
+        else:
+            pending.setdefault(cache_key, (text, []))[1].append(index)
+
+    if not pending:
+        return embeddings
+
+    pending_items = list(pending.items())
+    for start in range(0, len(pending_items), batch_size):
+        batch = pending_items[start:start + batch_size]
+        try:
+            batch_embeddings = embedding_provider.embed([text for _, (text, _) in batch], task_type=task_type)
+            for (cache_key, (_, indexes)), embedding in zip(batch, batch_embeddings):
+                embedding_cache.set(cache_key, embedding)
+                for index in indexes:
+                    embeddings[index] = embedding
+        except Exception as e:
+            print(f"Error generating embeddings for batch starting at {start}: {e}")
+
+    return embeddings
+
+async def agenerate_embedding(text: str, task_type: str = "retrieval_document", provider=None) -> list:
+    """Async generate_embedding, run on the embedding provider's backend executor."""
+    return await run_on(get_embedding_provider(provider).executor, generate_embedding, text, task_type, provider)
+
+async def agenerate_embeddings(texts: list, task_type: str = "retrieval_document", batch_size: int = None,
+                               provider=None) -> list:
+    """Async generate_embeddings, run on the embedding provider's backend executor."""
+    return await run_on(get_embedding_provider(provider).executor, generate_embeddings, texts, task_type, batch_size, provider)
@@ -0,0 +1,114 @@
+# vision_tracker_app/vision_tracker_api/services/history_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+
+class CachedHistory:
+    """A deserialized conversation history plus the stored message count it was read at."""
+    __slots__ = ('messages', 'message_count', 'checked_at', 'summary', 'summarized_count')
+
+    def __init__(self, messages: List[Any], message_count: int, summary: str = "", summarized_count: int = 0):
+        self.messages = messages
+        self.message_count = message_count
+        self.checked_at = time.monotonic()
+        self.summary = summary
+        self.summarized_count = summarized_count
+
+
+class ConversationHistoryCache:
+    """
+    Bounded LRU cache of deserialized conversation histories, keyed by conversation_id.
+
+    Before an entry is served, the caller revalidates it against the stored message count (the
+    history is append-only, so the count acts as a version): a cheap read of one document
+    instead of the whole history. With the default `ttl` of 0 that happens on every read, so
+    turns appended by another worker process (or the streaming view) are never missed. A
+    positive `ttl` serves entries written or revalidated within that many seconds without any
+    backend read; only use one with a single worker process, or when a turn from another
+    worker showing up that much later is acceptable.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or getattr(settings, 'CONVERSATION_CACHE_MAX_ENTRIES', 256)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'CONVERSATION_CACHE_TTL_SECONDS', 0)
+        self._entries: "OrderedDict[str, CachedHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, conversation_id: str) -> Optional[CachedHistory]:
+        """Returns the entry (fresh or not) or None. Use `is_fresh` to decide whether to revalidate."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._entries.move_to_end(conversation_id)
+            return entry
+
+    def is_fresh(self, entry: CachedHistory) -> bool:
+        return time.monotonic() - entry.checked_at < self.ttl
+
+    def record(self, outcome: str) -> None:
+        """Counts a lookup outcome: 'hits', 'revalidated' or 'misses'."""
+        with self._lock:
+            self._stats[outcome] += 1
+
+    def touch(self, conversation_id: str) -> None:
+        """Marks an entry as revalidated against the backend."""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                entry.checked_at = time.monotonic()
+
+    def put(self, conversation_id: str, messages: List[Any], message_count: int,
+            summary: Optional[str] = None, summarized_count: Optional[int] = None) -> None:
+        """Stores a history; the rolling summary of an existing entry is kept unless one is given."""
+        with self._lock:
+            previous = self._entries.get(conversation_id)
+            if summary is None:
+                summary, summarized_count = (previous.summary, previous.summarized_count) if previous else ("", 0)
+            self._entries[conversation_id] = CachedHistory(list(messages), message_count, summary, summarized_count or 0)
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def extend(self, conversation_id: str, expected_count: int, messages: List[Any], new_count: int) -> bool:
+        """
+        Write-through for an append: extends the entry only if it was at `expected_count`,
+        otherwise drops it. Returns True if the entry was extended.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return False
+            if entry.message_count != expected_count:
+                del self._entries[conversation_id]
+                self._stats['invalidations'] += 1
+                return False
+            entry.messages = entry.messages + list(messages)
+            entry.message_count = new_count
+            entry.checked_at = time.monotonic()
+            return True
+
+    def set_summary(self, conversation_id: str, summary: str, summarized_count: int) -> None:
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                entry.summary = summary
+                entry.summarized_count = summarized_count
+
+    def invalidate(self, conversation_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(conversation_id, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['revalidated']) / lookups if lookups else 0.0
+        return stats
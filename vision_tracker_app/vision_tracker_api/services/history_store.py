@@ -0,0 +1,179 @@
+# vision_tracker_app/vision_tracker_api/services/history_store.py
+
+import logging
+from typing import List, Tuple
+
+import google.generativeai as genai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .content_serialization import deserialize_messages, serialize_messages
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationHistoryStore:
+    """
+    Interface for conversation-history backends used by the chat views.
+    Histories are append-only lists of genai.protos.Content.
+    """
+    name = None
+
+    async def get_conversation_history(self, conversation_id: str) -> List[genai.protos.Content]:
+        """Returns the stored history in order, or an empty list if there is none."""
+        raise NotImplementedError
+
+    async def append_conversation_messages(self, conversation_id: str, messages: List[genai.protos.Content], expected_count: int = None) -> bool:
+        """Appends the messages of one turn to the end of the conversation."""
+        raise NotImplementedError
+
+    async def save_conversation_history(self, conversation_id: str, history: List[genai.protos.Content]) -> bool:
+        """Saves a complete history, writing only the messages past what is already stored."""
+        raise NotImplementedError
+
+    async def get_conversation_summary(self, conversation_id: str) -> Tuple[str, int]:
+        """Returns (rolling summary, number of leading messages it covers), or ("", 0)."""
+        raise NotImplementedError
+
+    async def save_conversation_summary(self, conversation_id: str, summary: str, summarized_count: int) -> bool:
+        """Stores the rolling summary alongside the conversation."""
+        raise NotImplementedError
+
+
+class FirestoreHistoryStore(ConversationHistoryStore):
+    """Stores histories in Firestore through FirestoreService (append-only layout + in-process cache)."""
+    name = 'firestore'
+
+    def __init__(self):
+        from .firestore_service import firestore_service
+        self._service = firestore_service
+
+    async def get_conversation_history(self, conversation_id):
+        return await self._service.get_conversation_history(conversation_id)
+
+    async def append_conversation_messages(self, conversation_id, messages, expected_count=None):
+        return await self._service.append_conversation_messages(conversation_id, messages, expected_count=expected_count)
+
+    async def save_conversation_history(self, conversation_id, history):
+        return await self._service.save_conversation_history(conversation_id, history)
+
+    async def get_conversation_summary(self, conversation_id):
+        return await self._service.get_conversation_summary(conversation_id)
+
+    async def save_conversation_summary(self, conversation_id, summary, summarized_count):
+        return await self._service.save_conversation_summary(conversation_id, summary, summarized_count)
+
+
+class LocalHistoryStore(ConversationHistoryStore):
+    """
+    Stores histories as ConversationMessage rows in the Django database, one row per message,
+    indexed by (conversation_id, seq). Needs no credentials and no network round trip.
+    """
+    name = 'local'
+
+    def _read_sync(self, conversation_id: str):
+        from ..models import ConversationMessage
+        return list(
+            ConversationMessage.objects.filter(conversation_id=conversation_id)
+            .order_by('seq').values_list('message', flat=True)
+        )
+
+    def _append_sync(self, conversation_id: str, message_dicts, full_history: bool = False):
+        from ..models import ConversationMessage
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    last_seq = ConversationMessage.objects.filter(conversation_id=conversation_id).aggregate(last=Max('seq'))['last']
+                    stored_count = 0 if last_seq is None else last_seq + 1
+                    new_messages = message_dicts[stored_count:] if full_history else message_dicts
+                    ConversationMessage.objects.bulk_create([
+                        ConversationMessage(
+                            conversation_id=conversation_id, seq=stored_count + offset,
+                            role=message_dict.get('role', ''), message=message_dict,
+                        )
+                        for offset, message_dict in enumerate(new_messages)
+                    ])
+                    return stored_count, len(new_messages)
+            except IntegrityError:
+                # Another writer claimed the same seq numbers; re-read the tail and retry once
+                if attempt:
+                    raise
+                logger.warning(f"Concurrent append to conversation '{conversation_id}', retrying.")
+
+    async def get_conversation_history(self, conversation_id):
+        try:
+            message_dicts = await sync_to_async(self._read_sync)(conversation_id)
+            return deserialize_messages(conversation_id, message_dicts)
+        except Exception:
+            logger.exception(f"Error retrieving history for conversation '{conversation_id}' from the local store.")
+            return []
+
+    async def append_conversation_messages(self, conversation_id, messages, expected_count=None):
+        try:
+            message_dicts = serialize_messages(conversation_id, messages)
+            stored_count, written = await sync_to_async(self._append_sync)(conversation_id, message_dicts)
+            if expected_count is not None and expected_count != stored_count:
+                logger.warning(f"Conversation '{conversation_id}' was appended to concurrently (expected {expected_count} messages, found {stored_count}).")
+            logger.debug(f"Appended {written} messages to conversation '{conversation_id}' in the local store.")
+            return True
+        except Exception:
+            logger.exception(f"Error appending messages to conversation '{conversation_id}' in the local store.")
+            return False
+
+    async def save_conversation_history(self, conversation_id, history):
+        try:
+            message_dicts = serialize_messages(conversation_id, history)
+            await sync_to_async(self._append_sync)(conversation_id, message_dicts, True)
+            return True
+        except Exception:
+            logger.exception(f"Error saving history for conversation '{conversation_id}' in the local store.")
+            return False
+
+    def _read_summary_sync(self, conversation_id: str):
+        from ..models import ConversationSummary
+        row = ConversationSummary.objects.filter(conversation_id=conversation_id).values_list('summary', 'summarized_count').first()
+        return row or ("", 0)
+
+    def _save_summary_sync(self, conversation_id: str, summary: str, summarized_count: int):
+        from ..models import ConversationSummary
+        ConversationSummary.objects.update_or_create(
+            conversation_id=conversation_id,
+            defaults={'summary': summary, 'summarized_count': summarized_count},
+        )
+
+    async def get_conversation_summary(self, conversation_id):
+        try:
+            return await sync_to_async(self._read_summary_sync)(conversation_id)
+        except Exception:
+            logger.exception(f"Error retrieving summary for conversation '{conversation_id}' from the local store.")
+            return "", 0
+
+    async def save_conversation_summary(self, conversation_id, summary, summarized_count):
+        try:
+            await sync_to_async(self._save_summary_sync)(conversation_id, summary, summarized_count)
+            return True
+        except Exception:
+            logger.exception(f"Error saving summary for conversation '{conversation_id}' in the local store.")
+            return False
+
+
+HISTORY_STORES = {
+    FirestoreHistoryStore.name: FirestoreHistoryStore,
+    LocalHistoryStore.name: LocalHistoryStore,
+}
+
+_stores = {}
+
+
+def get_history_store(backend: str = None) -> ConversationHistoryStore:
+    """
+    Returns the shared store for `backend`, defaulting to settings.CONVERSATION_HISTORY_BACKEND.
+    """
+    backend = backend or getattr(settings, 'CONVERSATION_HISTORY_BACKEND', FirestoreHistoryStore.name)
+    if backend not in HISTORY_STORES:
+        raise ValueError(f"Unknown conversation history backend '{backend}'. Expected one of {list(HISTORY_STORES)}.")
+    if backend not in _stores:
+        _stores[backend] = HISTORY_STORES[backend]()
+    return _stores[backend]
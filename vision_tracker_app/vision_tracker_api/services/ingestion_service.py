@@ -0,0 +1,294 @@
+# vision_tracker_app/vision_tracker_api/services/ingestion_service.py
+
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def vector_id_for(chunk_id: int, chroma_id: str = None) -> str:
+    """Returns the stable vector-store ID for a MemoryChunk primary key."""
+    return chroma_id or f"memchunk-{chunk_id}"
+
+
+def chroma_id_for(chunk) -> str:
+    """Returns the stable vector-store ID for a MemoryChunk row."""
+    return vector_id_for(chunk.pk, chunk.chroma_id)
+
+
+def next_index_attempt_at(attempts: int, now=None):
+    """
+    When a row that failed to index `attempts` times may be retried: INGESTION_RETRY_BASE_SECONDS,
+    doubled per attempt up to INGESTION_RETRY_MAX_SECONDS.
+    """
+    base = getattr(settings, 'INGESTION_RETRY_BASE_SECONDS', 60)
+    delay = min(base * 2 ** max(0, attempts - 1), getattr(settings, 'INGESTION_RETRY_MAX_SECONDS', 6 * 3600))
+    return (now or timezone.now()) + timedelta(seconds=delay)
+
+
+def build_chroma_metadata(chunk, embedding_model: str = None) -> Dict[str, Any]:
+    """
+    Flattens a MemoryChunk into Chroma-compatible metadata.
+    Chroma only accepts scalar values, so nested metadata entries are dropped.
+    `embedding_model` records which model the vector was embedded with.
+    """
+    metadata = {
+        key: value for key, value in (chunk.metadata or {}).items()
+        if isinstance(value, (str, int, float, bool))
+    }
+    metadata['memory_chunk_id'] = chunk.pk
+    if chunk.tenant_id:
+        metadata['tenant_id'] = chunk.tenant_id
+    if chunk.created_at:
+        metadata['created_at'] = int(chunk.created_at.timestamp())
+    if embedding_model:
+        metadata['embedding_model'] = embedding_model
+    return metadata
+
+
+def build_chunk_items(chunk, embedding_model: str = None) -> List[Dict[str, Any]]:
+    """
+    Vector-store items for a MemoryChunk: a single one for short text, else one per overlapping
+    token-bounded piece (see chunker.split_text). Every item records the memory's vector ID as
+    'parent_id'; pieces also record their 'chunk_index' and 'char_start'/'char_end' span.
+    """
+    from .chunker import chunk_vector_id, split_text
+
+    parent_id = chroma_id_for(chunk)
+    metadata = {**build_chroma_metadata(chunk, embedding_model), 'parent_id': parent_id}
+    spans = split_text(chunk.text_content)
+    if len(spans) == 1:
+        return [{'id': parent_id, 'document': chunk.text_content, 'metadata': metadata}]
+    return [
+        {
+            'id': chunk_vector_id(parent_id, index),
+            'document': chunk.text_content[start:end],
+            'metadata': {**metadata, 'chunk_index': index, 'char_start': start, 'char_end': end},
+        }
+        for index, (start, end) in enumerate(spans)
+    ]
+
+
+def index_memory_chunks(chunk_ids: Iterable[int]) -> Dict[str, Any]:
+    """
+    Embeds and upserts the given MemoryChunk rows into Chroma, then writes back
+    `chroma_id`, `index_status` and `indexed_at` on each row.
+    Rows are written to their tenant's shard when MEMORY_SHARDING_ENABLED is set.
+
+    Long rows are stored as several overlapping chunks (see build_chunk_items); chunks left
+    over from a longer earlier version of a row are removed.
+
+    With MEMORY_DEDUP_ENABLED, rows whose text exactly matches (by content hash) or nearly
+    matches (by embedding similarity to the top neighbour) an existing memory are not indexed;
+    see dedup.py for how they are linked or merged. Near duplicates are only looked for among
+    rows short enough to be a single chunk.
+
+    Args:
+        chunk_ids (Iterable[int]): Primary keys of the rows to index.
+
+    Returns:
+        Dict[str, Any]: 'added' (vector IDs of the rows indexed), 'failed' (vector ID -> reason) and
+        'duplicates' (primary key of each skipped row -> the memory it duplicates).
+    """
+    from ..models import MemoryChunk
+    from .chroma_service import chroma_service
+    from .dedup import content_hash, memory_deduplicator
+    from .gemini_service import generate_embeddings
+    from .tenancy import ANONYMOUS_TENANT
+
+    chunks = list(MemoryChunk.objects.filter(pk__in=set(chunk_ids)).order_by('pk'))
+    if not chunks:
+        return {'added': [], 'failed': {}, 'duplicates': {}}
+    # Pick up a collection switched by reembed_memories before choosing the embedding model
+    chroma_service.refresh_collection()
+    embedder = chroma_service.embedder
+
+    for chunk in chunks:
+        digest = content_hash(chunk.text_content)
+        if chunk.content_hash != digest:
+            chunk.content_hash = digest
+            MemoryChunk.objects.filter(pk=chunk.pk).update(content_hash=digest)
+
+    # pk -> (original pk, near duplicate?)
+    duplicates: Dict[int, Any] = {}
+    if memory_deduplicator.enabled:
+        for chunk in chunks:
+            original_pk = memory_deduplicator.find_exact(chunk)
+            if original_pk is not None:
+                duplicates[chunk.pk] = (original_pk, False)
+
+    by_tenant: Dict[str, List[Any]] = {}
+    for chunk in chunks:
+        if chunk.pk not in duplicates:
+            by_tenant.setdefault(chunk.tenant_id or ANONYMOUS_TENANT, []).append(chunk)
+    items = {
+        chunk.pk: build_chunk_items(chunk, embedder.model_name)
+        for tenant_chunks in by_tenant.values() for chunk in tenant_chunks
+    }
+
+    written = {'added': [], 'failed': {}}
+    for tenant, tenant_chunks in by_tenant.items():
+        tenant_items = [item for chunk in tenant_chunks for item in items[chunk.pk]]
+        # Embedded here rather than in add_memories so the same vectors serve the near-duplicate lookup
+        embeddings = dict(zip(
+            [item['id'] for item in tenant_items],
+            generate_embeddings([item['document'] for item in tenant_items], provider=embedder),
+        ))
+        if memory_deduplicator.enabled:
+            # Grouped by each row's own tenant_id, as rows without one are written with the anonymous tenant's
+            single_by_owner: Dict[str, List[Any]] = {}
+            for chunk in tenant_chunks:
+                embedding = embeddings[items[chunk.pk][0]['id']]
+                if len(items[chunk.pk]) == 1 and embedding:
+                    single_by_owner.setdefault(chunk.tenant_id, []).append((chunk, embedding))
+            for owner, single in single_by_owner.items():
+                near = memory_deduplicator.find_near(
+                    chroma_service.collection_for(tenant, create=False),
+                    [items[chunk.pk][0]['id'] for chunk, _ in single], [embedding for _, embedding in single], owner,
+                )
+                for chunk, _ in single:
+                    if items[chunk.pk][0]['id'] in near:
+                        duplicates[chunk.pk] = (near[items[chunk.pk][0]['id']], True)
+        kept = [chunk for chunk in tenant_chunks if chunk.pk not in duplicates]
+        kept_items = [item for chunk in kept for item in items[chunk.pk]]
+        if kept_items:
+            reindexed = [chroma_id_for(chunk) for chunk in kept if chunk.chroma_id]
+            if reindexed:
+                chroma_service.delete_memories(reindexed, tenant=tenant, keep={item['id'] for item in kept_items})
+            tenant_result = chroma_service.add_memories(
+                kept_items, upsert=True, embeddings=[embeddings[item['id']] for item in kept_items], tenant=tenant,
+            )
+            written['added'].extend(tenant_result['added'])
+            written['failed'].update(tenant_result['failed'])
+
+    for chunk in chunks:
+        if chunk.pk in duplicates:
+            original_pk, near = duplicates[chunk.pk]
+            memory_deduplicator.resolve(chunk, original_pk, near)
+            if chunk.chroma_id:
+                # An edited memory that became a duplicate must not keep its old vector
+                chroma_service.delete_memories([chunk.chroma_id], tenant=chunk.tenant_id or ANONYMOUS_TENANT)
+
+    # Write back with update() so the post_save hook does not re-queue these rows.
+    # A row counts as indexed once every one of its chunks was written.
+    now = timezone.now()
+    written_ids = set(written['added'])
+    attempts = {chunk.pk: chunk.index_attempts for chunk in chunks}
+    result = {'added': [], 'failed': {}}
+    for chunk_pk, chunk_items in items.items():
+        if chunk_pk in duplicates:
+            continue
+        parent_id = chunk_items[0]['metadata']['parent_id']
+        failures = [written['failed'].get(item['id'], "Not written.") for item in chunk_items if item['id'] not in written_ids]
+        if not failures:
+            MemoryChunk.objects.filter(pk=chunk_pk).update(
+                chroma_id=parent_id, index_status=MemoryChunk.INDEX_INDEXED, indexed_at=now, duplicate_of=None,
+                index_attempts=0, next_index_attempt_at=None,
+            )
+            result['added'].append(parent_id)
+        else:
+            MemoryChunk.objects.filter(pk=chunk_pk).update(
+                index_status=MemoryChunk.INDEX_FAILED, index_attempts=attempts[chunk_pk] + 1,
+                next_index_attempt_at=next_index_attempt_at(attempts[chunk_pk] + 1, now),
+            )
+            result['failed'][parent_id] = failures[0]
+            logger.warning(f"Indexing MemoryChunk {chunk_pk} failed: {failures[0]}")
+    result['duplicates'] = {chunk_pk: original_pk for chunk_pk, (original_pk, _) in duplicates.items()}
+    return result
+
+
+class IngestionService:
+    """
+    In-process queue that indexes MemoryChunk rows off the request path.
+
+    Worker threads are started lazily on the first enqueue, so management commands
+    and migrations that never create memories do not spawn them.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(IngestionService, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.num_workers = getattr(settings, 'INGESTION_WORKERS', 2)
+        self.batch_size = getattr(settings, 'INGESTION_BATCH_SIZE', 32)
+        self.batch_wait = getattr(settings, 'INGESTION_BATCH_WAIT_SECONDS', 0.5)
+        self._queue: "queue.Queue[int]" = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats = {'indexed': 0, 'failed': 0, 'duplicates': 0, 'batches': 0, 'last_batch_seconds': None}
+
+    def enqueue(self, chunk_ids: Iterable[int]) -> None:
+        """Queues MemoryChunk primary keys for indexing."""
+        self._ensure_workers()
+        for chunk_id in chunk_ids:
+            self._queue.put(chunk_id)
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.num_workers:
+                worker = threading.Thread(
+                    target=self._run, name=f"memory-ingestion-{len(self._workers)}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _next_batch(self) -> List[int]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            close_old_connections()
+            try:
+                result = index_memory_chunks(batch)
+                with self._lock:
+                    self._stats['indexed'] += len(result['added'])
+                    self._stats['failed'] += len(result['failed'])
+                    self._stats['duplicates'] += len(result['duplicates'])
+            except Exception:
+                logger.exception(f"Ingestion batch of {len(batch)} memory chunks failed.")
+                with self._lock:
+                    self._stats['failed'] += len(batch)
+            finally:
+                close_old_connections()
+                with self._lock:
+                    self._stats['batches'] += 1
+                    self._stats['last_batch_seconds'] = round(time.monotonic() - started, 3)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth, live worker count and processing counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['workers'] = sum(1 for worker in self._workers if worker.is_alive())
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+
+# Initialize the singleton instance when the module is imported
+ingestion_service = IngestionService()
@@ -0,0 +1,121 @@
+# vision_tracker_app/vision_tracker_api/services/keyword_index.py
+
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from django.db import connection
+
+from .ingestion_service import vector_id_for
+
+logger = logging.getLogger(__name__)
+
+MEMORY_TABLE = 'vision_tracker_api_memorychunk'
+FTS_TABLE = 'vision_tracker_api_memorychunk_fts'
+
+# External-content FTS5 index over MemoryChunk.text_content, kept in sync by triggers so
+# every write path (save(), bulk_create(), update(), delete()) is covered.
+FTS_SCHEMA = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(text_content, content='{MEMORY_TABLE}', content_rowid='id')",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {MEMORY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {MEMORY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text_content ON {MEMORY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text_content) VALUES ('delete', old.id, old.text_content);
+        INSERT INTO {FTS_TABLE}(rowid, text_content) VALUES (new.id, new.text_content);
+    END""",
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_available(using_connection=None) -> bool:
+    """The keyword index needs SQLite (with FTS5, which every modern SQLite build ships)."""
+    return (using_connection or connection).vendor == 'sqlite'
+
+
+def install(using_connection=None) -> None:
+    """
+    Creates the FTS table and triggers if missing and rebuilds the index when they were.
+    Called after every migrate, because SQLite table rebuilds during migrations drop triggers.
+    """
+    conn = using_connection or connection
+    if not is_available(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s)", [
+            FTS_TABLE, f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au",
+        ])
+        existing = {row[0] for row in cursor.fetchall()}
+        if len(existing) == 4:
+            return
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    logger.info("Keyword index over MemoryChunk.text_content (re)built.")
+
+
+def build_match_query(query: str) -> str:
+    """Turns free text into an FTS5 query: every word quoted (no operator injection), OR-ed together."""
+    tokens = _TOKEN_RE.findall(query)
+    return " OR ".join(f'"{token}"' for token in tokens)
+
+
+def search(query: str, limit: int, created_after: Optional[datetime] = None, created_before: Optional[datetime] = None,
+           category: Optional[str] = None, tenant: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    BM25-ranked keyword search over MemoryChunk.text_content.
+    With `tenant`, only that tenant's chunks are searched (see MemoryChunk.tenant_id).
+
+    Returns:
+        A list of dicts with 'id' (the vector-store ID), 'document', 'metadata' and 'bm25', best first.
+    """
+    match_query = build_match_query(query)
+    if not match_query or not is_available():
+        return []
+
+    sql = [
+        f"SELECT m.id, m.chroma_id, m.text_content, m.metadata, bm25({FTS_TABLE}) AS rank",
+        f"FROM {FTS_TABLE} JOIN {MEMORY_TABLE} m ON m.id = {FTS_TABLE}.rowid",
+        f"WHERE {FTS_TABLE} MATCH %s",
+        "AND m.duplicate_of_id IS NULL",  # Duplicates are not in the vector store either (see dedup.py)
+    ]
+    params: List[Any] = [match_query]
+    if created_after:
+        sql.append("AND m.created_at >= %s")
+        params.append(created_after)
+    if created_before:
+        sql.append("AND m.created_at <= %s")
+        params.append(created_before)
+    if category:
+        sql.append("AND json_extract(m.metadata, '$.category') = %s")
+        params.append(category)
+    if tenant:
+        sql.append("AND m.tenant_id = %s")
+        params.append(tenant)
+    sql.append("ORDER BY rank LIMIT %s")
+    params.append(limit)
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(" ".join(sql), params)
+            rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Keyword search failed for query '{query}': {e}")
+        return []
+
+    results = []
+    for chunk_id, chroma_id, text_content, metadata, rank in rows:
+        metadata = (json.loads(metadata) if isinstance(metadata, str) else metadata) or {}
+        results.append({
+            'id': vector_id_for(chunk_id, chroma_id),
+            'document': text_content,
+            'metadata': {**metadata, 'memory_chunk_id': chunk_id},
+            'bm25': rank,
+        })
+    return results
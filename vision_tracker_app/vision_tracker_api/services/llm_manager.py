@@ -1,10 +1,8 @@
 # vision_tracker_app/vision_tracker_api/services/llm_manager.py
 
-import google.generativeai as genai
-from django.conf import settings # To access GEMINI_API_KEY
-
-# Configure the Gemini API key
-genai.configure(api_key=settings.GEMINI_API_KEY)
+from django.conf import settings
+from .gemini_service import generate_embedding as _generate_embedding
+from .model_registry import model_registry # Configures the Gemini API key once per process
 
 class LLMManager:
     _instance = None
@@ -17,22 +15,16 @@ class LLMManager:
         return cls._instance
 
     def _initialize_llm(self):
-        """Initializes the Gemini GenerativeModel."""
+        """Fetches the shared Gemini GenerativeModel from the model registry."""
         # Use _model as a private instance variable
-        self._model = genai.GenerativeModel('gemini-1.5-flash')
+        self._model = model_registry.get_model(settings.CHAT_MODEL_NAME)
         print("DEBUG: Gemini flash model initialized in LLMManager.")
 
     # New method to generate embeddings
     def generate_embedding(self, text: str):
-        """Generates an embedding for the given text using Gemini's embedding model."""
-        try:
-            # Ensure the embedding model is used. 'embedding-001' is for embeddings.
-            model = genai.GenerativeModel('embedding-001')
-            embedding_response = model.embed_content(content=text)
-            return embedding_response['embedding']
-        except Exception as e:
-            print(f"ERROR: Failed to generate embedding for text: {e}")
-            return None
+        """Generates an embedding for the given text (cached, see gemini_service.generate_embedding)."""
+        embedding = _generate_embedding(text)
+        return embedding or None
 
     # Renamed from process_user_input to reflect its new role
     def generate_text_response(self, full_prompt: str) -> str:
@@ -0,0 +1,164 @@
+# vision_tracker_app/vision_tracker_api/services/memory_import.py
+
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import MemoryChunk
+from .ingestion_service import index_memory_chunks, ingestion_service
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_TEXT = 'text'
+IMPORT_FORMATS = (FORMAT_NDJSON, FORMAT_TEXT)
+
+# How imported rows get into ChromaDB
+INDEX_INLINE = 'inline'  # Embed and upsert each batch before moving on (management command)
+INDEX_QUEUE = 'queue'  # Hand the batch to the background ingestion queue (API endpoint)
+INDEX_NONE = 'none'  # Leave rows pending for a later sync
+INDEX_MODES = (INDEX_INLINE, INDEX_QUEUE, INDEX_NONE)
+
+
+class ImportRecordError(ValueError):
+    """Raised when a single input line cannot be turned into a MemoryChunk."""
+
+
+def parse_record(line: str, fmt: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses one input line into MemoryChunk field values.
+
+    NDJSON lines must be objects with a 'text' (or 'text_content') key; any 'metadata'
+    object is kept, and remaining keys are folded into the metadata. Plain-text lines
+    become the text itself. Blank lines return None.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if fmt == FORMAT_TEXT:
+        return {'text_content': line, 'metadata': {}}
+
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ImportRecordError(f"Invalid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise ImportRecordError("Each NDJSON line must be a JSON object.")
+
+    text = data.pop('text', None) or data.pop('text_content', None)
+    if not text or not str(text).strip():
+        raise ImportRecordError("Missing 'text' field.")
+    metadata = data.pop('metadata', None) or {}
+    if not isinstance(metadata, dict):
+        raise ImportRecordError("'metadata' must be a JSON object.")
+    metadata.update(data)
+    return {'text_content': str(text), 'metadata': metadata}
+
+
+def iter_import_records(lines: Iterable[str], fmt: str, start_offset: int = 0) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Streams (offset, record, error) tuples from an iterable of lines without buffering the input.
+    `offset` is the number of lines consumed so far, so it can be used to resume an import.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if line_number <= start_offset:
+            continue
+        try:
+            yield line_number, parse_record(line, fmt), None
+        except ImportRecordError as e:
+            yield line_number, None, str(e)
+
+
+class MemoryImporter:
+    """
+    Bulk-loads memories: rows are written with bulk_create in one transaction per batch,
+    then indexed in batches according to `index_mode`.
+
+    `checkpoint_callback` receives the input offset as soon as a batch is committed, before it
+    is indexed, so a crash or embedding error while indexing never makes a resumed import
+    insert the batch again; its rows stay pending and the incremental sync indexes them.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, index_mode: str = INDEX_INLINE,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None, tenant_id: str = '',
+                 checkpoint_callback: Optional[Callable[[int], None]] = None):
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode '{index_mode}'. Expected one of {INDEX_MODES}.")
+        self.batch_size = batch_size or getattr(settings, 'MEMORY_IMPORT_BATCH_SIZE', 500)
+        self.index_mode = index_mode
+        self.progress_callback = progress_callback
+        self.checkpoint_callback = checkpoint_callback
+        # Owner of every imported row (see MemoryChunk.tenant_id)
+        self.tenant_id = tenant_id
+
+    def run(self, lines: Iterable[str], fmt: str = FORMAT_NDJSON, start_offset: int = 0) -> Dict[str, Any]:
+        """
+        Imports every record after `start_offset`.
+
+        Args:
+            lines (Iterable[str]): The input, consumed lazily line by line.
+            fmt (str): 'ndjson' or 'text'.
+            start_offset (int): Number of input lines to skip, as reported by a previous run.
+
+        Returns:
+            Dict[str, Any]: Counters plus the final offset and throughput in rows/s.
+        """
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"Unknown import format '{fmt}'. Expected one of {IMPORT_FORMATS}.")
+
+        stats = {
+            'rows': 0, 'indexed': 0, 'index_failed': 0, 'duplicates': 0, 'errors': 0,
+            'offset': start_offset, 'elapsed_seconds': 0.0, 'rows_per_second': 0.0,
+        }
+        started = time.monotonic()
+        batch = []
+        offset = start_offset
+
+        for offset, record, error in iter_import_records(lines, fmt, start_offset):
+            if error:
+                stats['errors'] += 1
+                logger.warning(f"Skipping import line {offset}: {error}")
+            elif record:
+                batch.append(MemoryChunk(tenant_id=self.tenant_id, **record))
+            if len(batch) >= self.batch_size:
+                self._flush(batch, offset, stats)
+                batch = []
+                self._report(stats, started)
+
+        self._flush(batch, offset, stats)
+        self._report(stats, started)
+        return stats
+
+    def _flush(self, batch, offset: int, stats: Dict[str, Any]) -> None:
+        """Commits `batch` (the input up to line `offset`), records the offset, then indexes the rows."""
+        created = []
+        if batch:
+            with transaction.atomic():
+                created = MemoryChunk.objects.bulk_create(batch)
+        # Everything up to this line is committed, so the offset is safe to resume from
+        chunk_ids = [chunk.pk for chunk in created]
+        stats['rows'] += len(chunk_ids)
+        stats['offset'] = offset
+        if self.checkpoint_callback:
+            self.checkpoint_callback(offset)
+        if not chunk_ids:
+            return
+
+        if self.index_mode == INDEX_INLINE:
+            result = index_memory_chunks(chunk_ids)
+            stats['indexed'] += len(result['added'])
+            stats['index_failed'] += len(result['failed'])
+            stats['duplicates'] += len(result['duplicates'])
+        elif self.index_mode == INDEX_QUEUE:
+            ingestion_service.enqueue(chunk_ids)
+
+    def _report(self, stats: Dict[str, Any], started: float) -> None:
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round(stats['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+        if self.progress_callback:
+            self.progress_callback(dict(stats))
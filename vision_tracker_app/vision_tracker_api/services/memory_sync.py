@@ -0,0 +1,113 @@
+# vision_tracker_app/vision_tracker_api/services/memory_sync.py
+
+import logging
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .ingestion_service import index_memory_chunks
+
+logger = logging.getLogger(__name__)
+
+SYNC_NAME = 'memory_index'
+
+# One sync at a time per process; overlapping runs would only repeat each other's work
+_sync_lock = threading.Lock()
+
+
+def changed_memory_chunks(since, now=None):
+    """
+    MemoryChunk rows the vector store may be missing: rows updated since `since` (any time on the
+    first run) and not re-indexed after that update, plus earlier rows that still need work.
+
+    Duplicates are skipped; editing one with save() marks it pending again. Pending rows younger
+    than MEMORY_SYNC_PENDING_GRACE_SECONDS are left to the ingestion queue, which is still
+    handling them; older ones were lost by it (a restart, or rows written with update()). Failed
+    rows are retried once their backoff (next_index_attempt_at) has passed, and not at all after
+    INGESTION_MAX_ATTEMPTS failures until they are edited.
+    """
+    from ..models import MemoryChunk
+
+    now = now or timezone.now()
+    grace = timedelta(seconds=getattr(settings, 'MEMORY_SYNC_PENDING_GRACE_SECONDS', 300))
+    rows = (
+        MemoryChunk.objects
+        .exclude(index_status=MemoryChunk.INDEX_DUPLICATE)
+        .exclude(index_status=MemoryChunk.INDEX_INDEXED, indexed_at__gte=F('updated_at'))
+        .exclude(index_status=MemoryChunk.INDEX_PENDING, updated_at__gt=now - grace)
+        .exclude(index_status=MemoryChunk.INDEX_FAILED, next_index_attempt_at__gt=now)
+        .exclude(index_status=MemoryChunk.INDEX_FAILED, index_attempts__gte=getattr(settings, 'INGESTION_MAX_ATTEMPTS', 8))
+    )
+    if since is None:
+        return rows
+    return rows.filter(
+        Q(updated_at__gte=since) | Q(index_status__in=[MemoryChunk.INDEX_PENDING, MemoryChunk.INDEX_FAILED])
+    )
+
+
+def sync_memory_index(batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Brings the vector store up to date with MemoryChunk incrementally: rows changed since the
+    stored watermark are re-embedded and upserted (through index_memory_chunks, so chunking,
+    de-duplication and sharding apply), and vectors of deleted rows are removed using the
+    tombstones left by the post_delete signal. The work done scales with the number of changed
+    rows plus the failed rows whose retry is due; the watermark and updated_at index keep
+    unchanged rows out of the query, and rows the ingestion queue is still handling are left
+    to it (see changed_memory_chunks).
+
+    The new watermark is the time this run started, less MEMORY_SYNC_LOOKBACK_SECONDS on the
+    next read, so rows saved while a run is in progress (or committed slightly late) are picked up
+    by the next one.
+
+    Returns:
+        Dict[str, Any]: Counters for this run ('indexed', 'failed', 'duplicates', 'deleted',
+        'seconds'), or {'skipped': True} if another sync is already running in this process.
+    """
+    from ..models import MemoryChunkTombstone, SyncState
+    from .chroma_service import chroma_service
+    from .tenancy import ANONYMOUS_TENANT
+
+    if not _sync_lock.acquire(blocking=False):
+        return {'skipped': True}
+    try:
+        started, run_started_at = time.monotonic(), timezone.now()
+        batch_size = batch_size or getattr(settings, 'MEMORY_SYNC_BATCH_SIZE', 100)
+        state, _ = SyncState.objects.get_or_create(name=SYNC_NAME)
+        since = None
+        if state.watermark is not None:
+            since = state.watermark - timedelta(seconds=getattr(settings, 'MEMORY_SYNC_LOOKBACK_SECONDS', 5))
+
+        stats = {'indexed': 0, 'failed': 0, 'duplicates': 0, 'deleted': 0}
+        # Primary keys are read up front: indexing updates the rows the query filters on
+        chunk_ids = list(changed_memory_chunks(since, run_started_at).order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(chunk_ids), batch_size):
+            result = index_memory_chunks(chunk_ids[start:start + batch_size])
+            stats['indexed'] += len(result['added'])
+            stats['failed'] += len(result['failed'])
+            stats['duplicates'] += len(result['duplicates'])
+
+        tombstones = MemoryChunkTombstone.objects.order_by('pk')[:getattr(settings, 'MEMORY_SYNC_MAX_DELETES', 10000)]
+        by_tenant = {}
+        for tombstone in tombstones:
+            by_tenant.setdefault(tombstone.tenant_id or ANONYMOUS_TENANT, []).append(tombstone)
+        for tenant, tenant_tombstones in by_tenant.items():
+            # Tombstones are kept for the next run if their vectors could not be deleted
+            if chroma_service.delete_memories([tombstone.vector_id for tombstone in tenant_tombstones], tenant=tenant):
+                MemoryChunkTombstone.objects.filter(pk__in=[tombstone.pk for tombstone in tenant_tombstones]).delete()
+                stats['deleted'] += len(tenant_tombstones)
+
+        stats['seconds'] = round(time.monotonic() - started, 3)
+        state.watermark = run_started_at
+        state.last_run_at = timezone.now()
+        state.last_run_stats = stats
+        state.save()
+        logger.info(f"Memory index sync: {stats}")
+        return stats
+    finally:
+        _sync_lock.release()
+
@@ -0,0 +1,49 @@
+# vision_tracker_app/vision_tracker_api/services/mmr.py
+
+from typing import List, Sequence
+
+import numpy as np
+
+
+def mmr_rerank(embeddings: Sequence[Sequence[float]], relevance: Sequence[float], k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Maximal Marginal Relevance: greedily picks the candidate maximising
+    lambda * relevance - (1 - lambda) * (max cosine similarity to anything already picked).
+
+    Cosine similarities come from one Gram-matrix product (normalising the small candidate-by-
+    candidate matrix instead of the embeddings); each pick then only updates a running
+    max-similarity vector in place, so the loop is O(k * candidates).
+
+    Args:
+        embeddings: One embedding per candidate. All-zero rows are treated as similar to nothing.
+        relevance: One relevance score per candidate, higher is better (ideally in [0, 1]).
+        k: How many candidates to select.
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only.
+
+    Returns:
+        List[int]: Indexes into the candidates, in selection order.
+    """
+    count = len(relevance)
+    if count == 0 or k <= 0:
+        return []
+    k = min(k, count)
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    gram = vectors @ vectors.T
+    norms = np.sqrt(np.diagonal(gram))
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    # (1 - lambda) * cosine similarity for every candidate pair
+    penalties = gram * ((1.0 - lambda_mult) * inverse)[:, None] * inverse[None, :]
+
+    # Selected candidates get -inf relevance so they are never picked again
+    remaining = lambda_mult * np.asarray(relevance, dtype=np.float32)
+    scores = remaining.copy()
+    max_penalty = np.full(count, -np.inf, dtype=np.float32)
+    selected = []
+    for _ in range(k):
+        pick = int(scores.argmax())
+        selected.append(pick)
+        remaining[pick] = -np.inf
+        np.maximum(max_penalty, penalties[pick], out=max_penalty)
+        np.subtract(remaining, max_penalty, out=scores)
+    return selected
@@ -0,0 +1,99 @@
+# vision_tracker_app/vision_tracker_api/services/model_registry.py
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import google.generativeai as genai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value: Any) -> Any:
+    """Turns (nested) dicts and lists into hashable tuples for use in a registry key."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of genai.GenerativeModel instances.
+
+    A model (and the function-declaration schema derived from its tools) is built once per
+    (model name, tool set, generation config, system instruction) and shared by every request.
+    GenerativeModel holds no per-conversation state; each request still gets its own
+    ChatSession via start_chat(), so sharing the model across threads is safe.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ModelRegistry, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        # Configure the Gemini API key once for the whole process
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._models: Dict[Any, genai.GenerativeModel] = {}
+        self._lock = threading.Lock()
+        # Separate from the build lock, so counting a hit never waits behind a model build
+        self._stats_lock = threading.Lock()
+        self._stats = {'builds': 0, 'hits': 0, 'build_ms_total': 0.0}
+
+    def get_model(self, model_name: str, tools: Sequence[Callable] = (), generation_config: Optional[Dict[str, Any]] = None,
+                  system_instruction: Optional[str] = None) -> genai.GenerativeModel:
+        """
+        Returns the shared model for this configuration, building it on first use.
+
+        Args:
+            model_name (str): The Gemini model, e.g. 'gemini-1.5-flash'.
+            tools (Sequence[Callable]): Python functions exposed to the model as tools.
+            generation_config (Dict[str, Any], optional): Generation parameters such as temperature.
+            system_instruction (str, optional): The model's system instruction.
+
+        Returns:
+            genai.GenerativeModel: A model instance shared across requests.
+        """
+        key = (model_name, tuple(tools), _freeze(generation_config), system_instruction)
+        model = self._models.get(key)
+        if model is not None:
+            with self._stats_lock:
+                self._stats['hits'] += 1
+            return model
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                started = time.perf_counter()
+                model = genai.GenerativeModel(
+                    model_name=model_name,
+                    tools=list(tools) or None,
+                    generation_config=generation_config,
+                    system_instruction=system_instruction,
+                )
+                build_ms = (time.perf_counter() - started) * 1000
+                self._models[key] = model
+                with self._stats_lock:
+                    self._stats['builds'] += 1
+                    self._stats['build_ms_total'] += build_ms
+                logger.info(f"Built GenerativeModel '{model_name}' with {len(tools)} tools in {build_ms:.2f} ms.")
+            else:
+                with self._stats_lock:
+                    self._stats['hits'] += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['models'] = len(self._models)
+        return stats
+
+
+# Make it a singleton so every request shares the same model instances
+model_registry = ModelRegistry()
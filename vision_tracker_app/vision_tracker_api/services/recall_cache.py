@@ -0,0 +1,68 @@
+# vision_tracker_app/vision_tracker_api/services/recall_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .embedding_cache import normalize_text
+
+
+def normalize_query(query: str) -> str:
+    """Case-folds and collapses whitespace and trailing punctuation so near-identical queries share an entry."""
+    return normalize_text(query).lower().strip(" ?!.,;:")
+
+
+class RecallCache:
+    """
+    LRU cache of formatted recall_memories results.
+
+    Keys include the vector collection's generation (ChromaService.current_generation), which
+    changes on every write in any process; entries made before a write simply stop matching and
+    age out of the LRU. Entries also expire after `ttl` seconds, in case a write is missed.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or getattr(settings, 'RECALL_CACHE_MAX_ENTRIES', 512)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'RECALL_CACHE_TTL_SECONDS', 300)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def make_key(query: str, n_results: int, generation: int, *extra) -> tuple:
+        return (normalize_query(query), int(n_results), generation) + tuple(extra)
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key: tuple, result: str) -> None:
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+# Shared by every recall_memories call in the process
+recall_cache = RecallCache()
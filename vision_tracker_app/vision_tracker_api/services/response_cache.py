@@ -0,0 +1,160 @@
+# vision_tracker_app/vision_tracker_api/services/response_cache.py
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .embedding_providers import get_embedding_provider
+from .executors import CHROMA, run_on
+from .gemini_service import agenerate_embedding, generate_embedding
+from .tenancy import shard_collection_name
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticResponseCache:
+    """
+    Opt-in cache of chat answers for near-duplicate prompts.
+
+    Recent prompt/response pairs live in a small dedicated Chroma collection (cosine space).
+    A new message is embedded and matched against pairs from the same user scope and the same
+    system instruction (role + vision statement); above the similarity threshold the stored
+    answer is returned instead of calling Gemini. Entries expire after a TTL and the
+    collection is trimmed to a maximum size, oldest first.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SemanticResponseCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.enabled = getattr(settings, 'SEMANTIC_CACHE_ENABLED', False)
+        self.collection_name = getattr(settings, 'SEMANTIC_CACHE_COLLECTION', 'vision_tracker_response_cache')
+        self.threshold = getattr(settings, 'SEMANTIC_CACHE_SIMILARITY_THRESHOLD', 0.95)
+        self.ttl = getattr(settings, 'SEMANTIC_CACHE_TTL_SECONDS', 24 * 3600)
+        self.max_entries = getattr(settings, 'SEMANTIC_CACHE_MAX_ENTRIES', 1000)
+        self._collection = None
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from .chroma_service import chroma_service
+            # A collection's dimension is fixed by its first vector, so each embedding model gets its own
+            provider = get_embedding_provider()
+            self._collection = chroma_service.client.get_or_create_collection(
+                name=shard_collection_name(self.collection_name, f"{provider.name}-{provider.model_name}"),
+                metadata={'hnsw:space': 'cosine'},
+            )
+        return self._collection
+
+    @staticmethod
+    def context_hash(system_instruction: str) -> str:
+        """Identifies the assistant configuration (role + vision statement) an answer was produced under."""
+        return hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:16]
+
+    def lookup(self, message: str, scope: str, context_hash: str, embedding: list = None) -> Optional[str]:
+        """
+        Returns a cached answer for a near-duplicate message in the same scope, or None.
+        The message is embedded here unless its `embedding` is passed in (see alookup).
+        """
+        if embedding is None:
+            embedding = generate_embedding(message, task_type="semantic_similarity")
+        if not embedding:
+            return None
+        try:
+            results = self.collection.query(
+                query_embeddings=[embedding],
+                n_results=1,
+                where={'$and': [
+                    {'scope': scope},
+                    {'context_hash': context_hash},
+                    {'created_at': {'$gte': int(time.time() - self.ttl)}},
+                ]},
+                include=['metadatas', 'distances'],
+            )
+        except Exception as e:
+            logger.error(f"Semantic cache lookup failed: {e}")
+            return None
+
+        if results['ids'] and results['ids'][0]:
+            similarity = 1.0 - results['distances'][0][0]
+            if similarity >= self.threshold:
+                with self._lock:
+                    self._stats['hits'] += 1
+                logger.info(f"Semantic cache hit (similarity {similarity:.3f}) for scope '{scope}'.")
+                return results['metadatas'][0][0]['response']
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def store(self, message: str, response: str, scope: str, context_hash: str, embedding: list = None) -> None:
+        """Remembers a prompt/response pair and trims expired or excess entries."""
+        if embedding is None:
+            embedding = generate_embedding(message, task_type="semantic_similarity")
+        if not embedding or not response:
+            return
+        try:
+            self.collection.add(
+                ids=[str(uuid.uuid4())],
+                documents=[message],
+                embeddings=[embedding],
+                metadatas=[{'scope': scope, 'context_hash': context_hash, 'created_at': int(time.time()), 'response': response}],
+            )
+            with self._lock:
+                self._stats['stores'] += 1
+            self._evict()
+        except Exception as e:
+            logger.error(f"Failed to store chat response in the semantic cache: {e}")
+
+    async def alookup(self, message: str, scope: str, context_hash: str) -> Optional[str]:
+        """Async lookup: embeds on the embedding provider's executor, queries on the Chroma executor."""
+        embedding = await agenerate_embedding(message, task_type="semantic_similarity")
+        return await run_on(CHROMA, self.lookup, message, scope, context_hash, embedding)
+
+    async def astore(self, message: str, response: str, scope: str, context_hash: str) -> None:
+        """Async store: embeds on the embedding provider's executor, writes on the Chroma executor."""
+        if not response:
+            return
+        embedding = await agenerate_embedding(message, task_type="semantic_similarity")
+        await run_on(CHROMA, self.store, message, response, scope, context_hash, embedding)
+
+    def _evict(self) -> None:
+        if self.collection.count() <= self.max_entries:
+            # Only expired entries need to go
+            expired = self.collection.get(where={'created_at': {'$lt': int(time.time() - self.ttl)}}, include=[])
+            stale_ids = expired['ids']
+        else:
+            entries = self.collection.get(include=['metadatas'])
+            by_age = sorted(zip(entries['ids'], entries['metadatas']), key=lambda entry: entry[1].get('created_at', 0))
+            cutoff = time.time() - self.ttl
+            excess = len(by_age) - self.max_entries
+            stale_ids = [
+                entry_id for position, (entry_id, metadata) in enumerate(by_age)
+                if position < excess or metadata.get('created_at', 0) < cutoff
+            ]
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+            with self._lock:
+                self._stats['evictions'] += len(stale_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
+
+
+# Initialize the singleton instance when the module is imported
+semantic_response_cache = SemanticResponseCache()
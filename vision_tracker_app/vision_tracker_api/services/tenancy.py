@@ -0,0 +1,58 @@
+# vision_tracker_app/vision_tracker_api/services/tenancy.py
+
+import contextlib
+import contextvars
+import hashlib
+import re
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+ANONYMOUS_TENANT = 'anonymous'
+
+# The tenant whose memories the current request may read and write. Set per request by the
+# views; the backend executors copy contextvars, so tool calls on worker threads see it too.
+current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_tenant', default=None)
+
+_UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9_-]")
+# Chroma collection names are at most 63 characters
+MAX_COLLECTION_NAME_LENGTH = 63
+
+
+def resolve_user_scope(request) -> str:
+    """Identifies whose data a request may see (authenticated user, else the shared anonymous scope)."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user-{user.pk}"
+    return ANONYMOUS_TENANT
+
+
+def sharding_enabled() -> bool:
+    return getattr(settings, 'MEMORY_SHARDING_ENABLED', False)
+
+
+def get_current_tenant() -> str:
+    return current_tenant.get() or ANONYMOUS_TENANT
+
+
+@contextlib.contextmanager
+def use_tenant(tenant: str) -> Iterator[None]:
+    """Makes `tenant` the current tenant for the enclosed block."""
+    token = current_tenant.set(tenant)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+def shard_collection_name(base_name: str, tenant: str) -> str:
+    """
+    Returns the collection holding `tenant`'s memories, e.g. 'vision_tracker_memories__user-7'.
+    Characters Chroma does not allow are replaced, and over-long tenants are shortened with a hash.
+    """
+    safe_tenant = _UNSAFE_CHARS_RE.sub('-', tenant).strip('-_') or ANONYMOUS_TENANT
+    name = f"{base_name}__{safe_tenant}"
+    if len(name) > MAX_COLLECTION_NAME_LENGTH or safe_tenant != tenant:
+        digest = hashlib.sha256(tenant.encode('utf-8')).hexdigest()[:12]
+        name = f"{base_name}__{safe_tenant[:MAX_COLLECTION_NAME_LENGTH - len(base_name) - 15]}-{digest}"
+    return name
@@ -0,0 +1,46 @@
+# vision_tracker_app/vision_tracker_api/signals.py
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import MemoryChunk, MemoryChunkTombstone
+from .services import keyword_index
+from .services.ingestion_service import chroma_id_for, ingestion_service
+
+
+@receiver(post_save, sender=MemoryChunk)
+def queue_memory_chunk_for_indexing(sender, instance, raw=False, **kwargs):
+    """Marks a new or edited MemoryChunk as pending and hands it to the ingestion queue after commit."""
+    if raw:  # Skip fixture loading
+        return
+
+    def _enqueue():
+        # An edit starts the retry budget of a row that kept failing over
+        MemoryChunk.objects.filter(pk=instance.pk).update(
+            index_status=MemoryChunk.INDEX_PENDING, index_attempts=0, next_index_attempt_at=None
+        )
+        ingestion_service.enqueue([instance.pk])
+
+    transaction.on_commit(_enqueue)
+
+
+@receiver(pre_delete, sender=MemoryChunk)
+def requeue_duplicates_of_deleted_chunk(sender, instance, **kwargs):
+    """Memories skipped as duplicates of a deleted one are indexed in its place."""
+    duplicate_ids = list(instance.duplicates.values_list('pk', flat=True))
+    if duplicate_ids:
+        transaction.on_commit(lambda: ingestion_service.enqueue(duplicate_ids))
+
+
+@receiver(post_delete, sender=MemoryChunk)
+def record_memory_chunk_tombstone(sender, instance, **kwargs):
+    """Leaves a tombstone so the next incremental sync (see memory_sync.py) removes the row's vectors."""
+    MemoryChunkTombstone.objects.create(
+        chunk_id=instance.pk, vector_id=chroma_id_for(instance), tenant_id=instance.tenant_id
+    )
+
+
+def install_keyword_index(sender, using='default', **kwargs):
+    """(Re)creates the FTS5 keyword index after migrate; SQLite table rebuilds drop its triggers."""
+    keyword_index.install(connections[using])
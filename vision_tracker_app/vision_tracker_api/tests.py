@@ -1,3 +1,1880 @@
-from django.test import TestCase
+# vision_tracker_app/vision_tracker_api/tests.py
 
-# Create your tests here.
+import contextvars
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import google.generativeai as genai
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from firebase_admin import firestore
+
+from . import tools, views
+from .management.commands.reembed_memories import RateLimiter
+from .models import ConversationMessage, MemoryChunk, MemoryChunkTombstone
+from .prompts import LEGACY_PREAMBLE_MARKER, build_system_instruction, strip_legacy_preamble
+from .services import embedding_providers, keyword_index
+from .services.chroma_service import (
+    ChromaService, CollectionCache, chroma_service, hnsw_metadata, open_vector_store, read_alias,
+    write_generation_stamp,
+)
+from .services.chunker import split_text
+from .services.content_serialization import serialize_messages
+from .services.context_window import ConversationSummarizer, SUMMARY_PREFIX, build_context_window
+from .services.dedup import DEDUP_MERGE, content_hash, distance_to_similarity, memory_deduplicator
+from .services.embedding_cache import EmbeddingCache, embedding_cache, make_cache_key
+from .services.embedding_providers import (
+    EMBEDDING_PROVIDERS, EmbeddingProvider, GeminiEmbeddingProvider, get_embedding_provider,
+)
+from .services.executors import BackendExecutor, LOCAL_EMBEDDING, get_executor, run_on
+from .services.firestore_service import firestore_service
+from .services.flat_vector_store import FlatVectorStore, ROWS_FILE, VECTORS_FILE, matches_where
+from .services.gemini_service import agenerate_embedding, generate_embedding, generate_embeddings
+from .services.history_cache import ConversationHistoryCache
+from .services.history_store import LocalHistoryStore, get_history_store
+from .services.ingestion_service import index_memory_chunks, ingestion_service
+from .services.memory_import import (
+    FORMAT_NDJSON, FORMAT_TEXT, INDEX_INLINE, INDEX_NONE, ImportRecordError, MemoryImporter, iter_import_records,
+    parse_record,
+)
+from .services.memory_sync import changed_memory_chunks, sync_memory_index
+from .services.mmr import mmr_rerank
+from .services.model_registry import ModelRegistry, model_registry
+from .services.recall_cache import RecallCache, normalize_query
+from .services.response_cache import SemanticResponseCache, semantic_response_cache
+from .services.tenancy import shard_collection_name, use_tenant
+from .views import LLMChatStreamView, LLMChatView
+
+
+def bag_of_words_vector(text, dimensions=64):
+    """Deterministic stand-in for a text embedding: texts sharing words get close unit vectors."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+    return (vector / max(np.linalg.norm(vector), 1e-12)).tolist()
+
+
+def fake_embed_content(model, content, task_type=None, **kwargs):
+    """Replaces genai.embed_content, so no test reaches the Gemini API."""
+    if isinstance(content, str):
+        return {'embedding': bag_of_words_vector(content)}
+    return {'embedding': [bag_of_words_vector(text) for text in content]}
+
+
+def use_fake_embeddings(testcase):
+    """Serves Gemini embedding calls from fake_embed_content until the test ends. Returns the mock."""
+    api_key = override_settings(GEMINI_API_KEY='test-key')
+    api_key.enable()
+    testcase.addCleanup(api_key.disable)
+    patcher = mock.patch.object(genai, 'embed_content', side_effect=fake_embed_content)
+    testcase.addCleanup(patcher.stop)
+    return patcher.start()
+
+
+def use_temporary_collection(testcase, metadata=None):
+    """Points chroma_service at a fresh, empty memories collection until the test ends."""
+    name = f"test_memories_{uuid.uuid4().hex[:12]}"
+    collection = chroma_service.client.get_or_create_collection(name=name, metadata=metadata)
+    testcase.addCleanup(chroma_service.client.delete_collection, name)
+    patcher = mock.patch.object(chroma_service, '_collection', collection)
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+    return collection
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'embeddings.sqlite3')
+
+    def open(self, **kwargs):
+        # A private instance on a temporary file rather than the process-wide singleton
+        with mock.patch.object(EmbeddingCache, '_instance', None):
+            return EmbeddingCache(path=self.path, **kwargs)
+
+    def test_key_ignores_whitespace_but_not_model_or_task(self):
+        key = make_cache_key('model-a', 'retrieval_document', "Ran  5k\ttoday ")
+        self.assertEqual(key, make_cache_key('model-a', 'retrieval_document', "Ran 5k today"))
+        self.assertNotEqual(key, make_cache_key('model-b', 'retrieval_document', "Ran 5k today"))
+        self.assertNotEqual(key, make_cache_key('model-a', 'retrieval_query', "Ran 5k today"))
+
+    def test_entries_survive_in_the_disk_tier(self):
+        cache = self.open()
+        cache.set('k', [0.25, 0.5])
+        self.assertEqual(cache.get('k'), [0.25, 0.5])
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+
+        reopened = self.open()
+        self.assertEqual(reopened.get('k'), [0.25, 0.5])
+        self.assertEqual(reopened.stats()['disk_hits'], 1)
+
+    def test_failed_embeddings_are_not_cached(self):
+        cache = self.open()
+        cache.set('k', [])
+        self.assertIsNone(cache.get('k'))
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        cache = self.open(memory_size=1, max_disk_entries=10)
+        for index in range(15):
+            cache.set(f'k{index}', [float(index)])
+
+        reopened = self.open(memory_size=100)
+        kept = [index for index in range(15) if reopened.get(f'k{index}') is not None]
+        self.assertLessEqual(len(kept), 10)
+        self.assertNotIn(0, kept)
+        self.assertIn(14, kept)
+
+    def test_generate_embedding_calls_the_api_once_per_text(self):
+        embed_content = use_fake_embeddings(self)
+        first = generate_embedding("Cached embedding test: long run on Sunday")
+        second = generate_embedding("Cached embedding test:  long run on Sunday ")
+
+        self.assertEqual(first, second)
+        self.assertEqual(embed_content.call_count, 1)
+
+
+class BatchEmbeddingTests(SimpleTestCase):
+    def setUp(self):
+        self.embed_content = use_fake_embeddings(self)
+        patcher = mock.patch.object(embedding_cache, 'enabled', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_texts_are_embedded_in_batches_once_each(self):
+        texts = ["walked the dog", "read a book", "walked the dog", "", "called mum", "wrote code"]
+        embeddings = generate_embeddings(texts, batch_size=2)
+
+        self.assertEqual(self.embed_content.call_count, 2)  # Four distinct texts
+        self.assertEqual(embeddings[0], embeddings[2])
+        self.assertEqual(embeddings[3], [])
+        self.assertTrue(all(embeddings[index] for index in (0, 1, 4, 5)))
+
+    def test_failed_batch_leaves_only_its_texts_empty(self):
+        self.embed_content.side_effect = [RuntimeError("quota exceeded"), fake_embed_content('m', ["c", "d"])]
+        embeddings = generate_embeddings(["a", "b", "c", "d"], batch_size=2)
+        self.assertEqual(embeddings[:2], [[], []])
+        self.assertTrue(embeddings[2] and embeddings[3])
+
+
+class AddMemoriesTests(SimpleTestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+
+    def test_valid_items_are_written_and_invalid_ones_reported(self):
+        result = chroma_service.add_memories([
+            {'id': 'm1', 'document': "Ran 5k", 'metadata': {'category': 'health'}},
+            {'id': 'm2', 'document': "Read a chapter", 'metadata': {'category': 'learning'}},
+            {'id': 'm3', 'document': "   "},
+            {'document': "No ID"},
+            {'document': "No ID either"},
+            {'id': 'm6', 'document': "Wrote without tags", 'metadata': {}},
+        ])
+
+        self.assertEqual(result['added'], ['m1', 'm2', 'm6'])
+        self.assertEqual(result['failed'], {'m3': "Empty document.", '#3': "Missing document ID.",
+                                            '#4': "Missing document ID."})
+        self.assertEqual(self.collection.count(), 3)
+        self.assertEqual(self.collection.get(ids=['m1'])['metadatas'], [{'category': 'health'}])
+
+    def test_upsert_replaces_existing_documents(self):
+        chroma_service.add_memories([{'id': 'm1', 'document': "Ran 5k", 'metadata': {'category': 'health'}}])
+        result = chroma_service.add_memories(
+            [{'id': 'm1', 'document': "Ran 10k", 'metadata': {'category': 'health'}}], upsert=True
+        )
+
+        self.assertEqual(result['added'], ['m1'])
+        self.assertEqual(self.collection.get(ids=['m1'])['documents'], ["Ran 10k"])
+
+
+class IngestionTests(TestCase):
+    def setUp(self):
+        self.embed_content = use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+
+    def test_indexing_writes_vectors_and_marks_rows(self):
+        chunk = MemoryChunk.objects.create(
+            text_content="Ran 5k before work", metadata={'category': 'health', 'nested': {'a': 1}}
+        )
+        result = index_memory_chunks([chunk.pk])
+
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.index_status, MemoryChunk.INDEX_INDEXED)
+        self.assertIsNotNone(chunk.indexed_at)
+        self.assertEqual(result['added'], [chunk.chroma_id])
+        metadata = self.collection.get(ids=[chunk.chroma_id])['metadatas'][0]
+        self.assertEqual((metadata['category'], metadata['memory_chunk_id']), ('health', chunk.pk))
+        self.assertNotIn('nested', metadata)  # Chroma only stores scalars
+
+    def test_rows_that_cannot_be_embedded_are_marked_failed(self):
+        self.embed_content.side_effect = RuntimeError("embedding backend unavailable")
+        chunk = MemoryChunk.objects.create(text_content="Meditated for ten minutes")
+        index_memory_chunks([chunk.pk])
+
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.index_status, MemoryChunk.INDEX_FAILED)
+        self.assertEqual(self.collection.count(), 0)
+
+    def test_saving_a_memory_queues_it_after_commit(self):
+        with mock.patch.object(ingestion_service, 'enqueue') as enqueue:
+            with self.captureOnCommitCallbacks(execute=True):
+                chunk = MemoryChunk.objects.create(text_content="Called an old friend")
+        enqueue.assert_called_once_with([chunk.pk])
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.index_status, MemoryChunk.INDEX_PENDING)
+
+
+class MemoryImportParsingTests(SimpleTestCase):
+    def test_parse_ndjson_folds_extra_keys_into_metadata(self):
+        record = parse_record('{"text": "Ran 5k", "metadata": {"category": "health"}, "source": "app"}', FORMAT_NDJSON)
+        self.assertEqual(record, {'text_content': "Ran 5k", 'metadata': {'category': 'health', 'source': 'app'}})
+
+    def test_parse_text_and_blank_lines(self):
+        self.assertEqual(parse_record("  Ran 5k  \n", FORMAT_TEXT)['text_content'], "Ran 5k")
+        self.assertIsNone(parse_record("   \n", FORMAT_NDJSON))
+
+    def test_parse_errors(self):
+        for line in ('{not json', '[1, 2]', '{"metadata": {}}', '{"text": "x", "metadata": [1]}'):
+            with self.subTest(line=line), self.assertRaises(ImportRecordError):
+                parse_record(line, FORMAT_NDJSON)
+
+    def test_iter_records_reports_line_numbers_and_skips_to_offset(self):
+        lines = ['{"text": "one"}', 'oops', '', '{"text": "four"}']
+        records = list(iter_import_records(lines, FORMAT_NDJSON))
+        self.assertEqual([line for line, _, _ in records], [1, 2, 3, 4])
+        self.assertIsNotNone(records[1][2])
+        self.assertIsNone(records[2][1])
+
+        resumed = list(iter_import_records(lines, FORMAT_NDJSON, start_offset=2))
+        self.assertEqual([(line, record['text_content']) for line, record, _ in resumed if record], [(4, 'four')])
+
+
+class MemoryImporterTests(TestCase):
+    def lines(self, count):
+        return [json.dumps({'text': f"imported memory {index}"}) for index in range(count)]
+
+    def test_rows_are_committed_per_batch_and_progress_carries_the_offset(self):
+        reports = []
+        stats = MemoryImporter(batch_size=2, index_mode=INDEX_NONE, progress_callback=reports.append).run(
+            self.lines(5) + ['not json']
+        )
+
+        self.assertEqual((stats['rows'], stats['errors'], stats['offset']), (5, 1, 6))
+        self.assertEqual([report['offset'] for report in reports][:2], [2, 4])
+        self.assertEqual(MemoryChunk.objects.count(), 5)
+
+    def test_inline_mode_indexes_each_batch(self):
+        use_fake_embeddings(self)
+        collection = use_temporary_collection(self)
+        stats = MemoryImporter(batch_size=2, index_mode=INDEX_INLINE).run(self.lines(3))
+
+        self.assertEqual(stats['indexed'], 3)
+        self.assertEqual(collection.count(), 3)
+        self.assertFalse(MemoryChunk.objects.exclude(index_status=MemoryChunk.INDEX_INDEXED).exists())
+
+    def test_command_resumes_from_its_checkpoint(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path, checkpoint = os.path.join(directory, 'memories.ndjson'), os.path.join(directory, 'checkpoint')
+        with open(path, 'w') as f:
+            f.write("\n".join(self.lines(3)) + "\n")
+
+        options = {'index': INDEX_NONE, 'checkpoint': checkpoint, 'stdout': io.StringIO()}
+        call_command('import_memories', path, **options)
+        with open(checkpoint) as f:
+            self.assertEqual(f.read().strip(), '3')
+
+        with open(path, 'a') as f:
+            f.write(json.dumps({'text': "added later"}) + "\n")
+        call_command('import_memories', path, **options)
+        self.assertEqual(MemoryChunk.objects.count(), 4)
+
+    def test_upload_endpoint_queues_the_rows(self):
+        upload = SimpleUploadedFile('memories.txt', b"first memory\n\nsecond memory\n")
+        with mock.patch.object(ingestion_service, 'enqueue') as enqueue:
+            response = self.client.post(reverse('memory_import'), {'file': upload, 'format': FORMAT_TEXT})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['rows'], response.json()['offset']), (2, 3))
+        self.assertEqual(len(enqueue.call_args[0][0]), 2)
+
+    @override_settings(MEMORY_IMPORT_BATCH_SIZE=2)
+    def test_upload_with_invalid_utf8_reports_the_committed_offset(self):
+        upload = SimpleUploadedFile('memories.txt', b"first memory\nsecond memory\nthird \xff memory\n")
+        with mock.patch.object(ingestion_service, 'enqueue'):
+            response = self.client.post(reverse('memory_import'), {'file': upload, 'format': FORMAT_TEXT})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 2)
+        self.assertEqual(MemoryChunk.objects.count(), 2)
+
+    def test_upload_that_fails_midway_reports_the_committed_offset(self):
+        upload = SimpleUploadedFile('memories.txt', b"first memory\nsecond memory\nthird memory\n")
+        with mock.patch.object(ingestion_service, 'enqueue', side_effect=[None, RuntimeError("queue full")]), \
+                override_settings(MEMORY_IMPORT_BATCH_SIZE=2), self.assertLogs('vision_tracker_api.views', 'ERROR'):
+            response = self.client.post(reverse('memory_import'), {'file': upload, 'format': FORMAT_TEXT})
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()['offset'], 3)
+
+    def test_command_rejects_invalid_utf8(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'memories.txt')
+        with open(path, 'wb') as f:
+            f.write(b"first memory\n\xff\xfe\n")
+
+        with self.assertRaisesMessage(CommandError, "not valid UTF-8"):
+            call_command('import_memories', path, index=INDEX_NONE, stdout=io.StringIO())
+
+
+class FakeStreamingChat:
+    """Stands in for a Gemini ChatSession: each send_message streams the next scripted list of parts."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.sent = []
+        self.history = []
+
+    def send_message(self, message, stream=False):
+        self.sent.append(message)
+        return [SimpleNamespace(parts=[part]) for part in self.replies.pop(0)]
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@mock.patch.object(LLMChatStreamView, '_load_history', mock.AsyncMock(return_value=[]))
+class ChatStreamTests(SimpleTestCase):
+    async def stream(self, chat, message="How do I keep going?"):
+        with mock.patch.object(LLMChatStreamView, '_start_chat', return_value=chat), \
+                mock.patch.object(LLMChatStreamView, '_save_history', new_callable=mock.AsyncMock) as save_history:
+            response = await self.async_client.post(
+                reverse('llm_chat_stream'), {'message': message}, content_type='application/json'
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        return response, parse_sse(body), save_history
+
+    async def test_tokens_stream_as_events_and_the_turn_is_saved(self):
+        chat = FakeStreamingChat([genai.protos.Part(text="Keep "), genai.protos.Part(text="running!")])
+        response, events, save_history = await self.stream(chat)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual([event for event, _ in events], ['conversation', 'token', 'token', 'done'])
+        self.assertEqual("".join(data['text'] for event, data in events if event == 'token'), "Keep running!")
+        self.assertIsNotNone(events[-1][1]['ttft_ms'])
+        self.assertIn("How do I keep going?", chat.sent[0])
+        save_history.assert_awaited_once()
+
+    async def test_tool_calls_run_between_streamed_replies(self):
+        recall = mock.Mock(return_value="Observation: ran 5k last week")
+        chat = FakeStreamingChat(
+            [genai.protos.Part(function_call=genai.protos.FunctionCall(name='recall_memories', args={'query': 'running'}))],
+            [genai.protos.Part(text="You ran 5k last week.")],
+        )
+        with mock.patch.dict(tools.AVAILABLE_TOOLS, {'recall_memories': recall}):
+            _, events, _ = await self.stream(chat)
+
+        self.assertEqual([event for event, _ in events],
+                         ['conversation', 'tool_call_started', 'tool_call_finished', 'token', 'done'])
+        self.assertEqual(events[1][1], {'name': 'recall_memories', 'args': {'query': 'running'}})
+        recall.assert_called_once_with(query='running')
+        function_response = chat.sent[1][0].function_response
+        self.assertEqual(function_response.response['result'], "Observation: ran 5k last week")
+
+    async def test_model_errors_end_the_stream_with_an_error_event(self):
+        chat = FakeStreamingChat()  # No scripted reply: send_message raises
+        with self.assertLogs('vision_tracker_api.views', 'ERROR'):
+            _, events, save_history = await self.stream(chat)
+
+        self.assertEqual([event for event, _ in events], ['conversation', 'error'])
+        save_history.assert_not_awaited()
+
+    async def test_missing_message_is_rejected(self):
+        response = await self.async_client.post(reverse('llm_chat_stream'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FakeFirestore:
+    """An in-memory stand-in for the parts of the Firestore client the history methods use."""
+
+    def __init__(self):
+        self.documents = {}
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeWriteBatch()
+
+    def transaction(self):
+        return FakeWriteBatch()
+
+
+class FakeWriteBatch:
+    def set(self, reference, data, merge=False):
+        reference.set(data, merge=merge)
+
+    def commit(self):
+        pass
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db, self.path = db, path
+
+    def document(self, document_id):
+        return FakeDocument(self.db, self.path + (document_id,))
+
+    def order_by(self, field):
+        return self
+
+    def stream(self):
+        children = [path for path in self.db.documents if path[:-1] == self.path]
+        return [FakeDocument(self.db, path).get() for path in sorted(children)]
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db, self.path = db, path
+        self.id = path[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, self.path + (name,))
+
+    def get(self, transaction=None):
+        data = self.db.documents.get(self.path)
+        return mock.Mock(exists=data is not None, id=self.id, to_dict=lambda: dict(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        stored = dict(self.db.documents.get(self.path, {})) if merge else {}
+        stored.update(data)
+        self.db.documents[self.path] = stored
+
+    def update(self, data):
+        stored = self.db.documents[self.path]
+        for field, value in data.items():
+            if value is firestore.DELETE_FIELD:
+                stored.pop(field, None)
+            else:
+                stored[field] = value
+
+
+def use_fake_firestore(testcase):
+    """Points the Firestore service at an empty in-memory FakeFirestore for one test."""
+    db = FakeFirestore()
+    for patcher in (mock.patch.object(firestore_service, '_db', db),
+                    mock.patch.object(firestore_service, 'history_cache', ConversationHistoryCache()),
+                    mock.patch.object(firestore, 'transactional', lambda function: function)):
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+    return db
+
+
+def make_message(role, text):
+    return genai.protos.Content(role=role, parts=[genai.protos.Part(text=text)])
+
+
+class ConversationHistoryTests(SimpleTestCase):
+    def setUp(self):
+        self.db = use_fake_firestore(self)
+
+    def message_documents(self, conversation_id):
+        return [path for path in self.db.documents if path[:3] == ('conversations', conversation_id, 'messages')]
+
+    async def test_each_save_appends_only_the_new_messages(self):
+        history = [make_message('user', "Hi"), make_message('model', "Hello!")]
+        self.assertTrue(await firestore_service.save_conversation_history('c1', history))
+        history += [make_message('user', "Plan my week"), make_message('model', "Sure.")]
+        await firestore_service.save_conversation_history('c1', history)
+        # Saving the same history again is a no-op
+        await firestore_service.save_conversation_history('c1', history)
+
+        self.assertEqual(len(self.message_documents('c1')), 4)
+        self.assertEqual(self.db.documents[('conversations', 'c1')]['message_count'], 4)
+        self.assertNotIn('messages', self.db.documents[('conversations', 'c1')])
+        self.assertEqual(await firestore_service.get_conversation_history('c1'), history)
+
+    async def test_appended_messages_follow_the_stored_ones(self):
+        first_turn = [make_message('user', "Hi"), make_message('model', "Hello!")]
+        second_turn = [make_message('user', "Plan my week"), make_message('model', "Sure.")]
+        await firestore_service.append_conversation_messages('c1', first_turn)
+        await firestore_service.append_conversation_messages('c1', second_turn, expected_count=2)
+
+        self.assertEqual(len(self.message_documents('c1')), 4)
+        self.assertEqual(await firestore_service.get_conversation_history('c1'), first_turn + second_turn)
+
+    async def test_legacy_conversations_are_read_and_migrated_on_save(self):
+        legacy = [make_message('user', "Hi"), make_message('model', "Hello!")]
+        self.db.documents[('conversations', 'old')] = {
+            'messages': serialize_messages('old', legacy),
+        }
+        self.assertEqual(await firestore_service.get_conversation_history('old'), legacy)
+
+        history = legacy + [make_message('user', "Still there?")]
+        await firestore_service.save_conversation_history('old', history)
+
+        parent = self.db.documents[('conversations', 'old')]
+        self.assertEqual(parent['layout'], firestore_service.SEGMENTED_LAYOUT)
+        self.assertEqual(parent['message_count'], 3)
+        self.assertNotIn('messages', parent)
+        self.assertEqual(await firestore_service.get_conversation_history('old'), history)
+
+
+class ConversationHistoryCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ConversationHistoryCache(max_entries=2, ttl=30)
+        cache.put('a', ["m1"], 1)
+        cache.put('b', ["m1"], 1)
+        cache.get('a')
+        cache.put('c', ["m1"], 1)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+
+    def test_extend_only_applies_at_the_expected_count(self):
+        cache = ConversationHistoryCache(ttl=30)
+        cache.put('a', ["m1", "m2"], 2)
+
+        self.assertTrue(cache.extend('a', 2, ["m3"], 3))
+        self.assertEqual(cache.get('a').messages, ["m1", "m2", "m3"])
+        self.assertFalse(cache.extend('a', 2, ["m4"], 4))
+        self.assertIsNone(cache.get('a'))
+
+
+class CachedConversationHistoryTests(SimpleTestCase):
+    def setUp(self):
+        self.db = use_fake_firestore(self)
+        self.history = [make_message('user', "Hi"), make_message('model', "Hello!")]
+
+    async def test_fresh_entries_are_served_without_reading_firestore(self):
+        firestore_service.history_cache.ttl = 30
+        await firestore_service.save_conversation_history('c1', self.history)
+
+        with mock.patch.object(firestore_service, '_read_history_sync') as read_history, \
+                mock.patch.object(firestore_service, '_read_message_count_sync') as read_count:
+            self.assertEqual(await firestore_service.get_conversation_history('c1'), self.history)
+        read_history.assert_not_called()
+        read_count.assert_not_called()
+
+    async def test_stale_entries_are_revalidated_by_message_count(self):
+        firestore_service.history_cache.ttl = 0
+        await firestore_service.save_conversation_history('c1', self.history)
+
+        with mock.patch.object(firestore_service, '_read_history_sync') as read_history:
+            self.assertEqual(await firestore_service.get_conversation_history('c1'), self.history)
+        read_history.assert_not_called()
+        self.assertEqual(firestore_service.history_cache.stats()['revalidated'], 1)
+
+    async def test_appends_by_another_worker_are_picked_up(self):
+        firestore_service.history_cache.ttl = 0
+        await firestore_service.save_conversation_history('c1', self.history)
+        # Written straight to the store, as another process would
+        reply = [make_message('user', "Still there?")]
+        firestore_service._append_sync('c1', serialize_messages('c1', reply))
+
+        self.assertEqual(await firestore_service.get_conversation_history('c1'), self.history + reply)
+
+
+class LocalHistoryStoreTests(TestCase):
+    def setUp(self):
+        self.store = LocalHistoryStore()
+
+    async def test_turns_are_appended_in_order(self):
+        first_turn = [make_message('user', "Hi"), make_message('model', "Hello!")]
+        second_turn = [make_message('user', "Plan my week"), make_message('model', "Sure.")]
+        self.assertTrue(await self.store.append_conversation_messages('c1', first_turn))
+        self.assertTrue(await self.store.append_conversation_messages('c1', second_turn, expected_count=2))
+
+        self.assertEqual(await self.store.get_conversation_history('c1'), first_turn + second_turn)
+        self.assertEqual(await self.store.get_conversation_history('other'), [])
+
+    async def test_saving_a_full_history_writes_only_new_messages(self):
+        history = [make_message('user', "Hi"), make_message('model', "Hello!")]
+        await self.store.save_conversation_history('c1', history)
+        history.append(make_message('user', "Still there?"))
+        await self.store.save_conversation_history('c1', history)
+
+        self.assertEqual(await ConversationMessage.objects.filter(conversation_id='c1').acount(), 3)
+        self.assertEqual(await self.store.get_conversation_history('c1'), history)
+
+
+class HistoryStoreSelectionTests(SimpleTestCase):
+    def test_backend_comes_from_settings(self):
+        with self.settings(CONVERSATION_HISTORY_BACKEND='local'):
+            store = get_history_store()
+        self.assertIsInstance(store, LocalHistoryStore)
+        self.assertIs(get_history_store('local'), store)
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_history_store('redis')
+
+
+def make_turns(count, reply_length=10):
+    history = []
+    for turn in range(count):
+        history += [make_message('user', f"Question {turn}"), make_message('model', "x" * reply_length)]
+    return history
+
+
+class ContextWindowTests(SimpleTestCase):
+    def test_only_the_most_recent_turns_are_kept(self):
+        history = make_turns(5)
+        window = build_context_window(history, max_turns=2, token_budget=10_000)
+
+        self.assertEqual(window.start, 6)
+        self.assertEqual(window.messages, history[6:])
+        self.assertTrue(window.needs_summary)
+
+    def test_older_turns_are_dropped_to_fit_the_token_budget(self):
+        history = make_turns(4, reply_length=400) # ~100 tokens per reply
+        window = build_context_window(history, max_turns=10, token_budget=250)
+
+        self.assertEqual(window.start, 4)
+        self.assertLessEqual(window.tokens, 250)
+        self.assertTrue(window.needs_summary)
+
+    def test_the_latest_turn_is_kept_even_over_budget(self):
+        history = make_turns(2, reply_length=4000)
+        window = build_context_window(history, max_turns=10, token_budget=10)
+
+        self.assertEqual(window.messages, history[2:])
+
+    def test_tool_calls_stay_inside_their_turn(self):
+        history = make_turns(1) + [
+            make_message('user', "What did I log?"),
+            genai.protos.Content(role='model', parts=[genai.protos.Part(
+                function_call=genai.protos.FunctionCall(name='recall_memories', args={'query': 'log'}))]),
+            genai.protos.Content(role='user', parts=[genai.protos.Part(
+                function_response=genai.protos.FunctionResponse(name='recall_memories', response={'result': 'A run'}))]),
+            make_message('model', "You logged a run."),
+        ]
+        window = build_context_window(history, max_turns=1, token_budget=10_000)
+
+        self.assertEqual(window.messages, history[2:])
+
+    def test_summary_replaces_the_turns_it_covers(self):
+        history = make_turns(4)
+        window = build_context_window(history, summary="User is training for a 10k.", summarized_count=4,
+                                      max_turns=10, token_budget=10_000)
+
+        self.assertEqual(window.start, 4)
+        self.assertEqual(window.messages[0].parts[0].text, SUMMARY_PREFIX + "User is training for a 10k.")
+        self.assertEqual(window.messages[2:], history[4:])
+
+
+class ConversationSummarizerTests(SimpleTestCase):
+    def test_dropped_turns_are_folded_into_the_stored_summary(self):
+        history = make_turns(3)
+        window = build_context_window(history, max_turns=1, token_budget=10_000)
+        store = mock.Mock(save_conversation_summary=mock.AsyncMock(return_value=True))
+        model = mock.Mock()
+        model.generate_content.return_value.text = " Asked questions 0 and 1. "
+
+        with mock.patch.object(model_registry, '_models', {}), \
+                mock.patch.object(genai, 'GenerativeModel', return_value=model):
+            ConversationSummarizer()._refresh(store, 'c1', "", history[window.summarized_count:window.start], window.start)
+
+        self.assertIn("Question 1", model.generate_content.call_args.args[0])
+        store.save_conversation_summary.assert_awaited_once_with('c1', "Asked questions 0 and 1.", 4)
+
+    def test_one_refresh_per_conversation_at_a_time(self):
+        history = make_turns(3)
+        window = build_context_window(history, max_turns=1, token_budget=10_000)
+        summarizer = ConversationSummarizer()
+
+        with mock.patch.object(summarizer, '_executor') as executor:
+            self.assertTrue(summarizer.schedule(mock.Mock(), 'c1', history, window, ""))
+            self.assertFalse(summarizer.schedule(mock.Mock(), 'c1', history, window, ""))
+        executor.submit.assert_called_once()
+
+    def test_nothing_is_scheduled_while_the_window_covers_the_history(self):
+        history = make_turns(2)
+        window = build_context_window(history, max_turns=10, token_budget=10_000)
+
+        self.assertFalse(ConversationSummarizer().schedule(mock.Mock(), 'c1', history, window, ""))
+
+
+class ConversationSummaryStorageTests(TestCase):
+    async def test_local_store_keeps_one_summary_per_conversation(self):
+        store = LocalHistoryStore()
+        self.assertEqual(await store.get_conversation_summary('c1'), ("", 0))
+
+        await store.save_conversation_summary('c1', "Training for a 10k.", 4)
+        await store.save_conversation_summary('c1', "Training for a 10k, knee is sore.", 8)
+
+        self.assertEqual(await store.get_conversation_summary('c1'), ("Training for a 10k, knee is sore.", 8))
+
+    async def test_firestore_summary_is_kept_on_the_parent_document(self):
+        use_fake_firestore(self)
+        await firestore_service.save_conversation_history('c1', make_turns(2))
+        await firestore_service.save_conversation_summary('c1', "Asked two questions.", 4)
+
+        self.assertEqual(await firestore_service.get_conversation_summary('c1'), ("Asked two questions.", 4))
+
+
+class SystemInstructionTests(SimpleTestCase):
+    def test_legacy_preamble_is_stripped_from_user_turns(self):
+        legacy = make_message('user', "You are the Vision Assistant..." + LEGACY_PREAMBLE_MARKER + "How do I keep going?")
+        reply = make_message('model', "One step at a time.")
+
+        cleaned = strip_legacy_preamble([legacy, reply])
+
+        self.assertEqual(cleaned[0].parts[0].text, "How do I keep going?")
+        self.assertIs(cleaned[1], reply)
+
+    @mock.patch.object(LLMChatView, '_save_history', new_callable=mock.AsyncMock)
+    @mock.patch.object(LLMChatView, '_load_history', mock.AsyncMock(return_value=[]))
+    def test_chat_sends_the_raw_message_with_the_system_instruction(self, save_history):
+        model = mock.Mock()
+        chat = model.start_chat.return_value
+        chat.send_message.return_value = mock.Mock(text="One step at a time.")
+
+        with mock.patch.object(model_registry, '_models', {}), \
+                mock.patch.object(genai, 'GenerativeModel', return_value=model) as generative_model:
+            response = self.client.post(reverse('llm_chat'), {'message': "How do I keep going?"},
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], "One step at a time.")
+        self.assertEqual(generative_model.call_args.kwargs['system_instruction'], build_system_instruction())
+        chat.send_message.assert_called_once_with("How do I keep going?")
+        save_history.assert_awaited_once()
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(ModelRegistry, '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = ModelRegistry()
+
+    def test_each_configuration_is_built_once(self):
+        def recall(query: str) -> str:
+            return query
+
+        with mock.patch.object(genai, 'GenerativeModel', side_effect=lambda **kwargs: mock.Mock()) as generative_model:
+            first = self.registry.get_model('gemini-1.5-flash', tools=(recall,), system_instruction="Be kind.")
+            second = self.registry.get_model('gemini-1.5-flash', tools=(recall,), system_instruction="Be kind.")
+            other = self.registry.get_model('gemini-1.5-flash', tools=(recall,), system_instruction="Be brief.")
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(generative_model.call_count, 2)
+        self.assertEqual(self.registry.stats()['hits'], 1)
+
+    def test_generation_configs_are_compared_by_value(self):
+        with mock.patch.object(genai, 'GenerativeModel', side_effect=lambda **kwargs: mock.Mock()):
+            first = self.registry.get_model('gemini-1.5-flash', generation_config={'temperature': 0.2, 'top_p': 0.9})
+            second = self.registry.get_model('gemini-1.5-flash', generation_config={'top_p': 0.9, 'temperature': 0.2})
+
+        self.assertIs(first, second)
+        self.assertEqual(self.registry.stats()['models'], 1)
+
+
+class RecallCacheTests(SimpleTestCase):
+    def setUp(self):
+        for patcher in (mock.patch.object(tools, 'recall_cache', RecallCache()),
+                        mock.patch.object(chroma_service, 'query_memories')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.query_memories = chroma_service.query_memories
+        self.query_memories.return_value = [{'document': "Ran 5k in the park", 'distance': 0.12}]
+
+    def test_query_normalization(self):
+        self.assertEqual(normalize_query("  What did I   run?? "), "what did i run")
+
+    def test_repeated_queries_are_served_from_the_cache(self):
+        first = tools.recall_memories("What did I run?")
+        second = tools.recall_memories("what did I run")
+
+        self.assertEqual(first, second)
+        self.assertIn("Ran 5k in the park", first)
+        self.query_memories.assert_called_once()
+        self.assertEqual(tools.recall_cache.stats()['hits'], 1)
+
+    def test_memory_writes_invalidate_cached_results(self):
+        tools.recall_memories("What did I run?")
+        chroma_service.bump_generation()
+        tools.recall_memories("What did I run?")
+
+        self.assertEqual(self.query_memories.call_count, 2)
+
+    def test_writes_by_other_processes_invalidate_cached_results(self):
+        tools.recall_memories("What did I run?")
+        # What a worker or management command leaves behind when it writes memories
+        write_generation_stamp()
+        tools.recall_memories("What did I run?")
+
+        self.assertEqual(self.query_memories.call_count, 2)
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = RecallCache(ttl=60)
+        with mock.patch('time.monotonic', return_value=1000.0):
+            cache.set(('query',), "result")
+            self.assertEqual(cache.get(('query',)), "result")
+        with mock.patch('time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get(('query',)))
+
+    def test_empty_results_are_not_cached(self):
+        self.query_memories.return_value = []
+        tools.recall_memories("What did I run?")
+        tools.recall_memories("What did I run?")
+
+        self.assertEqual(self.query_memories.call_count, 2)
+
+    def test_metrics_report_cache_counters(self):
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hit_rate', response.json()['recall_cache'])
+        self.assertIn('embedding_cache', response.json())
+
+
+class SemanticResponseCacheTests(SimpleTestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        patcher = mock.patch.object(SemanticResponseCache, '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = SemanticResponseCache()
+        self.cache.threshold = 0.95
+        name = f"test_response_cache_{uuid.uuid4().hex[:12]}"
+        self.cache._collection = chroma_service.client.create_collection(name=name, metadata={'hnsw:space': 'cosine'})
+        self.addCleanup(chroma_service.client.delete_collection, name)
+
+    def test_near_duplicate_prompts_get_the_stored_answer(self):
+        self.cache.store("How do I stay motivated?", "Start small.", 'user-1', 'ctx')
+
+        self.assertEqual(self.cache.lookup("how do I stay motivated", 'user-1', 'ctx'), "Start small.")
+        self.assertIsNone(self.cache.lookup("What should I cook tonight?", 'user-1', 'ctx'))
+
+    def test_answers_do_not_cross_scopes_or_system_instructions(self):
+        self.cache.store("How do I stay motivated?", "Start small.", 'user-1', 'ctx')
+
+        self.assertIsNone(self.cache.lookup("How do I stay motivated?", 'user-2', 'ctx'))
+        self.assertIsNone(self.cache.lookup("How do I stay motivated?", 'user-1', 'other-ctx'))
+
+    def test_expired_entries_are_ignored(self):
+        self.cache.store("How do I stay motivated?", "Start small.", 'user-1', 'ctx')
+        self.cache.ttl = -60
+
+        self.assertIsNone(self.cache.lookup("How do I stay motivated?", 'user-1', 'ctx'))
+
+    def test_collection_is_trimmed_oldest_first(self):
+        self.cache.max_entries = 2
+        for prompt in ("First question", "Second question", "Third question"):
+            self.cache.store(prompt, "An answer.", 'user-1', 'ctx')
+
+        self.assertEqual(self.cache.collection.count(), 2)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_each_embedding_model_gets_its_own_collection(self):
+        gemini_cache = SemanticResponseCache.__new__(SemanticResponseCache)
+        gemini_cache._initialize()
+        name = gemini_cache.collection.name
+        self.addCleanup(chroma_service.client.delete_collection, name)
+        use_fake_embedding_provider(self)
+        fake_cache = SemanticResponseCache.__new__(SemanticResponseCache)
+        fake_cache._initialize()
+        fake_name = fake_cache.collection.name
+        self.addCleanup(chroma_service.client.delete_collection, fake_name)
+
+        self.assertTrue(name.startswith("vision_tracker_response_cache__gemini-"))
+        self.assertTrue(fake_name.startswith("vision_tracker_response_cache__fake-"))
+
+    async def test_async_calls_embed_off_the_chroma_executor(self):
+        threads = {'embed': [], 'query': []}
+        embed_content = genai.embed_content
+        embed_content.side_effect = lambda *args, **kwargs: (
+            threads['embed'].append(threading.current_thread().name) or fake_embed_content(*args, **kwargs)
+        )
+        query = self.cache._collection.query
+        self.cache._collection = mock.Mock(wraps=self.cache._collection)
+        self.cache._collection.query.side_effect = lambda *args, **kwargs: (
+            threads['query'].append(threading.current_thread().name) or query(*args, **kwargs)
+        )
+
+        await self.cache.astore("Which stretches help after cycling?", "Hip flexors.", 'user-1', 'ctx')
+        answer = await self.cache.alookup("which stretches help after cycling", 'user-1', 'ctx')
+
+        self.assertEqual(answer, "Hip flexors.")
+        self.assertTrue(threads['embed'] and all(name.startswith('gemini-backend') for name in threads['embed']))
+        self.assertTrue(threads['query'][0].startswith('chroma-backend'))
+
+
+@override_settings(CONVERSATION_HISTORY_BACKEND='local')
+@mock.patch.object(LLMChatView, '_load_history', mock.AsyncMock(return_value=[]))
+class SemanticResponseCacheViewTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(semantic_response_cache, 'enabled', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(semantic_response_cache, 'alookup', new_callable=mock.AsyncMock, return_value="Start small.")
+    def test_cache_hit_skips_the_model_and_records_the_turn(self, alookup):
+        with mock.patch.object(genai, 'GenerativeModel') as generative_model:
+            response = self.client.post(reverse('llm_chat'), {'message': "How do I stay motivated?"},
+                                        content_type='application/json')
+
+        self.assertEqual(response.json()['response'], "Start small.")
+        self.assertTrue(response.json()['cached'])
+        generative_model.assert_not_called()
+        self.assertEqual(ConversationMessage.objects.filter(conversation_id=response.json()['conversation_id']).count(), 2)
+
+    @mock.patch.object(semantic_response_cache, 'alookup', new_callable=mock.AsyncMock, return_value="Start small.")
+    def test_cache_hit_is_answered_even_if_the_turn_cannot_be_saved(self, alookup):
+        store = mock.Mock(append_conversation_messages=mock.AsyncMock(side_effect=RuntimeError("store down")))
+        with mock.patch.object(views, 'get_history_store', return_value=store), self.assertLogs(views.logger, 'ERROR'):
+            response = self.client.post(reverse('llm_chat'), {'message': "How do I stay motivated?"},
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['response'], "Start small.")
+
+    @mock.patch.object(semantic_response_cache, 'astore', new_callable=mock.AsyncMock)
+    @mock.patch.object(semantic_response_cache, 'alookup', new_callable=mock.AsyncMock)
+    @mock.patch.object(LLMChatView, '_save_history', new_callable=mock.AsyncMock)
+    def test_bypass_cache_skips_the_lookup_and_the_store(self, save_history, alookup, astore):
+        chat = mock.Mock(history=[])
+        chat.send_message.return_value = mock.Mock(text="Fresh answer.")
+        with mock.patch.object(LLMChatView, '_start_chat', return_value=chat):
+            response = self.client.post(reverse('llm_chat'), {'message': "Hi", 'bypass_cache': True},
+                                        content_type='application/json')
+
+        self.assertEqual(response.json()['response'], "Fresh answer.")
+        alookup.assert_not_called()
+        astore.assert_not_called()
+
+
+class KeywordIndexTests(TestCase):
+    def test_free_text_becomes_quoted_or_terms(self):
+        self.assertEqual(keyword_index.build_match_query('Nobu AND "sushi"'), '"Nobu" OR "AND" OR "sushi"')
+
+    def test_search_ranks_rows_and_applies_filters(self):
+        dinner = MemoryChunk.objects.create(text_content="Dinner with Aleksandr at Nobu", metadata={'category': 'social'})
+        MemoryChunk.objects.create(text_content="Lunch at Nobu again", metadata={'category': 'food'})
+        old = MemoryChunk.objects.create(text_content="First dinner at Nobu", metadata={'category': 'social'})
+        MemoryChunk.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+
+        self.assertEqual([hit['document'] for hit in keyword_index.search("Aleksandr", 5)], [dinner.text_content])
+        self.assertEqual(len(keyword_index.search("nobu", 5)), 3)
+        self.assertEqual(len(keyword_index.search("nobu", 5, category='social')), 2)
+        recent = keyword_index.search("nobu", 5, created_after=timezone.now() - timedelta(days=1))
+        self.assertNotIn(old.text_content, [hit['document'] for hit in recent])
+
+    def test_edits_and_deletes_keep_the_index_in_sync(self):
+        chunk = MemoryChunk.objects.create(text_content="Booked a table at Nobu")
+        chunk.text_content = "Booked a table at Zuma"
+        chunk.save()
+
+        self.assertEqual(keyword_index.search("Nobu", 5), [])
+        self.assertEqual(len(keyword_index.search("Zuma", 5)), 1)
+        chunk.delete()
+        self.assertEqual(keyword_index.search("Zuma", 5), [])
+
+
+class RankFusionTests(SimpleTestCase):
+    def test_hits_found_by_both_rankings_come_first(self):
+        vector_hits = [{'id': 'a', 'document': "A", 'metadata': {}, 'distance': 0.1},
+                       {'id': 'b', 'document': "B", 'metadata': {}, 'distance': 0.2}]
+        keyword_hits = [{'id': 'b', 'document': "B", 'metadata': {}, 'bm25': -3.0},
+                        {'id': 'c', 'document': "C", 'metadata': {}, 'bm25': -1.0}]
+
+        fused = ChromaService.fuse_results([vector_hits, keyword_hits], 3)
+
+        self.assertEqual([hit['id'] for hit in fused], ['b', 'a', 'c'])
+        self.assertEqual(fused[0]['distance'], 0.2)
+        self.assertIsNone(fused[2]['distance'])
+
+    def test_filters_combine_into_one_where_clause(self):
+        after = timezone.now() - timedelta(days=7)
+
+        self.assertIsNone(ChromaService.build_where())
+        self.assertEqual(ChromaService.build_where(category='health'), {'category': 'health'})
+        self.assertEqual(ChromaService.build_where(created_after=after, category='health'), {'$and': [
+            {'created_at': {'$gte': int(after.timestamp())}}, {'category': 'health'},
+        ]})
+
+
+class HybridSearchTests(TestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        use_temporary_collection(self)
+
+    def test_keyword_search_finds_memories_the_vector_search_misses(self):
+        indexed = MemoryChunk.objects.create(text_content="Went running by the river")
+        index_memory_chunks([indexed.pk])
+        # Not in the vector store, e.g. still waiting for its embedding
+        MemoryChunk.objects.create(text_content="Coffee with Aleksandr")
+
+        results = {hit['document']: hit for hit in chroma_service.query_memories("Aleksandr", n_results=5)}
+        self.assertIn("Coffee with Aleksandr", results)
+        self.assertIsNone(results["Coffee with Aleksandr"]['distance'])
+        self.assertGreater(results["Coffee with Aleksandr"]['score'], 0)
+
+        with self.settings(MEMORY_HYBRID_SEARCH=False):
+            vector_only = chroma_service.query_memories("Aleksandr", n_results=5)
+        self.assertNotIn("Coffee with Aleksandr", [hit['document'] for hit in vector_only])
+
+    def test_date_filters_apply_to_both_searches(self):
+        old = MemoryChunk.objects.create(text_content="Ran a marathon")
+        MemoryChunk.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        recent = MemoryChunk.objects.create(text_content="Ran a half marathon")
+        index_memory_chunks([old.pk, recent.pk])
+
+        results = chroma_service.query_memories("marathon", n_results=5, created_after=timezone.now() - timedelta(days=1))
+
+        self.assertEqual([hit['document'] for hit in results], ["Ran a half marathon"])
+
+
+class RecallFilterTests(SimpleTestCase):
+    @mock.patch.object(tools, 'recall_cache', RecallCache())
+    @mock.patch.object(chroma_service, 'query_memories', return_value=[{'document': "Ran 5k", 'distance': 0.1}])
+    def test_iso_dates_from_the_model_become_an_inclusive_range(self, query_memories):
+        tools.recall_memories("running", created_after="2026-03-01", created_before="2026-03-31", category="health")
+
+        kwargs = query_memories.call_args.kwargs
+        self.assertEqual(kwargs['created_after'], timezone.make_aware(datetime(2026, 3, 1)))
+        self.assertEqual(kwargs['created_before'].date().isoformat(), "2026-03-31")
+        self.assertEqual((kwargs['created_before'].hour, kwargs['created_before'].minute), (23, 59))
+        self.assertEqual(kwargs['category'], "health")
+
+    def test_datetimes_are_kept_as_given(self):
+        self.assertEqual(tools._parse_date_filter("2026-03-31T10:30", end_of_day=True),
+                         timezone.make_aware(datetime(2026, 3, 31, 10, 30)))
+
+    def test_invalid_dates_are_reported_to_the_model(self):
+        with self.assertLogs('vision_tracker_api.tools', 'ERROR'):
+            result = tools.recall_memories("running", created_after="last spring")
+        self.assertIn("not an ISO date", result)
+
+
+class MaximalMarginalRelevanceTests(SimpleTestCase):
+    def test_near_duplicates_give_way_to_diverse_candidates(self):
+        embeddings = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]]
+        relevance = [1.0, 0.95, 0.6]
+
+        self.assertEqual(mmr_rerank(embeddings, relevance, 2, lambda_mult=1.0), [0, 1])
+        self.assertEqual(mmr_rerank(embeddings, relevance, 2, lambda_mult=0.5), [0, 2])
+
+    def test_zero_embeddings_are_similar_to_nothing(self):
+        self.assertEqual(mmr_rerank([[1.0, 0.0], [1.0, 0.0], [0.0, 0.0]], [1.0, 0.9, 0.5], 3, 0.5), [0, 2, 1])
+
+    def test_k_is_capped_by_the_candidates(self):
+        self.assertEqual(mmr_rerank([[1.0, 0.0]], [1.0], 5), [0])
+        self.assertEqual(mmr_rerank([], [], 5), [])
+
+    def test_keyword_only_hits_get_their_stored_embeddings(self):
+        collection = use_temporary_collection(self)
+        collection.add(ids=['keyword-hit'], embeddings=[[0.0, 1.0]], documents=["Coffee with Aleksandr"])
+        hits = [
+            {'id': 'a', 'score': 1.0, 'embedding': [1.0, 0.0]},
+            {'id': 'b', 'score': 0.9, 'embedding': [1.0, 0.0]},
+            {'id': 'keyword-hit', 'score': 0.6, 'embedding': None},
+        ]
+
+        with self.settings(MEMORY_MMR_LAMBDA=0.5):
+            diversified = chroma_service.diversify(hits, 2)
+
+        self.assertEqual([hit['id'] for hit in diversified], ['a', 'keyword-hit'])
+
+
+class MultiQueryRecallTests(TestCase):
+    def setUp(self):
+        self.embed_content = use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+        chunks = [MemoryChunk.objects.create(text_content=text) for text in (
+            "Ran 10k along the river", "Cooked lasagne for the family", "Asked my manager about a promotion",
+        )]
+        index_memory_chunks([chunk.pk for chunk in chunks])
+        self.embed_content.reset_mock()
+
+    def test_all_queries_are_embedded_and_searched_together(self):
+        with mock.patch.object(self.collection, 'query', wraps=self.collection.query) as query:
+            results = chroma_service.query_memories(["river run", "family lasagne"], n_results=1)
+
+        documents = [hit['document'] for hit in results]
+        self.assertIn("Ran 10k along the river", documents)
+        self.assertIn("Cooked lasagne for the family", documents)
+        self.assertLessEqual(len(results), 2)
+        self.embed_content.assert_called_once()
+        query.assert_called_once()
+        self.assertEqual(len(query.call_args.kwargs['query_embeddings']), 2)
+
+    def test_duplicate_and_blank_queries_are_dropped(self):
+        with mock.patch.object(chroma_service, '_vector_search', return_value=[]) as vector_search:
+            chroma_service.query_memories(["promotion", " promotion ", ""], n_results=1)
+
+        self.assertEqual(vector_search.call_args.args[1], ["promotion"])
+
+
+class MultiQueryFusionTests(SimpleTestCase):
+    def test_shared_hits_keep_their_smallest_distance(self):
+        first = [{'id': 'a', 'document': "A", 'metadata': {}, 'distance': 0.4}]
+        second = [{'id': 'a', 'document': "A", 'metadata': {}, 'distance': 0.1}]
+        keyword = [{'id': 'a', 'document': "A", 'metadata': {}, 'bm25': -2.0}]
+
+        fused = ChromaService.fuse_results([first, second, keyword], 5)
+
+        self.assertEqual(len(fused), 1)
+        self.assertEqual(fused[0]['distance'], 0.1)
+
+    @mock.patch.object(tools, 'recall_cache', RecallCache())
+    @mock.patch.object(chroma_service, 'query_memories', return_value=[{'document': "Ran 10k", 'distance': 0.1}])
+    def test_the_tool_passes_every_angle_in_one_call(self, query_memories):
+        tools.recall_memories(["career", "health"], n_results=3)
+
+        query_memories.assert_called_once()
+        self.assertEqual(query_memories.call_args.args[:2], (["career", "health"], 3))
+
+
+request_label = contextvars.ContextVar('request_label', default=None)
+
+
+class BackendExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = BackendExecutor('test', max_workers=2)
+        self.addCleanup(self.executor._executor.shutdown)
+
+    def test_concurrency_is_bounded_by_the_worker_count(self):
+        lock, running, peak = threading.Lock(), [0], [0]
+
+        def blocking_call():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        futures = [self.executor.submit(blocking_call) for _ in range(6)]
+        for future in futures:
+            future.result()
+
+        self.assertEqual(peak[0], 2)
+        stats = self.executor.stats()
+        self.assertEqual((stats['calls'], stats['queued'], stats['in_flight']), (6, 0, 0))
+        self.assertGreater(stats['queue_wait_ms_max'], 0)
+
+    def test_calls_see_the_callers_context_and_errors_are_counted(self):
+        request_label.set('request-1')
+        self.assertEqual(self.executor.submit(request_label.get).result(), 'request-1')
+
+        with self.assertRaises(ZeroDivisionError):
+            self.executor.submit(lambda: 1 / 0).result()
+        self.assertEqual(self.executor.stats()['errors'], 1)
+
+    async def test_run_awaits_the_result(self):
+        self.assertEqual(await self.executor.run(sum, [1, 2, 3]), 6)
+
+
+class SharedExecutorTests(SimpleTestCase):
+    def test_one_executor_per_backend(self):
+        self.assertIs(get_executor('chroma'), get_executor('chroma'))
+        with self.assertRaises(ValueError):
+            get_executor('redis')
+
+    async def test_run_on_uses_the_named_backend(self):
+        thread_name = await run_on('gemini', lambda: threading.current_thread().name)
+        self.assertTrue(thread_name.startswith('gemini-backend'))
+
+    def test_metrics_report_executor_stats(self):
+        get_executor('chroma')
+        response = self.client.get(reverse('metrics'))
+        self.assertIn('max_workers', response.json()['executors']['chroma'])
+
+
+@override_settings(MEMORY_HYBRID_SEARCH=False)
+class AsyncMemoryServiceTests(SimpleTestCase):
+    async def test_embedding_and_search_run_on_their_own_executors(self):
+        embed_content = use_fake_embeddings(self)
+        threads = []
+        embed_content.side_effect = lambda *args, **kwargs: (
+            threads.append(threading.current_thread().name) or fake_embed_content(*args, **kwargs)
+        )
+        use_temporary_collection(self)
+
+        await chroma_service.aadd_memories([
+            {'id': 'swim', 'document': "Swam twelve lengths at the lido", 'metadata': {'category': 'health'}},
+            {'id': 'bake', 'document': "Baked sourdough with rye flour", 'metadata': {'category': 'food'}},
+        ])
+        results = await chroma_service.aquery_memories("lido swim lengths", n_results=1)
+
+        self.assertEqual([hit['id'] for hit in results], ['swim'])
+        self.assertTrue(threads and all(name.startswith('gemini-backend') for name in threads))
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """A local provider with its own model name and dimensions, built on bag_of_words_vector."""
+    name = 'fake'
+    model_name = "fake/bag-of-words-32"
+    executor = LOCAL_EMBEDDING
+    batch_size = 2
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name or self.model_name
+        self.calls = []
+
+    def embed(self, texts, task_type="retrieval_document"):
+        self.calls.append(list(texts))
+        return [bag_of_words_vector(text, dimensions=32) for text in texts]
+
+
+def use_fake_embedding_provider(testcase):
+    """Registers FakeEmbeddingProvider and makes it the configured provider until the test ends."""
+    for patcher in (mock.patch.dict(EMBEDDING_PROVIDERS, {FakeEmbeddingProvider.name: FakeEmbeddingProvider}),
+                    mock.patch.dict(embedding_providers._providers)):
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+    provider_setting = override_settings(EMBEDDING_PROVIDER=FakeEmbeddingProvider.name)
+    provider_setting.enable()
+    testcase.addCleanup(provider_setting.disable)
+    return get_embedding_provider()
+
+
+class EmbeddingProviderTests(SimpleTestCase):
+    def test_provider_comes_from_settings(self):
+        self.assertIsInstance(get_embedding_provider(), GeminiEmbeddingProvider)
+        self.assertIs(get_embedding_provider('gemini'), get_embedding_provider())
+        with self.assertRaises(ValueError):
+            get_embedding_provider('word2vec')
+
+    def test_embeddings_are_batched_and_cached_per_model(self):
+        use_fake_embeddings(self)
+        generate_embeddings(["Ran 10k", "Cooked lasagne"])
+        provider = use_fake_embedding_provider(self)
+
+        embeddings = generate_embeddings(["Ran 10k", "Cooked lasagne", "Read a book"])
+
+        # The texts Gemini embedded are not reused for a different model
+        self.assertEqual(provider.calls, [["Ran 10k", "Cooked lasagne"], ["Read a book"]])
+        self.assertEqual({len(embedding) for embedding in embeddings}, {32})
+
+    async def test_async_calls_run_on_the_providers_executor(self):
+        use_fake_embedding_provider(self)
+        threads = []
+        with mock.patch.object(FakeEmbeddingProvider, 'embed', autospec=True, side_effect=lambda self, texts, task_type: (
+            threads.append(threading.current_thread().name) or [[1.0, 0.0]] * len(texts)
+        )):
+            self.assertEqual(await agenerate_embedding("Meditated for ten minutes"), [1.0, 0.0])
+
+        self.assertTrue(threads[0].startswith(f"{LOCAL_EMBEDDING}-backend"))
+
+
+class FlatVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='flat_vector_store_')
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.rng = np.random.default_rng(0)
+
+    def open_collection(self, dtype='float16', metadata=None, compact_ratio=0.25):
+        return FlatVectorStore(self.path, dtype=dtype, compact_ratio=compact_ratio).get_or_create_collection(
+            'memories', metadata=metadata
+        )
+
+    def add_rows(self, collection, count, dimensions=16):
+        vectors = self.rng.standard_normal((count, dimensions)).astype(np.float32)
+        collection.add(
+            ids=[f"m{i}" for i in range(count)], embeddings=vectors.tolist(),
+            documents=[f"Memory {i}" for i in range(count)],
+            metadatas=[{'created_at': i, 'category': 'even' if i % 2 == 0 else 'odd'} for i in range(count)],
+        )
+        return vectors
+
+    def test_queries_return_the_exact_nearest_rows(self):
+        collection = self.open_collection()
+        vectors = self.add_rows(collection, 50)
+        query = vectors[7] + 0.01
+
+        result = collection.query(query_embeddings=[query.tolist()], n_results=3)
+
+        expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:3]
+        self.assertEqual(result['ids'][0], [f"m{i}" for i in expected])
+        self.assertEqual(result['documents'][0][0], "Memory 7")
+        self.assertAlmostEqual(result['distances'][0][0], float(((vectors[7] - query) ** 2).sum()), places=2)
+
+    def test_cosine_space_and_int8_storage(self):
+        collection = self.open_collection(dtype='int8', metadata={'hnsw:space': 'cosine'})
+        vectors = self.add_rows(collection, 20)
+
+        result = collection.query(query_embeddings=[(vectors[3] * 5).tolist()], n_results=1, include=['distances'])
+
+        self.assertEqual(result['ids'][0], ['m3'])
+        self.assertLess(result['distances'][0][0], 0.01)
+        self.assertIsNone(result['documents'])
+
+    def test_where_filters_follow_chroma_semantics(self):
+        metadata = {'created_at': 5, 'category': 'health'}
+        self.assertTrue(matches_where(metadata, {'$and': [{'created_at': {'$gte': 5}}, {'category': 'health'}]}))
+        self.assertTrue(matches_where(metadata, {'$or': [{'category': 'food'}, {'created_at': {'$lt': 6}}]}))
+        self.assertFalse(matches_where(metadata, {'category': {'$nin': ['health']}}))
+        self.assertFalse(matches_where({}, {'created_at': {'$gt': 1}}))
+
+        collection = self.open_collection()
+        self.add_rows(collection, 10)
+        result = collection.query(query_embeddings=[[0.0] * 16], n_results=10, where={'category': 'even'})
+        self.assertEqual(sorted(result['ids'][0]), ['m0', 'm2', 'm4', 'm6', 'm8'])
+
+    def test_upserts_and_deletes_survive_a_reopen(self):
+        collection = self.open_collection(compact_ratio=1.0)
+        self.add_rows(collection, 4)
+        collection.upsert(ids=['m1'], embeddings=[[1.0] * 16], documents=["Rewritten"], metadatas=[{'category': 'new'}])
+        collection.delete(ids=['m2'])
+
+        reopened = self.open_collection()
+        stored = reopened.get(ids=['m1', 'm2'])
+        self.assertEqual(reopened.count(), 3)
+        self.assertEqual((stored['ids'], stored['documents']), (['m1'], ["Rewritten"]))
+
+    def test_delete_needs_ids_or_a_filter(self):
+        collection = self.open_collection()
+        self.add_rows(collection, 3)
+
+        with self.assertRaises(ValueError):
+            collection.delete()
+        with self.assertRaises(ValueError):
+            collection.delete(where={})
+        self.assertEqual(collection.count(), 3)
+
+    def test_dead_rows_are_compacted_into_a_new_generation(self):
+        collection = self.open_collection(compact_ratio=0.25)
+        vectors = self.add_rows(collection, 8)
+        collection.delete(where={'category': 'odd'})
+
+        self.assertEqual(collection._meta['generation'], 1)
+        self.assertEqual(collection.count(), 4)
+        result = collection.query(query_embeddings=[vectors[4].tolist()], n_results=1)
+        self.assertEqual(result['ids'][0], ['m4'])
+        self.assertEqual(self.open_collection().count(), 4)
+
+    def test_backend_comes_from_settings(self):
+        with self.settings(FLAT_VECTOR_STORE_PATH=self.path):
+            self.assertIsInstance(open_vector_store('flat'), FlatVectorStore)
+        with self.assertRaises(ValueError):
+            open_vector_store('faiss')
+
+
+class FlatBackendServiceTests(TestCase):
+    def test_memories_are_indexed_and_recalled_through_the_flat_store(self):
+        use_fake_embeddings(self)
+        path = tempfile.mkdtemp(prefix='flat_vector_store_')
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        collection = FlatVectorStore(path).get_or_create_collection('memories')
+        chunks = [MemoryChunk.objects.create(text_content=text, metadata={'category': 'journal'}) for text in (
+            "Ran 10k along the river", "Cooked lasagne for the family", "Asked my manager about a promotion",
+        )]
+
+        with mock.patch.object(chroma_service, '_collection', collection):
+            index_memory_chunks([chunk.pk for chunk in chunks])
+            results = chroma_service.query_memories("family lasagne", n_results=1)
+
+        self.assertEqual(collection.count(), 3)
+        self.assertEqual([hit['document'] for hit in results], ["Cooked lasagne for the family"])
+
+
+class HnswSettingsTests(SimpleTestCase):
+    def test_metadata_comes_from_settings(self):
+        with self.settings(CHROMA_HNSW_SPACE='cosine', CHROMA_HNSW_M=32):
+            metadata = hnsw_metadata()
+        self.assertEqual(metadata['hnsw:space'], 'cosine')
+        self.assertEqual(metadata['hnsw:M'], 32)
+        self.assertEqual(metadata['hnsw:search_ef'], 10)
+
+
+class TuneVectorIndexTests(TestCase):
+    def setUp(self):
+        self.name = f"test_memories_{uuid.uuid4().hex[:12]}"
+        collection = chroma_service.client.create_collection(name=self.name)
+        self.addCleanup(self.drop_collections)
+        vectors = np.random.default_rng(0).standard_normal((30, 8)).astype(np.float32)
+        collection.add(ids=[f"m{i}" for i in range(30)], embeddings=vectors.tolist(),
+                       documents=[f"Memory {i}" for i in range(30)])
+        path = tempfile.mkdtemp(prefix='tune_')
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        aliases = override_settings(COLLECTION_ALIASES_PATH=os.path.join(path, 'aliases.json'),
+                                    MEMORY_ALIAS_REFRESH_SECONDS=0)
+        aliases.enable()
+        self.addCleanup(aliases.disable)
+        for attribute in ('_collection', 'embedder', '_alias_checked_at'):
+            patcher = mock.patch.object(chroma_service, attribute, getattr(chroma_service, attribute))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(chroma_service, 'collection_name', self.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def drop_collections(self):
+        for collection in chroma_service.client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith(self.name) or name.startswith(f"{chroma_service.alias}__v"):
+                chroma_service.client.delete_collection(name)
+
+    def collection_names(self):
+        return sorted(getattr(c, 'name', c) for c in chroma_service.client.list_collections()
+                      if getattr(c, 'name', c).startswith(self.name))
+
+    def test_reports_each_combination_and_leaves_the_live_collection(self):
+        out = io.StringIO()
+        call_command('tune_vector_index', '--m', '8', '16', '--queries', '10', '--k', '5', stdout=out)
+
+        rows = [line for line in out.getvalue().splitlines() if line.startswith('l2 ')]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(self.collection_names(), [self.name])
+
+    def test_apply_switches_the_alias_to_a_rebuilt_collection(self):
+        call_command('tune_vector_index', '--space', 'cosine', '--queries', '5', '--apply', stdout=io.StringIO())
+
+        target = read_alias(chroma_service.alias)['collection']
+        rebuilt = chroma_service.client.get_collection(target)
+        self.assertEqual(rebuilt.metadata['hnsw:space'], 'cosine')
+        self.assertEqual(rebuilt.count(), 30)
+        # The old collection is kept
+        self.assertEqual(chroma_service.client.get_collection(self.name).count(), 30)
+
+    def test_apply_needs_a_single_combination(self):
+        with self.assertRaises(CommandError):
+            call_command('tune_vector_index', '--m', '8', '16', '--apply', stdout=io.StringIO())
+
+
+class CollectionCacheTests(SimpleTestCase):
+    def test_least_recently_used_handles_are_evicted(self):
+        client = mock.Mock()
+        cache = CollectionCache(client, max_size=2)
+        cache.get('a')
+        cache.get('b')
+        cache.get('a')
+        cache.get('c')
+
+        self.assertEqual(cache.stats(), {'open': 2, 'max_size': 2, 'hits': 1, 'misses': 3, 'evictions': 1})
+        cache.get('b')
+        self.assertEqual(client.get_or_create_collection.call_count, 4)
+
+    def test_reads_do_not_create_missing_collections(self):
+        client = mock.Mock()
+        client.get_collection.side_effect = ValueError("Collection does not exist")
+        self.assertIsNone(CollectionCache(client).get('missing', create=False))
+        client.get_or_create_collection.assert_not_called()
+
+    def test_shard_names_are_safe_and_bounded(self):
+        self.assertEqual(shard_collection_name('memories', 'user-7'), 'memories__user-7')
+        unsafe = shard_collection_name('memories', 'someone@example.com')
+        self.assertRegex(unsafe, r'^memories__someone-example-com-[0-9a-f]{12}$')
+        self.assertLessEqual(len(shard_collection_name('vision_tracker_memories', 'x' * 200)), 63)
+
+
+@override_settings(MEMORY_SHARDING_ENABLED=True)
+class TenantShardingTests(TestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        base_name = f"test_memories_{uuid.uuid4().hex[:8]}"
+        for patcher in (
+            mock.patch.object(chroma_service, 'collection_name', base_name),
+            mock.patch.object(chroma_service, 'shards', CollectionCache(chroma_service.client)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.drop_shards, base_name)
+
+    @staticmethod
+    def drop_shards(base_name):
+        for collection in chroma_service.client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith(base_name):
+                chroma_service.client.delete_collection(name)
+
+    def test_each_tenant_only_recalls_their_own_memories(self):
+        chunks = [
+            MemoryChunk.objects.create(text_content="Ran 10k along the river", tenant_id='user-1'),
+            MemoryChunk.objects.create(text_content="Ran a marathon along the coast", tenant_id='user-2'),
+        ]
+        index_memory_chunks([chunk.pk for chunk in chunks])
+
+        with use_tenant('user-1'):
+            own = chroma_service.query_memories("ran along the river", n_results=5)
+        other = chroma_service.query_memories("ran along the river", n_results=5, tenant='user-2')
+
+        self.assertEqual([hit['document'] for hit in own], ["Ran 10k along the river"])
+        self.assertEqual([hit['document'] for hit in other], ["Ran a marathon along the coast"])
+
+    def test_a_tenant_without_a_shard_gets_no_results_and_no_shard(self):
+        self.assertEqual(chroma_service.query_memories("anything", tenant='user-9'), [])
+        self.assertIsNone(chroma_service.collection_for('user-9', create=False))
+
+
+class ContentHashTests(SimpleTestCase):
+    def test_case_and_whitespace_do_not_change_the_hash(self):
+        self.assertEqual(content_hash("  Ran 10k\nalong the river "), content_hash("ran 10k along   the RIVER"))
+        self.assertNotEqual(content_hash("Ran 10k"), content_hash("Ran 5k"))
+
+    def test_distances_are_converted_per_space(self):
+        self.assertAlmostEqual(distance_to_similarity(0.06, 'l2'), 0.97)
+        self.assertAlmostEqual(distance_to_similarity(0.03, 'cosine'), 0.97)
+
+
+class MemoryDeduplicationTests(TestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+
+    def index(self, *texts, tenant_id=''):
+        chunks = [MemoryChunk.objects.create(text_content=text, tenant_id=tenant_id) for text in texts]
+        return chunks, index_memory_chunks([chunk.pk for chunk in chunks])
+
+    def test_exact_copies_are_linked_and_not_indexed(self):
+        (original,), _ = self.index("Ran 10k along the river")
+        (copy,), result = self.index("ran 10k  along the River")
+
+        copy.refresh_from_db()
+        self.assertEqual(result['duplicates'], {copy.pk: original.pk})
+        self.assertEqual((copy.index_status, copy.duplicate_of_id), (MemoryChunk.INDEX_DUPLICATE, original.pk))
+        self.assertEqual(self.collection.count(), 1)
+
+    def test_the_oldest_of_identical_rows_in_one_batch_is_kept(self):
+        (first, second), result = self.index("Cooked lasagne", "Cooked lasagne")
+
+        self.assertEqual(result['duplicates'], {second.pk: first.pk})
+        self.assertEqual(result['added'], [f"memchunk-{first.pk}"])
+
+    def test_near_copies_are_merged_into_the_original_in_merge_mode(self):
+        (original,), _ = self.index("Ran 10k along the river this morning")
+        with mock.patch.object(memory_deduplicator, 'mode', DEDUP_MERGE):
+            (copy,), result = self.index("Ran 10k along the river, this morning!")
+
+        original.refresh_from_db()
+        self.assertEqual(result['duplicates'], {copy.pk: original.pk})
+        self.assertEqual(original.text_content, "Ran 10k along the river, this morning!")
+        self.assertEqual(self.collection.count(), 1)
+
+    def test_different_memories_are_both_indexed(self):
+        _, result = self.index("Ran 10k along the river", "Asked my manager about a promotion")
+
+        self.assertEqual(result['duplicates'], {})
+        self.assertEqual(self.collection.count(), 2)
+
+    def test_another_tenants_near_copy_is_neither_linked_nor_merged(self):
+        # Both tenants share one collection (sharding is off), so only the tenant filter separates them
+        (theirs,), _ = self.index("Ran 10k along the river this morning", tenant_id='user-1')
+        with mock.patch.object(memory_deduplicator, 'mode', DEDUP_MERGE):
+            (mine,), result = self.index("Ran 10k along the river, this morning!", tenant_id='user-2')
+
+        theirs.refresh_from_db()
+        mine.refresh_from_db()
+        self.assertEqual(result['duplicates'], {})
+        self.assertEqual((mine.index_status, mine.duplicate_of_id), (MemoryChunk.INDEX_INDEXED, None))
+        self.assertEqual(theirs.text_content, "Ran 10k along the river this morning")
+        self.assertEqual(self.collection.count(), 2)
+
+
+LONG_ENTRY = " ".join(
+    f"Day {day}: walked the dog, answered email and read a chapter before bed." for day in range(1, 30)
+) + " On the last day I finally booked the dentist appointment I had been putting off."
+
+
+class ChunkerTests(SimpleTestCase):
+    def test_short_text_is_one_span(self):
+        self.assertEqual(split_text("Ran 10k", max_tokens=16), [(0, 7)])
+
+    def test_long_text_is_split_into_overlapping_bounded_spans(self):
+        spans = split_text(LONG_ENTRY, max_tokens=64, overlap_tokens=8)
+
+        self.assertGreater(len(spans), 1)
+        self.assertEqual((spans[0][0], spans[-1][1]), (0, len(LONG_ENTRY)))
+        for (_, previous_end), (start, end) in zip(spans, spans[1:]):
+            self.assertLess(start, previous_end)
+            self.assertLessEqual(end - start, 64 * 4)
+        # Cuts prefer sentence ends
+        self.assertTrue(LONG_ENTRY[:spans[0][1]].rstrip().endswith('.'))
+
+    def test_hits_collapse_to_the_best_one_per_parent(self):
+        hits = [
+            {'id': 'memchunk-1', 'metadata': {'parent_id': 'memchunk-1'}, 'distance': None, 'score': 0.03},
+            {'id': 'memchunk-1#c2', 'metadata': {'parent_id': 'memchunk-1'}, 'distance': 0.4, 'score': 0.02},
+            {'id': 'memchunk-2', 'metadata': {}, 'distance': 0.5, 'score': 0.01},
+        ]
+
+        collapsed = chroma_service.collapse_by_parent(hits)
+
+        self.assertEqual([hit['id'] for hit in collapsed], ['memchunk-1', 'memchunk-2'])
+        self.assertEqual((collapsed[0]['distance'], collapsed[0]['score']), (0.4, 0.03))
+
+
+@override_settings(MEMORY_CHUNK_MAX_TOKENS=64, MEMORY_CHUNK_OVERLAP_TOKENS=8, MEMORY_CHUNK_CONTEXT_TOKENS=8,
+                   MEMORY_HYBRID_SEARCH=False, MEMORY_MMR_ENABLED=False)
+class ChunkedMemoryTests(TestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+
+    def test_long_memories_are_recalled_once_with_the_matching_span(self):
+        chunk = MemoryChunk.objects.create(text_content=LONG_ENTRY)
+        index_memory_chunks([chunk.pk])
+        pieces = self.collection.count()
+
+        results = chroma_service.query_memories("booked the dentist appointment", n_results=5)
+
+        self.assertGreater(pieces, 1)
+        self.assertEqual([hit['id'] for hit in results], [f"memchunk-{chunk.pk}"])
+        self.assertIn("dentist appointment", results[0]['document'])
+        self.assertLess(len(results[0]['document']), len(LONG_ENTRY))
+
+    def test_reindexing_a_shortened_memory_drops_its_old_pieces(self):
+        chunk = MemoryChunk.objects.create(text_content=LONG_ENTRY)
+        index_memory_chunks([chunk.pk])
+        chunk.refresh_from_db()
+        chunk.text_content = "Booked the dentist."
+        chunk.save()
+        index_memory_chunks([chunk.pk])
+
+        self.assertEqual(self.collection.get(include=[])['ids'], [f"memchunk-{chunk.pk}"])
+
+
+class ReembedMemoriesTests(TestCase):
+    def setUp(self):
+        use_fake_embeddings(self)
+        use_fake_embedding_provider(self)
+        # The provider instance the command and the switched service use for the collection's model
+        self.provider = get_embedding_provider('fake', FakeEmbeddingProvider.model_name)
+        self.path = tempfile.mkdtemp(prefix='reembed_')
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+        self.checkpoint = os.path.join(self.path, 'checkpoint.json')
+        aliases = override_settings(COLLECTION_ALIASES_PATH=os.path.join(self.path, 'aliases.json'),
+                                    MEMORY_ALIAS_REFRESH_SECONDS=0)
+        aliases.enable()
+        self.addCleanup(aliases.disable)
+        # The switch re-points the service at the rebuilt collection; put it back afterwards
+        for attribute in ('collection_name', '_collection', 'embedder', '_alias_checked_at'):
+            patcher = mock.patch.object(chroma_service, attribute, getattr(chroma_service, attribute))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.drop_rebuilt_collections)
+
+    @staticmethod
+    def drop_rebuilt_collections():
+        for collection in chroma_service.client.list_collections():
+            name = getattr(collection, 'name', collection)
+            if name.startswith(f"{chroma_service.alias}__v"):
+                chroma_service.client.delete_collection(name)
+
+    def reembed(self, *args):
+        out = io.StringIO()
+        call_command('reembed_memories', '--provider', 'fake', '--requests-per-minute', '0', '--workers', '1',
+                     '--checkpoint', self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_memories_are_rebuilt_with_the_new_model_and_the_alias_switched(self):
+        for text in ("Planted tomatoes on the balcony", "Fixed the bike's rear brake", "Called grandma"):
+            MemoryChunk.objects.create(text_content=text)
+
+        self.reembed()
+
+        record = read_alias(chroma_service.alias)
+        self.assertTrue(record['collection'].startswith(f"{chroma_service.alias}__v"))
+        self.assertEqual(record['embedding_model'], "fake/bag-of-words-32")
+        stored = chroma_service.client.get_collection(record['collection']).get(include=['metadatas'])
+        self.assertEqual(len(stored['ids']), 3)
+        self.assertEqual({metadata['embedding_model'] for metadata in stored['metadatas']}, {"fake/bag-of-words-32"})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        # The service follows the alias and embeds queries with the collection's model
+        results = chroma_service.query_memories("tomatoes balcony", n_results=1)
+        self.assertEqual(chroma_service.collection_name, record['collection'])
+        self.assertIs(chroma_service.embedder, self.provider)
+        self.assertEqual([hit['document'] for hit in results], ["Planted tomatoes on the balcony"])
+
+    @override_settings(MEMORY_CHUNK_MAX_TOKENS=8, MEMORY_CHUNK_OVERLAP_TOKENS=0)
+    def test_no_request_exceeds_the_providers_batch_size(self):
+        MemoryChunk.objects.create(text_content="Short note about the weekend market")
+        MemoryChunk.objects.create(text_content=" ".join(
+            f"Day {day} of the coastal walk followed the cliffs past another quiet harbour." for day in range(6)
+        ))
+
+        with mock.patch.object(RateLimiter, 'acquire') as acquire:
+            self.reembed('--no-switch')
+
+        self.assertTrue(self.provider.calls)
+        self.assertLessEqual(max(len(texts) for texts in self.provider.calls), FakeEmbeddingProvider.batch_size)
+        self.assertGreaterEqual(acquire.call_count, len(self.provider.calls))
+
+    def test_a_failed_run_resumes_from_its_checkpoint(self):
+        chunks = [MemoryChunk.objects.create(text_content=f"Resumable entry number {index}") for index in range(5)]
+        embed = self.provider.embed
+
+        def fail_on_third_row(texts, task_type="retrieval_document"):
+            if any(text.endswith(" 2") for text in texts):
+                raise RuntimeError("quota exceeded")
+            return embed(texts, task_type)
+
+        with mock.patch.object(self.provider, 'embed', side_effect=fail_on_third_row), \
+                mock.patch('vision_tracker_api.management.commands.reembed_memories.time.sleep'), \
+                self.assertRaises(CommandError):
+            self.reembed('--retries', '1')
+        with open(self.checkpoint) as f:
+            saved = json.load(f)
+        # Progress never runs past the batch that failed
+        self.assertLess(saved['last_pk'], chunks[2].pk)
+
+        output = self.reembed()
+
+        self.assertIn(f"after MemoryChunk {saved['last_pk']}", output)
+        target = read_alias(chroma_service.alias)['collection']
+        self.assertEqual(chroma_service.client.get_collection(target).count(), 5)
+
+
+@override_settings(MEMORY_SYNC_PENDING_GRACE_SECONDS=300, INGESTION_MAX_ATTEMPTS=3)
+class ChangedMemoryChunksTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def chunk(self, text, updated_minutes_ago, **fields):
+        chunk = MemoryChunk.objects.create(text_content=text)
+        MemoryChunk.objects.filter(pk=chunk.pk).update(
+            updated_at=self.now - timedelta(minutes=updated_minutes_ago), **fields
+        )
+        return chunk.pk
+
+    def selected(self, since):
+        return set(changed_memory_chunks(since, now=self.now).values_list('pk', flat=True))
+
+    def test_first_run_selects_everything_that_needs_work(self):
+        lost = self.chunk("lost by the queue", 60)
+        self.chunk("still queued", 1)
+        self.chunk("indexed", 60, index_status=MemoryChunk.INDEX_INDEXED, indexed_at=self.now - timedelta(minutes=30))
+        edited = self.chunk("edited after indexing", 10, index_status=MemoryChunk.INDEX_INDEXED,
+                            indexed_at=self.now - timedelta(minutes=30))
+        self.chunk("duplicate", 60, index_status=MemoryChunk.INDEX_DUPLICATE)
+
+        self.assertEqual(self.selected(None), {lost, edited})
+
+    def test_watermark_selects_recent_updates_and_outstanding_rows(self):
+        self.chunk("indexed before the watermark", 60, index_status=MemoryChunk.INDEX_INDEXED,
+                   indexed_at=self.now - timedelta(minutes=59))
+        edited = self.chunk("edited after the watermark", 10, index_status=MemoryChunk.INDEX_INDEXED,
+                            indexed_at=self.now - timedelta(minutes=30))
+        lost = self.chunk("pending since before the watermark", 60)
+
+        self.assertEqual(self.selected(self.now - timedelta(minutes=20)), {edited, lost})
+
+    def test_failed_rows_wait_for_their_backoff_and_give_up_after_max_attempts(self):
+        failed = MemoryChunk.INDEX_FAILED
+        due = self.chunk("due", 60, index_status=failed, index_attempts=1,
+                         next_index_attempt_at=self.now - timedelta(seconds=1))
+        self.chunk("backing off", 60, index_status=failed, index_attempts=2,
+                   next_index_attempt_at=self.now + timedelta(minutes=5))
+        self.chunk("exhausted", 60, index_status=failed, index_attempts=3,
+                   next_index_attempt_at=self.now - timedelta(seconds=1))
+
+        self.assertEqual(self.selected(self.now - timedelta(minutes=1)), {due})
+
+
+# Rows created by the tests are not queued for ingestion, so the sync may take them straight away
+@override_settings(MEMORY_SYNC_PENDING_GRACE_SECONDS=0)
+class MemorySyncTests(TestCase):
+    def setUp(self):
+        self.embed_content = use_fake_embeddings(self)
+        self.collection = use_temporary_collection(self)
+
+    def test_changed_rows_are_indexed_once(self):
+        chunks = [MemoryChunk.objects.create(text_content=text) for text in ("Went bouldering", "Baked bread")]
+
+        first = sync_memory_index()
+        second = sync_memory_index()
+
+        self.assertEqual(first['indexed'], 2)
+        self.assertEqual(second['indexed'], 0)
+        self.assertEqual(sorted(self.collection.get(include=[])['ids']), sorted(f"memchunk-{chunk.pk}" for chunk in chunks))
+
+    def test_deleted_rows_lose_their_vectors(self):
+        chunk = MemoryChunk.objects.create(text_content="Went bouldering")
+        sync_memory_index()
+        chunk.delete()
+
+        stats = sync_memory_index()
+
+        self.assertEqual(stats['deleted'], 1)
+        self.assertEqual(self.collection.count(), 0)
+        self.assertFalse(MemoryChunkTombstone.objects.exists())
+
+    def test_tombstones_are_kept_when_the_delete_fails(self):
+        chunk = MemoryChunk.objects.create(text_content="Went bouldering")
+        sync_memory_index()
+        chunk.delete()
+
+        with mock.patch.object(chroma_service, 'delete_memories', return_value=False):
+            stats = sync_memory_index()
+
+        self.assertEqual(stats['deleted'], 0)
+        self.assertEqual(MemoryChunkTombstone.objects.count(), 1)
+
+    def test_a_failed_row_backs_off(self):
+        self.embed_content.side_effect = RuntimeError("quota exceeded")
+        chunk = MemoryChunk.objects.create(text_content="Meditated for ten minutes before breakfast")
+
+        result = index_memory_chunks([chunk.pk])
+
+        chunk.refresh_from_db()
+        self.assertEqual(result['added'], [])
+        self.assertEqual((chunk.index_status, chunk.index_attempts), (MemoryChunk.INDEX_FAILED, 1))
+        self.assertGreater(chunk.next_index_attempt_at, timezone.now())
+        self.assertEqual(sync_memory_index()['indexed'], 0)
+
+
+class FlatVectorStoreRecoveryTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='flat_vector_store_')
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def open_collection(self, compact_ratio=0.25):
+        return FlatVectorStore(self.path, compact_ratio=compact_ratio).get_or_create_collection('memories')
+
+    def test_a_crashed_write_is_cut_back_before_the_next_one(self):
+        collection = self.open_collection()
+        collection.add(ids=['a', 'b'], embeddings=[[1.0, 0.0], [0.0, 1.0]], documents=["A", "B"])
+        # A writer that died after appending a vector but before its record, mid-way through another record
+        with open(collection._file(VECTORS_FILE), 'ab') as f:
+            f.write(np.array([0.5, 0.5], dtype=np.float16).tobytes())
+        with open(collection._file(ROWS_FILE), 'a') as f:
+            f.write('{"op": "add", "id": "torn"')
+
+        with self.assertLogs('vision_tracker_api.services.flat_vector_store', 'WARNING') as logs:
+            reopened = self.open_collection()
+        reopened.add(ids=['c'], embeddings=[[-1.0, 0.0]], documents=["C"])
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(reopened.count(), 3)
+        result = reopened.query(query_embeddings=[[-1.0, 0.0]], n_results=1)
+        self.assertEqual((result['ids'][0], result['documents'][0]), (['c'], ["C"]))
+
+    def test_instances_see_each_others_writes_and_compactions(self):
+        writer, reader = self.open_collection(compact_ratio=0.25), self.open_collection()
+        writer.add(ids=['a', 'b', 'c'], embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]], documents=["A", "B", "C"])
+        self.assertEqual(reader.count(), 3)
+
+        writer.delete(ids=['a', 'b'])
+
+        self.assertEqual(writer._meta['generation'], 1)
+        self.assertEqual(reader.get()['ids'], ['c'])
+        self.assertEqual(reader.query(query_embeddings=[[1.0, 0.0]], n_results=3)['ids'][0], ['c'])
@@ -1,28 +1,61 @@
 # vision_tracker_app/vision_tracker_api/tools.py
 
 import logging
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
 from .services.chroma_service import chroma_service
+from .services.executors import CHROMA, get_executor
+from .services.recall_cache import recall_cache
 
 # Configure a logger for the tools module
 logger = logging.getLogger(__name__)
 
-def recall_memories(query: str, n_results: int = 5) -> str:
+def _parse_date_filter(value: str, end_of_day: bool = False):
+    """Parses an ISO date or datetime from the model into an aware datetime, or None."""
+    if not value:
+        return None
+    # Dates first: parse_datetime also accepts a bare date, as midnight, which would cut created_before short
+    day = parse_date(value)
+    if day is not None:
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"'{value}' is not an ISO date (YYYY-MM-DD) or datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def recall_memories(queries: list[str], n_results: int = 5, created_after: str = "", created_before: str = "", category: str = "") -> str:
     """
     Searches archival memory (ChromaDB) for past conversations, facts, or visions
     related to the user's query.
 
     Args:
-        query: The string to search for in the memory database. The LLM should
-               generate a query that it thinks will find the most relevant memories.
-        n_results: The maximum number of memories to retrieve.
+        queries: One or more strings to search for in the memory database, e.g.
+               ["career goals", "family", "health"]. Pass every angle you want to search
+               in a single call rather than calling this tool once per query; the results
+               are de-duplicated and merged.
+        n_results: The maximum number of memories to retrieve per query.
+        created_after: Optional ISO date (YYYY-MM-DD); only memories created on or after it.
+        created_before: Optional ISO date (YYYY-MM-DD); only memories created on or before it.
+        category: Optional category name; only memories tagged with this category.
 
     Returns:
         A formatted string containing the retrieved memories and their relevance scores,
         or a message indicating that no relevant memories were found. This string is
         intended to be read by the LLM.
     """
-    logger.info(f"Executing recall_memories with query: '{query}' and requested n_results: {n_results}")
-    if not query:
+    # Accept a bare string too, in case the model sends a single query
+    queries = [queries] if isinstance(queries, str) else [str(query) for query in queries or []]
+    queries = [query for query in queries if query.strip()]
+    query = " || ".join(queries)
+    logger.info(f"Executing recall_memories with queries: {queries} and requested n_results: {n_results}")
+    if not queries:
         logger.warning("recall_memories called with no query provided.")
         return "No query was provided. Cannot search for memories."
 
@@ -30,15 +63,35 @@ def recall_memories(query: str, n_results: int = 5) -> str:
         # Fix 1: Ensure n_results is an integer, as ChromaDB (or your service) expects it.
         # The Generative AI model might provide it as a float (e.g., 5.0).
         n_results_int = int(n_results)
+        after = _parse_date_filter(created_after)
+        before = _parse_date_filter(created_before, end_of_day=True)
+
+        # Only the caller's shard is searched when sharding is enabled, so the tenant is part of the key
+        tenant = chroma_service.resolve_tenant()
+        # Repeated (or trivially rephrased) queries are answered from the cache until the next memory write
+        # in any process, or at most RECALL_CACHE_TTL_SECONDS
+        cache_key = recall_cache.make_key(
+            query, n_results_int, chroma_service.current_generation(), after, before, category or None, tenant
+        )
+        cached_result = recall_cache.get(cache_key)
+        if cached_result is not None:
+            logger.info(f"Serving recall_memories for query '{query}' from the recall cache.")
+            return cached_result
         
         # Fix 2: Assume chroma_service.query_memories returns a list of dictionaries,
         # e.g., [{'document': '...', 'distance': ...}, {'document': '...', 'distance': ...}]
         # This addresses the 'list' object has no attribute 'get' error.
-        relevant_memories_list = chroma_service.query_memories(query, n_results_int)
+        # Tools run on the chat model's thread; the search itself goes through the Chroma executor
+        # so tool calls share that backend's concurrency limit with every other vector search
+        relevant_memories_list = get_executor(CHROMA).submit(
+            chroma_service.query_memories, queries, n_results_int,
+            created_after=after, created_before=before, category=category or None, tenant=tenant
+        ).result()
         logger.debug(f"Raw relevant_memories from ChromaDB service: {relevant_memories_list}")
 
         if not relevant_memories_list:
             logger.info(f"No relevant memories found in ChromaDB for query: '{query}'.")
+            # Not cached: query_memories also returns [] when the embedding or search failed
             return "No relevant memories were found for that query."
 
         # Format the results into a string that is easy for the LLM to understand.
@@ -48,12 +101,22 @@ def recall_memories(query: str, n_results: int = 5) -> str:
         for i, mem_dict in enumerate(relevant_memories_list):
             # Access 'document' and 'distance' keys from each dictionary
             doc_content = mem_dict.get('document', 'N/A (missing document content)')
-            dist_score = mem_dict.get('distance', 999.99) # Use a high score for missing distances
-            context_str += f"- Memory {i+1} (Score: {dist_score:.2f}): {doc_content}\n"
+            dist_score = mem_dict.get('distance')
+            if dist_score is None:
+                # Found by keyword search only, so there is no vector distance to report
+                context_str += f"- Memory {i+1} (Keyword match): {doc_content}\n"
+            else:
+                context_str += f"- Memory {i+1} (Score: {dist_score:.2f}): {doc_content}\n"
         
         logger.info(f"Found and formatted {len(relevant_memories_list)} memories for query: '{query}'.")
+        recall_cache.set(cache_key, context_str)
         return context_str
 
     except Exception as e:
         logger.error(f"An error occurred in recall_memories while querying ChromaDB: {e}", exc_info=True)
-        return f"An error occurred while trying to search for memories: {e}"
\ No newline at end of file
+        return f"An error occurred while trying to search for memories: {e}"
+
+# Tools the chat model may call, keyed by the name Gemini uses in function calls
+AVAILABLE_TOOLS = {
+    'recall_memories': recall_memories,
+}
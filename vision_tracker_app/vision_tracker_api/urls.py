@@ -5,12 +5,20 @@ from .views import (
     VisionCategoryListView,
     VisionCategoryDetailView,
     LLMChatView, 
-    MemoryChunkCreateView
+    LLMChatStreamView,
+    MemoryChunkCreateView,
+    MemoryIndexStatusView,
+    MemoryImportView,
+    MetricsView
 )
 
 urlpatterns = [
     path('vision-data/', VisionCategoryListView.as_view(), name='vision_data_list'),
     path('vision-data/<int:pk>/', VisionCategoryDetailView.as_view(), name='vision_data_detail'),
     path('llm-chat/', LLMChatView.as_view(), name='llm_chat'), # <--- CHANGED: Use LLMChatView.as_view()
+    path('llm-chat/stream/', LLMChatStreamView.as_view(), name='llm_chat_stream'),
     path('memories/', MemoryChunkCreateView.as_view(), name='memory_chunk_create'),
+    path('memories/import/', MemoryImportView.as_view(), name='memory_import'),
+    path('memories/index-status/', MemoryIndexStatusView.as_view(), name='memory_index_status'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
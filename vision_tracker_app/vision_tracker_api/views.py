@@ -4,20 +4,35 @@ import logging
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from django.conf import settings
-# from django.http import JsonResponse # Not used in LLMChatView directly
+from django.utils import timezone
+from django.http import StreamingHttpResponse
 
 # Models and Serializers (unchanged)
-from .models import VisionCategory, MemoryChunk
+from .models import VisionCategory, MemoryChunk, MemoryChunkTombstone, SyncState
 from .serializers import VisionCategorySerializer, MemoryChunkSerializer
 
 # --- New Imports for MemGPT architecture ---
 import google.generativeai as genai
 from . import tools  # Import our new tools module
+from .prompts import build_system_instruction, strip_legacy_preamble
 import uuid # For generating unique conversation IDs
-from asgiref.sync import sync_to_async # Keep this for chat.send_message
-# import json # For serializing/deserializing chat history (implicitly used by chat.history potentially)
-from .services.firestore_service import firestore_service # Import your firestore_service instance
+import json # For Server-Sent Event payloads
+import time
+from .services.history_store import get_history_store # Conversation history backend chosen in settings
+from .services.context_window import build_context_window, conversation_summarizer
+from .services.model_registry import model_registry
+from .services.embedding_cache import embedding_cache
+from .services.recall_cache import recall_cache
+from .services.response_cache import semantic_response_cache
+from .services.ingestion_service import ingestion_service
+from .services.executors import GEMINI, executor_stats, run_on
+from .services.memory_import import FORMAT_NDJSON, IMPORT_FORMATS, INDEX_QUEUE, MemoryImporter
+from .services.chroma_service import chroma_service
+from .services.dedup import memory_deduplicator
+from .services.memory_sync import SYNC_NAME
+from .services.tenancy import current_tenant, resolve_user_scope, use_tenant
  
 
 # Configure logger
@@ -38,10 +53,91 @@ class MemoryChunkCreateView(generics.CreateAPIView):
     serializer_class = MemoryChunkSerializer
 
     def perform_create(self, serializer):
-        instance = serializer.save()
-        logger.info(f"MemoryChunk {instance.id} created via API.")
-        # In a real implementation, call Firestore and ChromaDB here as you did before.
+        # The memory belongs to the caller, which picks its vector-store shard (see tenancy.py)
+        instance = serializer.save(tenant_id=resolve_user_scope(self.request))
+        # Indexing into ChromaDB happens in the background (see signals.py / ingestion_service)
+        logger.info(f"MemoryChunk {instance.id} created via API and queued for indexing.")
 
+class MemoryIndexStatusView(APIView):
+    """Reports the ingestion queue depth and how far ChromaDB lags behind MemoryChunk."""
+
+    def get(self, request, *args, **kwargs):
+        pending = MemoryChunk.objects.filter(index_status=MemoryChunk.INDEX_PENDING)
+        oldest_pending = pending.order_by('updated_at').values_list('updated_at', flat=True).first()
+        lag_seconds = (timezone.now() - oldest_pending).total_seconds() if oldest_pending else 0.0
+        sync_state = SyncState.objects.filter(name=SYNC_NAME).first()
+        return Response({
+            **ingestion_service.stats(),
+            'pending': pending.count(),
+            'failed_rows': MemoryChunk.objects.filter(index_status=MemoryChunk.INDEX_FAILED).count(),
+            # Failed too often for the sync to retry them; editing a row starts over
+            'retries_exhausted_rows': MemoryChunk.objects.filter(
+                index_status=MemoryChunk.INDEX_FAILED, index_attempts__gte=getattr(settings, 'INGESTION_MAX_ATTEMPTS', 8)
+            ).count(),
+            'duplicate_rows': MemoryChunk.objects.filter(index_status=MemoryChunk.INDEX_DUPLICATE).count(),
+            'indexing_lag_seconds': round(lag_seconds, 3),
+            'pending_deletes': MemoryChunkTombstone.objects.count(),
+            'sync_watermark': sync_state.watermark if sync_state else None,
+            'last_sync': sync_state.last_run_stats if sync_state else None,
+        })
+
+
+class MemoryImportView(APIView):
+    """
+    Bulk-imports memories from an uploaded NDJSON or plain-text file (multipart field 'file').
+    The upload is streamed line by line; rows are bulk-created per batch and queued for indexing.
+    Pass 'offset' (the 'offset' returned by an interrupted import) to resume; a failed import
+    reports the offset up to which its rows were committed.
+    """
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'File not provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fmt = request.data.get('format') or FORMAT_NDJSON
+        if fmt not in IMPORT_FORMATS:
+            return Response({'error': f'Unsupported format. Use one of {IMPORT_FORMATS}.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            offset = int(request.data.get('offset') or 0)
+        except ValueError:
+            return Response({'error': 'Offset must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        lines = (line.decode('utf-8') for line in upload)
+        committed = {'offset': offset}
+        importer = MemoryImporter(index_mode=INDEX_QUEUE, tenant_id=resolve_user_scope(request),
+                                  checkpoint_callback=lambda committed_offset: committed.update(offset=committed_offset))
+        try:
+            stats = importer.run(lines, fmt, start_offset=offset)
+        except UnicodeDecodeError as e:
+            return Response({'error': f'File is not valid UTF-8: {e}', 'offset': committed['offset']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Memory import failed after offset {committed['offset']}: {e}", exc_info=True)
+            return Response({'error': f'Import failed: {e}', 'offset': committed['offset']},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.info(f"Imported {stats['rows']} memories via API at {stats['rows_per_second']} rows/s.")
+        return Response(stats, status=status.HTTP_201_CREATED)
+
+class MetricsView(APIView):
+    """Exposes in-process cache, queue and model-registry counters for monitoring."""
+
+    def get(self, request, *args, **kwargs):
+        metrics = {
+            'embedding_cache': embedding_cache.stats(),
+            'recall_cache': recall_cache.stats(),
+            'semantic_response_cache': semantic_response_cache.stats(),
+            'model_registry': model_registry.stats(),
+            'ingestion': ingestion_service.stats(),
+            'executors': executor_stats(),
+            'shards': chroma_service.shards.stats(),
+            'dedup': memory_deduplicator.stats(),
+        }
+        history_service = getattr(get_history_store(), '_service', None)
+        if history_service is not None:
+            metrics['conversation_cache'] = history_service.history_cache.stats()
+        return Response(metrics)
 
 # --- The Refactored LLMChatView as a Class-Based APIView ---
 class LLMChatView(APIView):
@@ -56,6 +152,7 @@ class LLMChatView(APIView):
         request = self.initialize_request(request, *args, **kwargs)
         self.request = request
         self.headers = self.default_response_headers
+        tenant_token = None
 
         try:
             # The standard initial() method in DRF (handling authentication,
@@ -64,6 +161,9 @@ class LLMChatView(APIView):
             # authentication/permission classes are in use that modify 'initial'
             # to be async.
             self.initial(request, *args, **kwargs)
+            # Memory recall during this request only sees the caller's shard. Executors copy
+            # contextvars, so tool calls on worker threads inherit it.
+            tenant_token = current_tenant.set(resolve_user_scope(request))
 
             if request.method.lower() in self.http_method_names:
                 handler = getattr(self, request.method.lower(),
@@ -76,129 +176,141 @@ class LLMChatView(APIView):
 
         except Exception as exc:
             response = self.handle_exception(exc)
+        finally:
+            if tenant_token is not None:
+                current_tenant.reset(tenant_token)
 
         # finalize_response is synchronous and expects a standard Response object
         self.response = self.finalize_response(request, response, *args, **kwargs)
         return self.response
 
-    async def post(self, request, *args, **kwargs):
-        """
-        API endpoint for MemGPT-style LLM chat.
-        The LLM now decides when to call tools (like searching for memories)
-        to build context and provide a response.
-        """
-        user_message = request.data.get('message')
-        if not user_message:
-            return Response({'error': 'Message not provided'}, status=status.HTTP_400_BAD_REQUEST)
-
+    def _resolve_conversation_id(self, request) -> str:
         conversation_id = request.data.get('conversation_id')
         if not conversation_id:
             conversation_id = str(uuid.uuid4()) # Generate a new ID for a new conversation
             logger.info(f"New conversation started with ID: {conversation_id}")
         else:
             logger.info(f"Continuing conversation with ID: {conversation_id}")
+        return conversation_id
 
-        loaded_history = []
+    async def _load_history(self, conversation_id: str) -> list:
         try:
             # get_conversation_history is already async
-            loaded_history = await firestore_service.get_conversation_history(conversation_id)
+            loaded_history = await get_history_store().get_conversation_history(conversation_id)
+            # Older turns embedded the whole system preamble in the user message; drop it at read time
+            loaded_history = strip_legacy_preamble(loaded_history)
             logger.info(f"Loaded {len(loaded_history)} messages for conversation {conversation_id}")
+            return loaded_history
         except Exception as e:
             logger.error(f"Failed to load conversation history for {conversation_id}: {e}", exc_info=True)
             # For robustness, we'll proceed with an empty history.
+            return []
+
+    def _resolve_user_scope(self, request) -> str:
+        """Identifies whose data a request may see (authenticated user, else the shared anonymous scope)."""
+        return resolve_user_scope(request)
+
+    async def _build_context_window(self, conversation_id: str, loaded_history: list):
+        """Returns (window, summary): the recent turns plus rolling summary that fit the token budget."""
+        summary, summarized_count = "", 0
+        if loaded_history:
+            try:
+                summary, summarized_count = await get_history_store().get_conversation_summary(conversation_id)
+            except Exception as e:
+                logger.error(f"Failed to load conversation summary for {conversation_id}: {e}", exc_info=True)
+        window = build_context_window(loaded_history, summary, summarized_count)
+        logger.info(
+            f"Context window for conversation {conversation_id}: {len(loaded_history) - window.start} of "
+            f"{len(loaded_history)} messages verbatim, ~{window.tokens} tokens."
+        )
+        return window, summary
+
+    def _start_chat(self, loaded_history: list, enable_automatic_function_calling: bool = True):
+        started = time.perf_counter()
+        # The model (and its recall_memories tool schema) is built once per process and shared
+        model = model_registry.get_model(
+            settings.CHAT_MODEL_NAME,
+            tools=(tools.recall_memories,), # Pass the function directly
+            system_instruction=build_system_instruction() # Role + vision statement, sent once per request rather than stored in every turn
+        )
+        chat = model.start_chat(history=loaded_history, enable_automatic_function_calling=enable_automatic_function_calling)
+        logger.debug(f"Chat setup took {(time.perf_counter() - started) * 1000:.2f} ms.")
+        return chat
 
+    async def _save_history(self, conversation_id: str, history: list, loaded_history: list, window, summary: str) -> None:
+        store = get_history_store()
         try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            model = genai.GenerativeModel(
-                model_name='gemini-1.5-flash', # Or your preferred model
-                tools=[tools.recall_memories] # Pass the function directly
-            )
-            chat = model.start_chat(history=loaded_history, enable_automatic_function_calling=True)
+            # Only the messages added during this turn are written; chat.history holds genai.protos.Content
+            new_messages = list(history)[len(window.messages):]
+            if new_messages: # Only save if there's something to save
+                await store.append_conversation_messages(conversation_id, new_messages, expected_count=len(loaded_history))
+                logger.info(f"Saved {len(new_messages)} new messages for conversation {conversation_id}.")
+            else:
+                logger.info(f"No new messages to save for conversation {conversation_id}.")
+        except Exception as e:
+            logger.error(f"Failed to serialize or save conversation history for {conversation_id}: {e}", exc_info=True)
+        # Fold turns that fell out of the window into the summary, off the request path
+        conversation_summarizer.schedule(store, conversation_id, loaded_history, window, summary)
+
+    async def post(self, request, *args, **kwargs):
+        """
+        API endpoint for MemGPT-style LLM chat.
+        The LLM now decides when to call tools (like searching for memories)
+        to build context and provide a response.
+        """
+        user_message = request.data.get('message')
+        if not user_message:
+            return Response({'error': 'Message not provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = self._resolve_conversation_id(request)
+        loaded_history = await self._load_history(conversation_id)
+
+        # Opt-in semantic cache: near-duplicate questions from the same user get the stored answer
+        use_semantic_cache = semantic_response_cache.enabled and not request.data.get('bypass_cache')
+        cache_scope = self._resolve_user_scope(request)
+        cache_context = semantic_response_cache.context_hash(build_system_instruction())
+        if use_semantic_cache:
+            cached_response = await semantic_response_cache.alookup(user_message, cache_scope, cache_context)
+            if cached_response is not None:
+                cached_turn = [
+                    genai.protos.Content(role='user', parts=[genai.protos.Part(text=user_message)]),
+                    genai.protos.Content(role='model', parts=[genai.protos.Part(text=cached_response)]),
+                ]
+                try:
+                    await get_history_store().append_conversation_messages(conversation_id, cached_turn, expected_count=len(loaded_history))
+                except Exception as e:
+                    # The answer is still good; only this turn is missing from the saved history
+                    logger.error(f"Failed to save the cached turn for conversation {conversation_id}: {e}", exc_info=True)
+                return Response({
+                    'response': cached_response,
+                    'conversation_id': conversation_id,
+                    'cached': True
+                })
+
+        window, summary = await self._build_context_window(conversation_id, loaded_history)
 
+        try:
+            chat = self._start_chat(window.messages)
         except Exception as e:
             logger.critical(f"Failed to initialize Gemini model: {e}", exc_info=True)
             return Response({'error': f'Model initialization failed: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        vision_statement = settings.VISION_STATEMENT_FULL
-        initial_prompt = (
-            "You are the **Vision Assistant**, a highly supportive and dedicated AI crafted to empower the user in articulating, refining, and actively working towards their long-term personal vision. "
-            "Your profound mission is to guide the user in achieving their aspirations through insightful, actionable, and consistently encouraging dialogue. There should be a flow of conversation that is both natural and deeply connected to the user's overarching vision. "
-            "This vision is the absolute compass for all our interactions. Every piece of advice, every question, and every suggestion you offer must be directly framed around helping the user align their current actions and thoughts with this future state. "
-            "A core strength you possess is direct access to the user's **personal archive of past memories and conversations**. This capability allows you to provide **richly contextual, deeply personalized, and exceptionally relevant guidance** by drawing upon their unique historical journey and previous discussions. "
-            "Crucially, you are equipped with the `recall_memories` tool. **Use this tool when you ONLY need it, it's part of your thought process** use it when the user's query, stated goals, or any conversational context suggests a reference to past events, previous discussions, or personal history that could enrich your response or understanding. "
-            "Your conversations should be a dynamic and empowering experience for the user. Strive to be: "
-            "\n\n* **Naturally Contextual**: You can weave together the current input, the user's overarching vision, and any relevant retrieved memories to ensure a seamless and informed dialogue. "
-            "\n* **Profoundly Insightful**: Offer fresh perspectives, identify patterns, and make meaningful connections between current discussions and broader themes in their life's vision. Help them see connections they might miss. "
-            "\n* **Consistently Actionable**: Propose concrete next steps, practical reflections, thought-provoking questions, or small, empowering challenges that directly propel the user forward in their vision journey. "
-            "\n* **Truly Engaging**: Maintain a positive, encouraging, and constructive criticism. Actively prompt the user for deeper thought, invite them to elaborate, and encourage the exploration of new ideas or specific details related to their vision. Foster a supportive environment where they feel motivated and understood. "
-            f"\n\nHere is the user's core vision statement for your reference:\n---"
-            f"\n{vision_statement}\n---"
-            f"\nNow, internalize your role, mission, capabilities, and the user's vision."
-            f"\nRespond to the user's current message, in a natural and engaging conversation."
-            f"\n{user_message}"
-        )
-
         try:
-            logger.info("Sending initial prompt to Gemini...")
-            # The google-generativeai SDK's send_message is synchronous,
-            # so sync_to_async is correctly used here.
-            response_object = await sync_to_async(chat.send_message)(initial_prompt)
+            logger.info("Sending user message to Gemini...")
+            # The google-generativeai SDK's send_message is synchronous, so it runs on the
+            # bounded Gemini executor rather than the shared sync_to_async thread.
+            response_object = await run_on(GEMINI, chat.send_message, user_message)
 
             final_text_response = response_object.text
-            logger.info("Received final response from Gemini after potential tool calls.")
-
-            try:
-                serializable_history = []
-                for message in chat.history: # message is of type google.generativeai.types.Content
-                    parts_list = []
-                    for part in message.parts: # part is of type google.generativeai.types.Part
-                        part_dict = {}
-                        # Text part
-                        if part.text: # Check if text attribute exists and is not empty/None
-                            part_dict['text'] = part.text
-                        
-                        # Function call part
-                        # The SDK ensures that a Part will only have one of these (text, inline_data, function_call, etc.)
-                        if hasattr(part, 'function_call') and part.function_call:
-                            part_dict['function_call'] = {
-                                'name': part.function_call.name,
-                                'args': dict(part.function_call.args), # .args is a Struct, convert to dict
-                            }
-                        
-                        # Function response part
-                        if hasattr(part, 'function_response') and part.function_response:
-                             part_dict['function_response'] = {
-                                'name': part.function_response.name,
-                                'response': dict(part.function_response.response), # .response is a Struct, convert to dict
-                            }
-                        
-                        # Inline data part (e.g., for images - handle if you use them)
-                        if hasattr(part, 'inline_data') and part.inline_data:
-                            part_dict['inline_data'] = {
-                                'mime_type': part.inline_data.mime_type,
-                                # Decide how to serialize 'part.inline_data.data' (bytes)
-                                # e.g., base64 encode, or store elsewhere and link
-                                'data': "SERIALIZED_BLOB_DATA_PLACEHOLDER" 
-                            }
-                        
-                        if part_dict: # Add part_dict only if it's not empty
-                            parts_list.append(part_dict)
-
-                    if parts_list: # Add message only if it has parts
-                        serializable_history.append({
-                            'role': message.role,
-                            'parts': parts_list
-                        })
-                
-                # Now, serializable_history is a list of dicts
-                if serializable_history: # Only save if there's something to save
-                    await firestore_service.save_conversation_history(conversation_id, serializable_history)
-                    logger.info(f"Saved updated chat history for conversation {conversation_id}.")
-                else:
-                    logger.info(f"No serializable history to save for conversation {conversation_id}.")
+            usage = getattr(response_object, 'usage_metadata', None)
+            logger.info(
+                "Received final response from Gemini after potential tool calls "
+                f"(prompt tokens: {getattr(usage, 'prompt_token_count', 'n/a')})."
+            )
 
-            except Exception as e:
-                logger.error(f"Failed to serialize or save conversation history for {conversation_id}: {e}", exc_info=True)
+            await self._save_history(conversation_id, chat.history, loaded_history, window, summary)
+            if use_semantic_cache:
+                await semantic_response_cache.astore(user_message, final_text_response, cache_scope, cache_context)
 
             return Response({
                 'response': final_text_response,
@@ -207,4 +319,108 @@ class LLMChatView(APIView):
 
         except Exception as e:
             logger.error(f"An error occurred during the chat session: {e}", exc_info=True)
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class LLMChatStreamView(LLMChatView):
+    """
+    Server-Sent Events variant of LLMChatView.
+
+    Tokens are forwarded as `token` events as soon as Gemini produces them. Tool calls are
+    executed manually (the SDK does not combine streaming with automatic function calling)
+    and bracketed by `tool_call_started` / `tool_call_finished` events. The history is saved
+    once the stream completes, and the final `done` event carries the time-to-first-token.
+    """
+
+    @staticmethod
+    def _sse(event: str, data: dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    @staticmethod
+    def _next_event(events, tenant: str):
+        """
+        Advances the event generator as `tenant`. The stream is consumed after dispatch() has
+        returned and reset the current tenant, so it is bound again for each step.
+        """
+        with use_tenant(tenant):
+            return next(events, None)
+
+    def _iter_chat_events(self, chat, prompt):
+        """Blocking generator of (event, data) pairs; driven from a worker thread by post()."""
+        message = prompt
+        while True:
+            function_calls = []
+            for chunk in chat.send_message(message, stream=True):
+                for part in chunk.parts:
+                    if part.function_call:
+                        function_calls.append(part.function_call)
+                    elif part.text:
+                        yield 'token', {'text': part.text}
+
+            if not function_calls:
+                return
+
+            response_parts = []
+            for function_call in function_calls:
+                args = type(function_call).to_dict(function_call).get('args', {}) # Struct -> plain, JSON-safe dict
+                yield 'tool_call_started', {'name': function_call.name, 'args': args}
+                tool = tools.AVAILABLE_TOOLS.get(function_call.name)
+                if tool is None:
+                    result = f"Unknown tool '{function_call.name}'."
+                else:
+                    try:
+                        result = tool(**args)
+                    except Exception as e:
+                        logger.error(f"Tool '{function_call.name}' failed during streaming chat: {e}", exc_info=True)
+                        result = f"An error occurred while running {function_call.name}: {e}"
+                yield 'tool_call_finished', {'name': function_call.name}
+                response_parts.append(genai.protos.Part(
+                    function_response=genai.protos.FunctionResponse(name=function_call.name, response={'result': result})
+                ))
+            message = response_parts
+
+    async def post(self, request, *args, **kwargs):
+        """Streams the assistant's reply for one chat turn as Server-Sent Events."""
+        started = time.monotonic()
+        user_message = request.data.get('message')
+        if not user_message:
+            return Response({'error': 'Message not provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        conversation_id = self._resolve_conversation_id(request)
+        tenant = self._resolve_user_scope(request)
+        loaded_history = await self._load_history(conversation_id)
+        window, summary = await self._build_context_window(conversation_id, loaded_history)
+
+        try:
+            chat = self._start_chat(window.messages, enable_automatic_function_calling=False)
+        except Exception as e:
+            logger.critical(f"Failed to initialize Gemini model: {e}", exc_info=True)
+            return Response({'error': f'Model initialization failed: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        async def event_stream():
+            yield self._sse('conversation', {'conversation_id': conversation_id})
+            events = self._iter_chat_events(chat, user_message)
+            ttft_ms = None
+            try:
+                while True:
+                    # Pull each event from the blocking SDK iterator on the Gemini executor
+                    item = await run_on(GEMINI, self._next_event, events, tenant)
+                    if item is None:
+                        break
+                    event, data = item
+                    if event == 'token' and ttft_ms is None:
+                        ttft_ms = round((time.monotonic() - started) * 1000, 1)
+                        logger.info(f"Time to first token for conversation {conversation_id}: {ttft_ms} ms")
+                    yield self._sse(event, data)
+            except Exception as e:
+                logger.error(f"An error occurred during the streaming chat session: {e}", exc_info=True)
+                yield self._sse('error', {'error': str(e)})
+                return
+
+            await self._save_history(conversation_id, chat.history, loaded_history, window, summary)
+            total_ms = round((time.monotonic() - started) * 1000, 1)
+            yield self._sse('done', {'conversation_id': conversation_id, 'ttft_ms': ttft_ms, 'total_ms': total_ms})
+
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # Stop reverse proxies from buffering the stream
+        return response
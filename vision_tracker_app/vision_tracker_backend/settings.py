@@ -47,6 +47,116 @@ VISION_STATEMENT_FULL = (
     "I leave a profound and positive mark on every life I touch and every challenge I undertake."
 )
 
+# Embedding cache (see vision_tracker_api/services/embedding_cache.py)
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+EMBEDDING_CACHE_PATH = os.path.join(BASE_DIR, 'embedding_cache.sqlite3')
+EMBEDDING_CACHE_MEMORY_SIZE = 2048  # Entries kept in the in-process LRU tier
+EMBEDDING_CACHE_MAX_DISK_ENTRIES = 100000  # Entries kept in the SQLite tier before LRU eviction
+
+# Embedding provider (see vision_tracker_api/services/embedding_providers.py): 'gemini' (embedding-001, 768 dims)
+# or 'onnx' (local all-MiniLM-L6-v2, 384 dims). Vectors from different models cannot share a Chroma
+# collection: to switch an existing install, run `manage.py reembed_memories --provider ... [--model ...]`,
+# which rebuilds the memories into a new collection and switches to it (and its model) when done.
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'gemini')
+GEMINI_EMBEDDING_MODEL = 'models/embedding-001'
+MEMORY_ALIAS_REFRESH_SECONDS = 30  # How soon running servers follow a collection switched by reembed_memories
+REEMBED_REQUESTS_PER_MINUTE = 300  # Default embedding request rate limit for reembed_memories
+ONNX_EMBEDDING_THREADS = int(os.getenv('ONNX_EMBEDDING_THREADS', '0'))  # 0 = onnxruntime default (all cores)
+ONNX_EMBEDDING_BATCH_SIZE = 32  # Texts per ONNX inference call
+
+# Vector store behind ChromaService: 'chroma' (PersistentClient with HNSW) or 'flat' (exact search over a
+# memory-mapped float16/int8 matrix, see vision_tracker_api/services/flat_vector_store.py). The flat store
+# coordinates processes with fcntl file locks; without fcntl (Windows) only one process may use it at a time.
+VECTOR_STORE_BACKEND = os.getenv('VECTOR_STORE_BACKEND', 'chroma')
+FLAT_VECTOR_STORE_PATH = os.path.join(BASE_DIR, 'flat_vector_store')
+FLAT_VECTOR_STORE_DTYPE = 'float16'  # Or 'int8' (per-row scaled) for half the size at a small recall cost
+FLAT_VECTOR_STORE_COMPACT_RATIO = 0.25  # Rewrite a collection once this fraction of its rows is dead
+
+# HNSW index parameters for the memories collection. They are fixed when the collection is created;
+# use `manage.py tune_vector_index` to compare values and `--apply` to rebuild with new ones.
+CHROMA_HNSW_SPACE = 'l2'  # 'l2', 'cosine' or 'ip'
+CHROMA_HNSW_M = 16  # Graph degree: higher = better recall, more memory
+CHROMA_HNSW_CONSTRUCTION_EF = 100  # Candidate list size while building
+CHROMA_HNSW_SEARCH_EF = 10  # Candidate list size while querying: higher = better recall, slower queries
+
+# Per-tenant collections (see vision_tracker_api/services/tenancy.py): each user's memories live in
+# their own shard, so a query only searches that user's vectors. Run `manage.py shard_memories` to move
+# the existing single collection into shards before enabling this.
+MEMORY_SHARDING_ENABLED = os.getenv('MEMORY_SHARDING_ENABLED', 'false').lower() == 'true'
+MEMORY_SHARD_CACHE_SIZE = 128  # Open shard collection handles kept in the LRU cache
+
+# Bulk embedding / indexing
+EMBEDDING_BATCH_SIZE = 100  # Texts per embedding API request (Gemini accepts up to 100)
+CHROMA_WRITE_BATCH_SIZE = 1000  # Documents per Chroma add/upsert call
+RECALL_CACHE_MAX_ENTRIES = 512  # Formatted recall_memories results, invalidated by every memory write
+RECALL_CACHE_TTL_SECONDS = 300  # Upper bound on an entry's age, in case a write by another process is missed
+MEMORY_HYBRID_SEARCH = os.getenv('MEMORY_HYBRID_SEARCH', 'true').lower() == 'true'  # Fuse BM25 keyword hits with vector hits
+MEMORY_RRF_K = 60  # Reciprocal Rank Fusion damping constant
+MEMORY_MMR_ENABLED = True  # Diversify recalled memories with Maximal Marginal Relevance
+MEMORY_MMR_LAMBDA = 0.7  # 1.0 = relevance only, 0.0 = diversity only
+MEMORY_MMR_FETCH_FACTOR = 4  # Candidates fetched per returned memory before re-ranking
+
+# Long memories are embedded as overlapping chunks (see vision_tracker_api/services/chunker.py). Recall
+# collapses chunk hits to one per memory and returns the matching span plus some surrounding context.
+MEMORY_CHUNK_MAX_TOKENS = 256  # Estimated tokens per chunk (~4 characters each)
+MEMORY_CHUNK_OVERLAP_TOKENS = 32  # Repeated between consecutive chunks so no sentence is cut off from its context
+MEMORY_CHUNK_CONTEXT_TOKENS = 32  # Text returned on each side of the matching chunk
+
+# Ingest-time deduplication (see vision_tracker_api/services/dedup.py): exact copies by content hash,
+# near copies by similarity to the closest stored memory. 'link' only points the new row at the original;
+# 'merge' also replaces the original's text with the new version and re-indexes it.
+MEMORY_DEDUP_ENABLED = os.getenv('MEMORY_DEDUP_ENABLED', 'true').lower() == 'true'
+MEMORY_DEDUP_SIMILARITY_THRESHOLD = 0.97  # Cosine similarity at which a memory counts as a near duplicate
+MEMORY_DEDUP_MODE = 'link'  # Or 'merge'
+
+# Background ingestion of MemoryChunk rows into ChromaDB
+INGESTION_WORKERS = 2
+INGESTION_BATCH_SIZE = 32  # Max rows embedded per micro-batch
+INGESTION_BATCH_WAIT_SECONDS = 0.5  # How long a worker waits to fill a micro-batch
+INGESTION_RETRY_BASE_SECONDS = 60  # The sync retries a failed row after this, doubling per failed attempt...
+INGESTION_RETRY_MAX_SECONDS = 6 * 3600  # ...up to this
+INGESTION_MAX_ATTEMPTS = 8  # Then it is left failed until it is edited
+MEMORY_IMPORT_BATCH_SIZE = 500  # Rows per bulk_create transaction during bulk imports
+
+# Incremental sync (`manage.py sync_memory_index [--interval N]`, see vision_tracker_api/services/memory_sync.py):
+# catches edits and deletes the in-process ingestion queue missed (other processes, update(), restarts)
+MEMORY_SYNC_BATCH_SIZE = 100  # Rows per embedding/upsert batch
+MEMORY_SYNC_LOOKBACK_SECONDS = 5  # Overlap with the previous run, for rows committed just after it started
+MEMORY_SYNC_MAX_DELETES = 10000  # Tombstones processed per run
+MEMORY_SYNC_PENDING_GRACE_SECONDS = 300  # Pending rows younger than this are left to the ingestion queue
+
+# Where chat histories live: 'firestore' (FirestoreService) or 'local' (ConversationMessage rows in DATABASES)
+CONVERSATION_HISTORY_BACKEND = os.getenv('CONVERSATION_HISTORY_BACKEND', 'firestore')
+
+# In-process cache of deserialized conversation histories (see services/history_cache.py)
+CONVERSATION_CACHE_MAX_ENTRIES = 256
+# Seconds a cached history is served without even the message-count check. Keep 0 with several worker
+# processes: another worker's appended turns would be missed for up to this long.
+CONVERSATION_CACHE_TTL_SECONDS = float(os.getenv('CONVERSATION_CACHE_TTL_SECONDS', '0'))
+
+CHAT_MODEL_NAME = 'gemini-1.5-flash'
+
+# Dedicated thread pools for blocking backends (see services/executors.py); the worker count
+# is each backend's concurrency limit, and queue-wait times are reported by MetricsView
+BACKEND_EXECUTOR_WORKERS = {
+    'chroma': 4,
+    'firestore': 8,
+    'gemini': 8,
+    'local_embedding': 2,  # ONNX inference; each call also uses ONNX_EMBEDDING_THREADS
+}
+
+# Semantic response cache for near-duplicate chat prompts (opt-in; pass "bypass_cache": true per request to skip)
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+SEMANTIC_CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity needed to reuse an answer
+SEMANTIC_CACHE_TTL_SECONDS = 24 * 3600
+SEMANTIC_CACHE_MAX_ENTRIES = 1000
+
+# Prompt windowing: recent turns are sent verbatim, older ones as a rolling summary
+CHAT_HISTORY_MAX_TURNS = 10
+CHAT_HISTORY_TOKEN_BUDGET = 8000  # Estimated locally (~4 characters per token)
+CHAT_SUMMARY_MODEL = 'gemini-1.5-flash'
+CHAT_SUMMARY_WORKERS = 1
+
 
 
 # 4. Firebase Initialization - NOW AFTER BASE_DIR IS DEFINED
@@ -121,9 +231,17 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # WAL lets chat requests read history while the ingestion workers write
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
+# Keeps the vector store and caches of test runs in a temporary directory
+TEST_RUNNER = 'vision_tracker_backend.test_runner.TemporaryDataTestRunner'
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173", 
@@ -0,0 +1,38 @@
+# vision_tracker_app/vision_tracker_backend/test_runner.py
+
+import os
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# Settings naming the files and directories the services keep their data in
+DATA_PATH_SETTINGS = {
+    'CHROMADB_PERSIST_PATH': 'chroma_db',
+    'EMBEDDING_CACHE_PATH': 'embedding_cache.sqlite3',
+    'FLAT_VECTOR_STORE_PATH': 'flat_vector_store',
+}
+
+
+class TemporaryDataTestRunner(DiscoverRunner):
+    """
+    Runs the tests with every on-disk store in a fresh temporary directory, so a test run
+    never reads or rewrites the vector store or caches in the working tree.
+
+    The paths are switched in setup_test_environment, which runs before the test modules are
+    imported: the service singletons open their stores as soon as they are imported.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        self._data_dir = tempfile.mkdtemp(prefix='vision_tracker_tests_')
+        self._data_settings = override_settings(**{
+            name: os.path.join(self._data_dir, filename) for name, filename in DATA_PATH_SETTINGS.items()
+        })
+        self._data_settings.enable()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self._data_settings.disable()
+        shutil.rmtree(self._data_dir, ignore_errors=True)